@@ -13,8 +13,11 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
+from multiprocessing.pool import ThreadPool
 import os
 import sys
+import threading
 import time
 
 path = os.getcwd()
@@ -22,8 +25,10 @@ sys.path.append(path)
 
 import logging
 
+from fuel_health.common import ledger
 from fuel_health import exceptions
 import fuel_health.heatmanager
+from fuel_health.manager import ThreadLocalClient
 
 
 LOG = logging.getLogger(__name__)
@@ -33,174 +38,301 @@ class CleanUpClientManager(fuel_health.heatmanager.HeatManager):
     """
     Manager that provides access to the official python clients for
     calling various OpenStack APIs.
-    """
-
-    def wait_for_server_termination(self, server, ignore_error=False):
-        """Waits for server to reach termination."""
-        start_time = int(time.time())
-        while True:
-            try:
-                self._get_compute_client().servers.get(server)
-            except exceptions.NotFound:
-                return
-
-            server_status = server.status
-            if server_status == 'ERROR' and not ignore_error:
-                raise exceptions.BuildErrorException(server_id=server.id)
-
-            if int(time.time()) - start_time >= self.build_timeout:
-                raise exceptions.TimeoutException
-
-            time.sleep(self.build_interval)
-
 
-def cleanup():
-    manager = CleanUpClientManager()
+    Every cleanup thread has its own clients, they are seeded with
+    token of keystone client that is shared by the process.
+    """
 
-    heat_client = manager._get_heat_client()
-    if heat_client is not None:
-        stacks = heat_client.stacks.list()
-        for s in stacks:
-            if s.stack_name.startswith('ost1_test-'):
-                if s.stack_status in ('CREATE_COMPLETE', 'ERROR'):
-                    try:
-                        LOG.info('Start stacks deletion.')
-                        heat_client.stacks.delete(s.id)
-                    except Exception as exc:
-                        LOG.debug(exc)
-                        pass
-
-    instances_id = []
-    servers = manager._get_compute_client().servers.list()
-    floating_ips = manager._get_compute_client().floating_ips.list()
-
-    if servers:
-        for s in servers:
-            if s.name.startswith('ost1_test-'):
-                instances_id.append(s.id)
-                for f in floating_ips:
-                    if f.instance_id in instances_id:
-                        try:
-                            LOG.info('Delete floating ip %s' % f.ip)
-                            manager._get_compute_client().floating_ips.delete(
-                                f.id)
-                        except Exception as exc:
-                            LOG.debug(exc)
-                            pass
-                try:
-                    LOG.info('Delete server with name %s' % s.name)
-                    manager._get_compute_client().servers.delete(s.id)
-                except Exception as exc:
-                    LOG.debug(exc)
-                    pass
-    else:
-        LOG.info('No servers found')
-
-        for s in servers:
-            try:
-                LOG.info('Wait for server terminations')
-                manager.wait_for_server_termination(s)
-            except Exception as exc:
-                LOG.debug(exc)
-                pass
+    compute_client = ThreadLocalClient('compute_client')
+    volume_client = ThreadLocalClient('volume_client')
+    heat_client = ThreadLocalClient('heat_client')
 
-    keypairs = manager._get_compute_client().keypairs.list()
+    def __init__(self):
+        super(CleanUpClientManager, self).__init__()
+        self.thread_clients = threading.local()
 
-    for k in keypairs:
-        if k.name.startswith('ost1_test-'):
-            try:
-                LOG.info('Start keypair deletion: %s' % k)
-                manager._get_compute_client().keypairs.delete(k)
-            except Exception as exc:
-                LOG.debug(exc)
-                pass
+    def authenticate(self):
+        for client in (self.compute_client, self.volume_client):
+            # clients seeded with cached token are ready
+            if not client.client.auth_token:
+                client.authenticate()
 
-    users = manager._get_identity_client().users.list()
-    for user in users:
-        if user.name.startswith('ost1_test-'):
-            try:
-                LOG.info('Start deletion of users')
-                manager._get_identity_client().users.delete(user)
-            except exceptions as exc:
-                LOG.debug(exc)
-                pass
-
-    tenants = manager._get_identity_client().tenants.list()
-    for tenant in tenants:
-        if tenant.name.startswith('ost1_test-'):
-            try:
-                LOG.info('Start tenant deletion')
-                manager._get_identity_client().tenants.delete(tenant)
-            except Exception as exc:
-                LOG.debug(exc)
-                pass
-
-    roles = manager._get_identity_client().roles.list()
-    if roles:
-        for role in roles:
-            if role.name.startswith('ost1_test-'):
-                try:
-                    LOG.info('Start roles deletion')
-                    manager._get_identity_client().roles.delete(role)
-                except Exception as exc:
-                    LOG.debug(exc)
-                    pass
-    else:
-        LOG.info('no roles')
-
-    images = manager._get_compute_client().images.list()
-    for image in images:
-        if image.name.startswith('ost1'):
-            try:
-                LOG.info('Start images deletion')
-                manager._get_compute_client().images.delete(image)
-            except Exception as exc:
-                LOG.debug(exc)
-                pass
-
-    sec_groups = manager._get_compute_client().security_groups.list()
-
-    for sgroup in sec_groups:
-        if sgroup.name.startswith('ost1_test-'):
+    def wait_for_deletion(self, kind, get, resource_id, timeout, interval):
+        """Waits until resource can not be found anymore."""
+        start_time = time.time()
+        while True:
             try:
-                LOG.info('Start deletion of security groups')
-                manager._get_compute_client().security_groups.delete(sgroup.id)
+                resource = get(resource_id)
             except Exception as exc:
-                LOG.debug(exc)
-                pass
-
-    volumes = manager._get_volume_client().volumes.list()
+                if is_not_found(exc):
+                    return
+                raise
+            if getattr(resource, 'status', None) in ('ERROR',
+                                                     'error_deleting'):
+                raise exceptions.DeletionErrorException(
+                    kind=kind, resource_id=resource_id,
+                    status=resource.status)
+            if time.time() - start_time >= timeout:
+                raise exceptions.TimeoutException
+            time.sleep(interval)
 
-    for volume in volumes:
-        if volume.display_name.startswith('ost1_test-'):
-            try:
-                LOG.info('Start volumes deletion')
-                manager._get_volume_client().volumes.delete(volume)
-            except Exception as exc:
-                LOG.debug(exc)
-                pass
+    def wait_for_server_termination(self, server_id):
+        """Waits for server to reach termination."""
+        self.wait_for_deletion('server', self.compute_client.servers.get,
+                               server_id,
+                               self.config.compute.build_timeout,
+                               self.config.compute.build_interval)
+
+    def wait_for_volume_deletion(self, volume_id):
+        self.wait_for_deletion('volume', self.volume_client.volumes.get,
+                               volume_id,
+                               self.config.volume.build_timeout,
+                               self.config.volume.build_interval)
+
+
+def is_not_found(exc):
+    return getattr(exc, 'code', None) == 404
+
+
+# list: returns all resources of the kind, delete: deletes one of them
+# by id, match: tells if resource was made by tests, wait: waits for
+# deletion of resource with given id
+Kind = collections.namedtuple('Kind', 'list delete match wait')
+
+# resources of a tier are deleted concurrently once the previous
+# tier is deleted completely
+TIERS = (
+    ('stack',),
+    ('floating_ip', 'keypair'),
+    ('server',),
+    ('security_group', 'network', 'volume', 'image', 'flavor'),
+    ('volume_type', 'user', 'role'),
+    ('tenant',),
+)
+
+PREFIX = 'ost1_test-'
+POOL_SIZE = 8
+
+
+class ClientCall(object):
+    """Method of client of the manager that is looked up on every
+    call, so client of calling thread is used. Calls are serialized
+    if lock is given.
+    """
 
-    flavors = manager._get_compute_client().flavors.list()
+    def __init__(self, manager, path, lock=None):
+        self.manager = manager
+        self.path = path
+        self.lock = lock
+
+    def __getattr__(self, name):
+        return ClientCall(self.manager, self.path + (name,), self.lock)
+
+    def __call__(self, *args, **kwargs):
+        method = self.manager
+        for name in self.path:
+            method = getattr(method, name)
+        if self.lock is None:
+            return method(*args, **kwargs)
+        with self.lock:
+            return method(*args, **kwargs)
+
+
+def prefixed(attr='name', prefix=PREFIX):
+    return lambda resource: (getattr(resource, attr) or '').startswith(prefix)
+
+
+def get_kinds(manager):
+    compute = ClientCall(manager, ('compute_client',))
+    # keystone client is shared by the process
+    identity = ClientCall(manager, ('identity_client',), threading.Lock())
+    volume = ClientCall(manager, ('volume_client',))
+    heat = None
+    if manager.heat_client is not None:
+        heat = ClientCall(manager, ('heat_client',))
+    name = prefixed()
+
+    kinds = {
+        'floating_ip': Kind(compute.floating_ips.list,
+                            compute.floating_ips.delete, None, None),
+        'server': Kind(compute.servers.list, compute.servers.delete,
+                       name, manager.wait_for_server_termination),
+        'keypair': Kind(compute.keypairs.list, compute.keypairs.delete,
+                        name, None),
+        'security_group': Kind(compute.security_groups.list,
+                               compute.security_groups.delete, name, None),
+        'network': Kind(compute.networks.list, compute.networks.delete,
+                        prefixed('label'), None),
+        # snapshots made by tests are matched too
+        'image': Kind(compute.images.list, compute.images.delete,
+                      prefixed(prefix='ost1'), None),
+        'flavor': Kind(compute.flavors.list, compute.flavors.delete,
+                       name, None),
+        'volume': Kind(volume.volumes.list, volume.volumes.delete,
+                       prefixed('display_name'),
+                       manager.wait_for_volume_deletion),
+        'volume_type': Kind(volume.volume_types.list,
+                            volume.volume_types.delete, name, None),
+        'user': Kind(identity.users.list, identity.users.delete,
+                     name, None),
+        'role': Kind(identity.roles.list, identity.roles.delete,
+                     name, None),
+        'tenant': Kind(identity.tenants.list, identity.tenants.delete,
+                       name, None),
+    }
+    if heat is not None:
+        kinds['stack'] = Kind(
+            heat.stacks.list, heat.stacks.delete,
+            lambda s: s.stack_status in ('CREATE_COMPLETE', 'ERROR') and
+            prefixed('stack_name')(s), None)
+    return kinds
+
+
+def collect(pool, kinds):
+    """Lists resources of all kinds concurrently and returns
+    ids of the ones made by tests.
+    """
+    def list_kind(kind):
+        try:
+            return kinds[kind].list()
+        except Exception as exc:
+            LOG.debug(exc)
+            return []
+
+    names = kinds.keys()
+    resources = dict(zip(names, pool.map(list_kind, names)))
+    for kind, items in resources.items():
+        if kinds[kind].match:
+            resources[kind] = filter(kinds[kind].match, items)
+
+    # floating ips have no names, they belong to servers of tests
+    servers = set(server.id for server in resources.get('server', []))
+    resources['floating_ip'] = [f for f in resources.get('floating_ip', [])
+                                if f.instance_id in servers]
+    return dict((kind, [item.id for item in items])
+                for kind, items in resources.iteritems())
+
+
+class Throttle(object):
+    """Limits rate of deletions and stops them once time budget
+    is spent.
+
+    :param rate: deletions per second, unlimited if not given
+    :param budget: seconds after which no deletions are started
+    """
 
-    for flavor in flavors:
-        if flavor.name.startswith('ost1_test-'):
-            try:
-                LOG.info('start flavors deletion')
-                manager._get_compute_client().flavors.delete(flavor)
-            except Exception as exc:
-                LOG.debug(exc)
-                pass
+    def __init__(self, rate=None, budget=None):
+        self.interval = 1.0 / rate if rate else 0
+        self.deadline = time.time() + budget if budget else None
+        self._next = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Waits for turn of next deletion, returns False if it
+        does not fit into budget
+        """
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next)
+            if self.deadline and slot >= self.deadline:
+                return False
+            self._next = slot + self.interval
+        time.sleep(slot - now)
+        return True
+
+
+def recorded(test_run_id=None):
+    """Ids of resources left according to the ledger"""
+    resources = collections.defaultdict(list)
+    for kind, resource_id in ledger.pending(test_run_id):
+        resources[kind].append(resource_id)
+    return resources
+
+
+def delete_tier(pool, kinds, resources, tier, throttle=None):
+    """Deletes resources of the tier concurrently and waits for them,
+    deleted and missing resources are recorded in the ledger.
+
+    :returns: number of resources that were not deleted
+    """
+    def delete(job):
+        kind, resource_id = job
+        if throttle and not throttle.acquire():
+            return False
+        try:
+            LOG.info('Delete %s %s', kind, resource_id)
+            kinds[kind].delete(resource_id)
+        except Exception as exc:
+            LOG.debug(exc)
+            if not is_not_found(exc):
+                return False
+        ledger.forget(kind, resource_id)
+        return True
+
+    def wait(job):
+        kind, resource_id = job
+        try:
+            kinds[kind].wait(resource_id)
+        except Exception as exc:
+            LOG.debug(exc)
+
+    jobs = [(kind, resource_id) for kind in tier if kind in kinds
+            for resource_id in resources.get(kind, [])]
+    results = pool.map(delete, jobs)
+    deleted = [job for job, done in zip(jobs, results)
+               if done and kinds[job[0]].wait]
+    if deleted:
+        LOG.info('Wait for deletion of %s resources', len(deleted))
+        pool.map(wait, deleted)
+    return results.count(False)
+
+
+def cleanup(test_run_id=None, sweep=False, budget=None, rate=None):
+    """Deletes resources recorded in the ledger of the cluster,
+    only resources of test run if it is given. With sweep resources
+    are also found by prefix of their names, which requires listing
+    all resources of the cloud.
+
+    :param budget: seconds after which no deletions are started
+    :param rate: maximal number of deletions per second
+    :returns: number of resources that are left
+    """
+    test_run_id = test_run_id or os.environ.get('TEST_RUN_ID')
+    resources = recorded(test_run_id)
+    unknown = set(resources) - set(kind for tier in TIERS for kind in tier)
+    if unknown:
+        LOG.warning('Resources of unknown kinds are left: %s',
+                    ', '.join(unknown))
+    if not resources and not sweep:
+        LOG.info('No resources are left')
+        ledger.compact()
+        return 0
 
-    vtypes = manager._get_volume_client().volume_types.list()
-    for vtype in vtypes:
-        if vtype.name.startswith('ost1_test-'):
-            try:
-                LOG.info('start deletion of volume types')
-                manager._get_volume_client().volume_types.delete(vtype)
-            except Exception as exc:
-                LOG.debug(exc)
-                pass
+    manager = CleanUpClientManager()
+    manager.authenticate()
+
+    kinds = get_kinds(manager)
+    throttle = Throttle(rate, budget)
+    pool = ThreadPool(POOL_SIZE)
+    left = 0
+    try:
+        if sweep:
+            for kind, ids in collect(pool, kinds).iteritems():
+                resources[kind].extend(
+                    resource_id for resource_id in ids
+                    if resource_id not in resources[kind])
+        for tier in TIERS:
+            left += delete_tier(pool, kinds, resources, tier, throttle)
+    finally:
+        pool.close()
+        pool.join()
+    total = sum(len(resources.get(kind, [])) for tier in TIERS
+                for kind in tier if kind in kinds)
+    LOG.info('Deleted %s resources, %s are left', total - left, left)
+    if not left:
+        ledger.compact()
+    return left
 
 
 if __name__ == "__main__":
-    cleanup()
+    cleanup(sweep='--sweep' in sys.argv)
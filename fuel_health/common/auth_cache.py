@@ -0,0 +1,93 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Mirantis, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Process-wide cache of Keystone authentication.
+
+Keystone client is authenticated once per credentials and auth url,
+clients of other services use its token and service catalog instead
+of authenticating by themselves. Token is renewed shortly before
+it expires.
+"""
+
+import datetime
+import threading
+import time
+
+from fuel_health.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+# token is renewed that many seconds before it expires
+EXPIRY_MARGIN = 60
+# lifetime of token if keystone does not tell when it expires
+DEFAULT_TOKEN_TTL = 3600
+
+# (auth url, username, password, tenant name) -> [client, expires at]
+_cache = {}
+_lock = threading.Lock()
+
+
+def _expires_at(client):
+    expires = getattr(getattr(client, 'auth_ref', None), 'expires', None)
+    if not expires:
+        return time.time() + DEFAULT_TOKEN_TTL
+    # keystone reports expiry in UTC
+    left = expires.replace(tzinfo=None) - datetime.datetime.utcnow()
+    return time.time() + left.total_seconds()
+
+
+def get_identity_client(username, password, tenant_name, auth_url,
+                        insecure=False):
+    """Authenticated keystone client shared by the process"""
+    import keystoneclient.v2_0.client
+
+    key = (auth_url, username, password, tenant_name)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            client = keystoneclient.v2_0.client.Client(
+                username=username, password=password,
+                tenant_name=tenant_name, auth_url=auth_url,
+                insecure=insecure)
+            entry = _cache[key] = [client, _expires_at(client)]
+        elif time.time() > entry[1] - EXPIRY_MARGIN:
+            LOG.info('Token of %s expires, authenticating again', username)
+            entry[0].authenticate()
+            entry[1] = _expires_at(entry[0])
+        return entry[0]
+
+
+def url_for(keystone, service_type, endpoint_type='publicURL'):
+    """Endpoint of service from the catalog, None if there is none"""
+    try:
+        return keystone.service_catalog.url_for(service_type=service_type,
+                                                endpoint_type=endpoint_type)
+    except Exception as exc:
+        LOG.debug(exc)
+        return None
+
+
+def seed(client, keystone, service_type):
+    """Makes nova or cinder client use token and endpoint of keystone
+    client. Client still authenticates by itself once token is rejected.
+    """
+    endpoint = url_for(keystone, service_type)
+    if endpoint:
+        client.client.management_url = endpoint
+        client.client.auth_token = keystone.auth_token
+    return client
@@ -0,0 +1,176 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Mirantis, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Append-only ledger of OpenStack resources created by tests.
+
+Every created resource is recorded with its kind, id and test run
+that owns it, deleted resources are recorded as well. Ledger is a file
+of json lines per cluster, so cleanup deletes exactly the resources
+that are left instead of listing everything in the cloud. Records of
+deleted resources are dropped once ledger is compacted.
+"""
+
+import collections
+import contextlib
+import fcntl
+import json
+import os
+import re
+import tempfile
+import time
+
+from fuel_health.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+LEDGER_DIR_ENV = 'OSTF_LEDGER_DIR'
+# forget compacts ledger that grew over that many bytes
+COMPACT_SIZE = 1024 * 1024
+
+
+def get_path(cluster_id=None):
+    cluster_id = cluster_id or os.environ.get('CLUSTER_ID', 'default')
+    directory = os.environ.get(LEDGER_DIR_ENV, tempfile.gettempdir())
+    return os.path.join(directory,
+                        'ostf_resources_{0}.log'.format(cluster_id))
+
+
+def kind_of(thing):
+    """Kind of resource from name of its client class,
+    e.g. SecurityGroup -> security_group, FloatingIP -> floating_ip
+    """
+    name = thing.__class__.__name__
+    return re.sub(r'([a-z0-9])([A-Z])', r'\1_\2', name).lower()
+
+
+@contextlib.contextmanager
+def _locked(path, operation):
+    """Appends share the lock of ledger, compaction holds it alone,
+    so nothing is appended to the file that is being replaced.
+    """
+    with open(path + '.lock', 'a') as lock:
+        fcntl.flock(lock, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _append(entry, path=None):
+    path = path or get_path()
+    line = json.dumps(entry) + '\n'
+    try:
+        with _locked(path, fcntl.LOCK_SH):
+            # single write of a line to file opened for appending is
+            # not interleaved with writes of other test processes
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                         0644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+    except (IOError, OSError) as exc:
+        # test must not fail because of the ledger
+        LOG.warning('Resource %s %s is not recorded: %s',
+                    entry['kind'], entry['id'], exc)
+
+
+def record(thing, kind=None, path=None):
+    """Records resource created by test, thing is either resource
+    or its id, kind has to be given for ids.
+    """
+    _append({'kind': kind or kind_of(thing),
+             'id': getattr(thing, 'id', thing),
+             'test_run_id': os.environ.get('TEST_RUN_ID'),
+             'time': time.time()}, path)
+
+
+def forget(kind, resource_id, path=None):
+    path = path or get_path()
+    _append({'kind': kind, 'id': resource_id, 'deleted': True,
+             'time': time.time()}, path)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    if size > COMPACT_SIZE:
+        compact(path)
+
+
+def _replay(path):
+    """Entries of resources that were recorded and not deleted yet
+
+    :returns: dict of (kind, id) -> entry in order of creation
+    """
+    resources = collections.OrderedDict()
+    with open(path) as ledger:
+        for line in ledger:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            key = (entry['kind'], entry['id'])
+            if entry.get('deleted'):
+                resources.pop(key, None)
+            else:
+                resources.setdefault(key, entry)
+    return resources
+
+
+def pending(test_run_id=None, path=None):
+    """Resources that were recorded and not deleted yet, resources of
+    all test runs of the cluster are returned if test run is not given.
+
+    :returns: list of (kind, id) tuples in order of creation
+    """
+    try:
+        resources = _replay(path or get_path())
+    except IOError:
+        return []
+    return [key for key, entry in resources.iteritems()
+            if test_run_id is None or
+            str(entry.get('test_run_id')) == str(test_run_id)]
+
+
+def compact(path=None):
+    """Rewrites ledger with records of resources that are not deleted
+    yet, records of deleted resources are dropped.
+    """
+    path = path or get_path()
+    if not os.path.exists(path):
+        return
+    try:
+        with _locked(path, fcntl.LOCK_EX):
+            entries = _replay(path).values()
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(path) or '.',
+                prefix=os.path.basename(path))
+            try:
+                with os.fdopen(fd, 'w') as ledger:
+                    for entry in entries:
+                        ledger.write(json.dumps(entry) + '\n')
+                os.chmod(tmp_path, 0644)
+                os.rename(tmp_path, path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+    except (IOError, OSError) as exc:
+        LOG.warning('Ledger %s is not compacted: %s', path, exc)
+        return
+    LOG.info('Ledger %s is compacted, %s resources are left',
+             path, len(entries))
@@ -0,0 +1,63 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 Mirantis, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+Cache of lookups shared by tests of a run.
+
+Image, flavor and network lookups list whole catalogs of the cloud,
+they are resolved once per runner process. Entry is dropped once
+resource turns out to be gone, so it is resolved again.
+"""
+
+import threading
+
+from fuel_health.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def get(key, resolve):
+    """Value of key, resolve is called to get it unless it is cached.
+    None is not cached.
+    """
+    with _lock:
+        if key in _cache:
+            LOG.debug('Using cached %s %s', key, _cache[key])
+            return _cache[key]
+    value = resolve()
+    if value is not None:
+        LOG.info('Resolved %s to %s', key, value)
+        with _lock:
+            _cache[key] = value
+    return value
+
+
+def invalidate(*keys):
+    with _lock:
+        for key in keys:
+            if _cache.pop(key, None) is not None:
+                LOG.info('Cached %s is dropped', key)
+
+
+def is_not_found(exc):
+    """Tells if exception means that resource is gone, nova answers
+    bad request for server with unknown image or flavor
+    """
+    return getattr(exc, 'code', None) in (400, 404)
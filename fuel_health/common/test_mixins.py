@@ -14,6 +14,7 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import os
 import signal
 import time
 
@@ -155,6 +156,9 @@ class FuelTestAssertMixin(object):
         :msg: message that will be displayed if an exception occurs;
         :action: action that is performed by the method.
         """
+        # set by OSTF runner when test run is stopped
+        if os.environ.get('OSTF_CANCELLED'):
+            self.fail("Step %s was not run: test run was stopped." % step)
         try:
             with timeout(secs, action):
                 result = func(*args, **kwargs)
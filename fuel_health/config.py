@@ -16,8 +16,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import fcntl
+import hashlib
+import json
+from multiprocessing.pool import ThreadPool
 import os
 import sys
+import tempfile
+import time
 
 from oslo.config import cfg
 import requests
@@ -365,8 +372,38 @@ class ConfigGroup(object):
             self.__dict__)
 
 
+SNAPSHOT_DIR_ENV = 'OSTF_SNAPSHOT_DIR'
+
+
+def get_snapshot_path(cluster_id):
+    directory = os.environ.get(SNAPSHOT_DIR_ENV, tempfile.gettempdir())
+    return os.path.join(directory,
+                        'ostf_nailgun_{0}.json'.format(cluster_id))
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    with open(path, 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def fingerprint(data):
+    return hashlib.md5(json.dumps(data, sort_keys=True)).hexdigest()
+
+
 @process_singleton
 class NailgunConfig(object):
+    """Configuration of the cluster under test taken from Nailgun.
+
+    Responses of Nailgun are kept in a snapshot file shared by all
+    processes of a test run. Snapshot is fetched completely for every
+    test run, within a run it is fetched again once its TTL passes
+    and the cluster changed.
+    """
 
     identity = ConfigGroup(IdentityGroup)
     compute = ConfigGroup(ComputeGroup)
@@ -375,6 +412,16 @@ class NailgunConfig(object):
     volume = ConfigGroup(VolumeGroup)
     object_storage = ConfigGroup(ObjectStoreConfig)
 
+    SNAPSHOT_TTL = 600
+    # snapshot key -> api url, all of them are fetched at once
+    SNAPSHOT_APIS = {
+        'cluster': '/api/clusters/{0}',
+        'attributes': '/api/clusters/{0}/attributes',
+        'nodes': '/api/nodes?cluster_id={0}',
+        'networks': '/api/clusters/{0}/network_configuration/',
+        'ostf': '/api/ostf/{0}',
+    }
+
     def __init__(self, parse=True):
         LOG.info('INITIALIZING NAILGUN CONFIG')
         self.nailgun_host = os.environ.get('NAILGUN_HOST', None)
@@ -389,32 +436,111 @@ class NailgunConfig(object):
 
     def prepare_config(self, *args, **kwargs):
         try:
-            self._parse_meta()
-            self._parse_cluster_attributes()
-            self._parse_nodes_cluster_id()
-            self._parse_networks_configuration()
-            self.set_endpoints()
+            snapshot = self.get_snapshot()
+            self._parse_meta(snapshot['cluster'])
+            self._parse_cluster_attributes(snapshot['attributes'])
+            self._parse_nodes_cluster_id(snapshot['nodes'])
+            self._parse_networks_configuration(snapshot['networks'])
+            self.set_endpoints(snapshot.get('ostf'))
             self.set_proxy()
         except Exception, e:
             LOG.warning('Nailgun config creation failed. '
                         'Something wrong with endpoints')
 
-    def _parse_cluster_attributes(self):
-        api_url = '/api/clusters/%s/attributes' % self.cluster_id
+    def _get(self, api):
+        api_url = api.format(self.cluster_id)
         response = self.req_session.get(self.nailgun_url + api_url)
         LOG.info('RESPONSE %s STATUS %s' % (api_url, response.status_code))
-        data = response.json()
-        LOG.info('RESPONSE FROM %s - %s' % (api_url, data))
+        return response.json()
+
+    def fetch_snapshot(self):
+        """Fetches responses of all apis concurrently"""
+        def fetch(key):
+            try:
+                return self._get(self.SNAPSHOT_APIS[key])
+            except Exception:
+                # ostf api is needed only for some of the clusters
+                if key == 'ostf':
+                    return None
+                raise
+
+        keys = self.SNAPSHOT_APIS.keys()
+        pool = ThreadPool(len(keys))
+        try:
+            return dict(zip(keys, pool.map(fetch, keys)))
+        finally:
+            pool.close()
+
+    def _load_snapshot(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _save_snapshot(self, path, snapshot):
+        # snapshot holds credentials, file is readable by owner only
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        os.rename(tmp_path, path)
+
+    def _is_current(self, snapshot):
+        return snapshot and \
+            snapshot['test_run_id'] == os.environ.get('TEST_RUN_ID')
+
+    def _is_fresh(self, snapshot):
+        return self._is_current(snapshot) and \
+            time.time() - snapshot['time'] < self.SNAPSHOT_TTL
+
+    def get_snapshot(self):
+        """Responses of Nailgun apis from the snapshot, snapshot that
+        is not fresh is refreshed by one process while others wait.
+        """
+        path = get_snapshot_path(self.cluster_id)
+        snapshot = self._load_snapshot(path)
+        if self._is_fresh(snapshot):
+            return snapshot['data']
+
+        with file_lock(path + '.lock'):
+            snapshot = self._load_snapshot(path)
+            if self._is_fresh(snapshot):
+                return snapshot['data']
+
+            try:
+                data = None
+                if self._is_current(snapshot):
+                    # attributes, nodes and networks are not expected
+                    # to change during test run unless cluster does
+                    cluster = self._get(self.SNAPSHOT_APIS['cluster'])
+                    if fingerprint(cluster) == snapshot['fingerprint']:
+                        data = snapshot['data']
+                if data is None:
+                    LOG.info('Fetching configuration of cluster %s',
+                             self.cluster_id)
+                    data = self.fetch_snapshot()
+            except Exception:
+                if not snapshot:
+                    raise
+                LOG.warning('Nailgun is not available, using '
+                            'configuration of cluster from snapshot')
+                return snapshot['data']
+            self._save_snapshot(path, {
+                'time': time.time(),
+                'test_run_id': os.environ.get('TEST_RUN_ID'),
+                'fingerprint': fingerprint(data['cluster']),
+                'data': data})
+        return data
+
+    def _parse_cluster_attributes(self, data):
+        LOG.info('RESPONSE FROM %s - %s' % (
+            self.SNAPSHOT_APIS['attributes'].format(self.cluster_id), data))
         access_data = data['editable']['access']
         self.identity.admin_tenant_name = access_data['tenant']['value']
         self.identity.admin_username = access_data['user']['value']
         self.identity.admin_password = access_data['password']['value']
 
-    def _parse_nodes_cluster_id(self):
-        api_url = '/api/nodes?cluster_id=%s' % self.cluster_id
-        response = self.req_session.get(self.nailgun_url + api_url)
-        LOG.info('RESPONSE %s STATUS %s' % (api_url, response.status_code))
-        data = response.json()
+    def _parse_nodes_cluster_id(self, data):
         controller_nodes = filter(lambda node: 'controller' in node['roles'],
                                   data)
         cinder_nodes = filter(lambda node: 'cinder' in node['roles'],
@@ -443,25 +569,19 @@ class NailgunConfig(object):
         LOG.info("COMPUTES IPS %s" % compute_ips)
         self.compute.compute_nodes = compute_ips
 
-    def _parse_meta(self):
-        api_url = '/api/clusters/%s' % self.cluster_id
-        data = self.req_session.get(self.nailgun_url + api_url).json()
+    def _parse_meta(self, data):
         self.mode = data['mode']
         self.compute.deployment_mode = self.mode
         self.compute.deployment_os = data['release']['operating_system']
 
-    def _parse_networks_configuration(self):
-        api_url = '/api/clusters/%s/network_configuration/' % self.cluster_id
-        data = self.req_session.get(self.nailgun_url + api_url).json()
+    def _parse_networks_configuration(self, data):
         self.network.raw_data = data
 
-    def _parse_ostf_api(self):
+    def _parse_ostf_api(self, data=None):
         """
             will leave this
         """
-        api_url = '/api/ostf/%s' % self.cluster_id
-        response = self.req_session.get(self.nailgun_url + api_url)
-        data = response.json()
+        data = data or self._get(self.SNAPSHOT_APIS['ostf'])
         self.identity.url = data['horizon_url'] + 'dashboard'
         self.identity.uri = data['keystone_url'] + 'v2.0/'
 
@@ -473,11 +593,11 @@ class NailgunConfig(object):
         os.environ['http_proxy'] = 'http://{0}:{1}'.format(
             self.compute.controller_nodes[0], 8888)
 
-    def set_endpoints(self):
+    def set_endpoints(self, ostf_data=None):
         public_vip = self.network.raw_data.get('public_vip', None)
         # workaround for api without public_vip for ha mode
         if not public_vip and self.mode == 'ha':
-            self._parse_ostf_api()
+            self._parse_ostf_api(ostf_data)
         else:
             endpoint = public_vip or self.compute.public_ips[0]
             self.identity.url = 'http://{0}/{1}/'.format(endpoint, 'dashboard')
@@ -95,6 +95,11 @@ class StackBuildErrorException(FuelException):
                "due to '%(stack_status_reason)s'")
 
 
+class DeletionErrorException(FuelException):
+    message = ("%(kind)s %(resource_id)s failed to be deleted and is in "
+               "%(status)s status")
+
+
 class BadRequest(RestClientException):
     message = "Bad request"
 
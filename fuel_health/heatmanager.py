@@ -18,10 +18,11 @@
 
 import logging
 
-import heatclient.v1.client
-
+from fuel_health.common import auth_cache
+from fuel_health.common import ledger
 from fuel_health.common.utils.data_utils import rand_name
 from fuel_health import config
+from fuel_health.manager import LazyClient
 import fuel_health.nmanager
 import fuel_health.test
 
@@ -34,21 +35,23 @@ class HeatManager(fuel_health.nmanager.OfficialClientManager):
     HeatManager provides access to the official python client of Heat.
     """
 
+    heat_client = LazyClient('heat_client')
+
     def __init__(self):
         super(HeatManager, self).__init__()
-        self.heat_client = self._get_heat_client()
         self.client_attr_names.append('heat_client')
 
     def _get_heat_client(self, username=None, password=None):
+        import heatclient.v1.client
+
         keystone = self._get_identity_client()
         token = keystone.auth_token
         auth_url = self.config.identity.uri
 
-        if 'orchestration' not in [s.type for s in keystone.services.list()]:
+        endpoint = auth_cache.url_for(keystone, 'orchestration')
+        if not endpoint:
             return None
 
-        endpoint = keystone.service_catalog.url_for(
-            service_type='orchestration', endpoint_type='publicURL')
         if not username:
             username = self.config.identity.admin_username
         if not password:
@@ -124,14 +127,13 @@ class HeatBaseTest(fuel_health.nmanager.OfficialClientTest):
         """
         Delete stacks that were created by OSTF tests.
         """
-        for s in cls.heat_client.stacks.list():
-            if s.stack_name in cls.stacks:
-                if s.stack_status in ('CREATE_COMPLETE', 'ERROR'):
-                    try:
-                        cls.heat_client.stacks.delete(s.id)
-                    except Exception as exc:
-                        cls.error_msg.append(exc)
-                        LOG.debug(exc)
+        for stack_id in cls.stacks:
+            try:
+                cls.heat_client.stacks.delete(stack_id)
+                ledger.forget('stack', stack_id)
+            except Exception as exc:
+                cls.error_msg.append(exc)
+                LOG.debug(exc)
 
     def list_stacks(self, client):
         return client.stacks.list()
@@ -160,7 +162,8 @@ class HeatBaseTest(fuel_health.nmanager.OfficialClientTest):
         # so need to request them:
         stack = self.find_stack(client, 'stack_name', stack_name)
         if stack is not None:
-            self.stacks.append(stack_name)
+            ledger.record(stack)
+            self.stacks.append(stack.id)
         return stack
 
     def update_stack(self, client, stack_id, template=None):
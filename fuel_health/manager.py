@@ -23,6 +23,39 @@ import fuel_health.config
 LOG = logging.getLogger(__name__)
 
 
+class LazyClient(object):
+    """Client of a manager that is created on first access
+    by _get_<name> method of the manager.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, manager, owner):
+        if manager is None:
+            return self
+        LOG.debug('Creating %s of %s', self.name, manager)
+        client = getattr(manager, '_get_' + self.name)()
+        # client is looked up in the manager from now on
+        manager.__dict__[self.name] = client
+        return client
+
+
+class ThreadLocalClient(LazyClient):
+    """Client of a manager that is created once per thread using it,
+    clients of OpenStack are not thread-safe.
+    """
+
+    def __get__(self, manager, owner):
+        if manager is None:
+            return self
+        clients = manager.thread_clients.__dict__
+        if self.name not in clients:
+            LOG.debug('Creating %s of %s for thread', self.name, manager)
+            clients[self.name] = getattr(manager, '_get_' + self.name)()
+        return clients[self.name]
+
+
 class Manager(object):
 
     """
@@ -35,3 +68,7 @@ class Manager(object):
     def __init__(self):
         self.config = fuel_health.config.FuelConfig()
         self.client_attr_names = []
+
+    def is_loaded(self, attr_name):
+        """Tells if client was created already"""
+        return attr_name in self.__dict__
@@ -18,20 +18,18 @@
 
 import logging
 
-# Default client libs
-import cinderclient.client
-import glanceclient.client
-import keystoneclient.v2_0.client
-import novaclient.client
-
 import time
 
+from fuel_health.common import auth_cache
+from fuel_health.common import ledger
+from fuel_health.common import resource_cache
 from fuel_health.common.ssh import Client as SSHClient
 from fuel_health.exceptions import SSHExecCommandFailed
 from fuel_health.common.utils.data_utils import rand_name
 from fuel_health.common.utils.data_utils import rand_int_id
 from fuel_health import exceptions
 import fuel_health.manager
+from fuel_health.manager import LazyClient
 import fuel_health.test
 from fuel_health import config
 
@@ -43,18 +41,23 @@ class OfficialClientManager(fuel_health.manager.Manager):
     """
     Manager that provides access to the official python clients for
     calling various OpenStack APIs.
+
+    Clients share token and service catalog of the identity client,
+    which is authenticated once per process. Clients and their
+    libraries are loaded on first access.
     """
 
     NOVACLIENT_VERSION = '2'
     CINDERCLIENT_VERSION = '1'
 
+    compute_client = LazyClient('compute_client')
+    image_client = LazyClient('image_client')
+    identity_client = LazyClient('identity_client')
+    network_client = LazyClient('network_client')
+    volume_client = LazyClient('volume_client')
+
     def __init__(self):
         super(OfficialClientManager, self).__init__()
-        self.compute_client = self._get_compute_client()
-        self.image_client = self._get_image_client()
-        self.identity_client = self._get_identity_client()
-        self.network_client = self._get_network_client()
-        self.volume_client = self._get_volume_client()
         self.client_attr_names = [
             'compute_client',
             'image_client',
@@ -65,6 +68,8 @@ class OfficialClientManager(fuel_health.manager.Manager):
 
     def _get_compute_client(self, username=None, password=None,
                             tenant_name=None):
+        import novaclient.client
+
         if not username:
             username = self.config.identity.admin_username
         if not password:
@@ -85,13 +90,18 @@ class OfficialClientManager(fuel_health.manager.Manager):
 
         # Create our default Nova client to use in testing
         service_type = self.config.compute.catalog_type
-        return novaclient.client.Client(self.NOVACLIENT_VERSION,
-                                        *client_args,
-                                        service_type=service_type,
-                                        no_cache=True,
-                                        insecure=dscv)
+        client = novaclient.client.Client(self.NOVACLIENT_VERSION,
+                                          *client_args,
+                                          service_type=service_type,
+                                          no_cache=True,
+                                          insecure=dscv)
+        return auth_cache.seed(
+            client, self._get_identity_client(username, password,
+                                              tenant_name), service_type)
 
     def _get_image_client(self):
+        import glanceclient.client
+
         keystone = self._get_identity_client()
         token = keystone.auth_token
         endpoint = keystone.service_catalog.url_for(service_type='image',
@@ -102,6 +112,8 @@ class OfficialClientManager(fuel_health.manager.Manager):
 
     def _get_volume_client(self, username=None, password=None,
                            tenant_name=None):
+        import cinderclient.client
+
         if not username:
             username = self.config.identity.admin_username
         if not password:
@@ -110,11 +122,17 @@ class OfficialClientManager(fuel_health.manager.Manager):
             tenant_name = self.config.identity.admin_tenant_name
 
         auth_url = self.config.identity.uri
-        return cinderclient.client.Client(self.CINDERCLIENT_VERSION,
-                                          username,
-                                          password,
-                                          tenant_name,
-                                          auth_url)
+        client = cinderclient.client.Client(self.CINDERCLIENT_VERSION,
+                                            username,
+                                            password,
+                                            tenant_name,
+                                            auth_url)
+        if None in (username, password, tenant_name):
+            return client
+        return auth_cache.seed(
+            client, self._get_identity_client(username, password,
+                                              tenant_name),
+            self.config.volume.catalog_type)
 
     def _get_identity_client(self, username=None, password=None,
                              tenant_name=None):
@@ -134,11 +152,9 @@ class OfficialClientManager(fuel_health.manager.Manager):
         auth_url = self.config.identity.uri
         dscv = self.config.identity.disable_ssl_certificate_validation
 
-        return keystoneclient.v2_0.client.Client(username=username,
-                                                 password=password,
-                                                 tenant_name=tenant_name,
-                                                 auth_url=auth_url,
-                                                 insecure=dscv)
+        return auth_cache.get_identity_client(username, password,
+                                              tenant_name, auth_url,
+                                              insecure=dscv)
 
     def _get_network_client(self):
         username = self.config.identity.admin_username
@@ -162,29 +178,36 @@ class OfficialClientTest(fuel_health.test.TestCase):
 
     @classmethod
     def _create_nano_flavor(cls):
-        name = rand_name('ost1_test-flavor-nano')
-        flavorid = 42
-        flavor_list = cls.compute_client.flavors.list()
-        if flavor_list:
-            for flavor in flavor_list:
-                LOG.debug(flavor.id)
-                if '42' in flavor.id:
-                    LOG.info('42 flavor id already exists')
-                    return flavor
-
-            flavor = cls.compute_client.flavors.create(
-                name, 64, 1, 1, flavorid)
-            return flavor
+        def create():
+            name = rand_name('ost1_test-flavor-nano')
+            flavorid = 42
+            flavor_list = cls.compute_client.flavors.list()
+            if flavor_list:
+                for flavor in flavor_list:
+                    LOG.debug(flavor.id)
+                    if '42' in flavor.id:
+                        LOG.info('42 flavor id already exists')
+                        return flavor
+
+                flavor = cls.compute_client.flavors.create(
+                    name, 64, 1, 1, flavorid)
+                ledger.record(flavor)
+                return flavor
+
+        return resource_cache.get('nano flavor', create)
 
     @classmethod
     def tearDownClass(cls):
         cls.error_msg = []
-        try:
-            cls.compute_client.flavors.delete('42')
-        except Exception as exc:
-            cls.error_msg.append(exc)
-            LOG.debug(exc)
-            pass
+        # nano flavor can be made only by tests that used compute
+        if cls.manager.is_loaded('compute_client'):
+            resource_cache.invalidate('nano flavor')
+            try:
+                cls.compute_client.flavors.delete('42')
+            except Exception as exc:
+                cls.error_msg.append(exc)
+                LOG.debug(exc)
+                pass
         while cls.os_resources:
             thing = cls.os_resources.pop()
             LOG.debug("Deleting %r from shared resources of %s" %
@@ -194,9 +217,11 @@ class OfficialClientTest(fuel_health.test.TestCase):
                 # OpenStack resources are assumed to have a delete()
                 # method which destroys the resource...
                 thing.delete()
+                ledger.forget(ledger.kind_of(thing), thing.id)
             except Exception as e:
                 # If the resource is already missing, mission accomplished.
                 if e.__class__.__name__ == 'NotFound':
+                    ledger.forget(ledger.kind_of(thing), thing.id)
                     continue
                 cls.error_msg.append(e)
                 LOG.debug(e)
@@ -238,7 +263,7 @@ class NovaNetworkScenarioTest(OfficialClientTest):
             cls._enabled = True
             # ensure the config says true
             try:
-                cls.compute_client.networks.list()
+                check_nova_networks(cls.compute_client)
             except exceptions.EndpointNotFound:
                 cls._enabled = False
 
@@ -349,8 +374,13 @@ class NovaNetworkScenarioTest(OfficialClientTest):
             'security_groups': security_groups,
         }
         self._create_nano_flavor()
-        server = client.servers.create(name, base_image_id, 42,
-                                       **create_kwargs)
+        try:
+            server = client.servers.create(name, base_image_id, 42,
+                                           **create_kwargs)
+        except Exception as exc:
+            if resource_cache.is_not_found(exc):
+                resource_cache.invalidate('image', 'nano flavor')
+            raise
         self.verify_response_body_content(server.name,
                                           name,
                                           "Instance creation failed")
@@ -369,6 +399,7 @@ class NovaNetworkScenarioTest(OfficialClientTest):
         if floating_ips_pool:
             floating_ip = self.compute_client.floating_ips.create(
                 pool=floating_ips_pool[0].name)
+            ledger.record(floating_ip)
 
             self.floating_ips.append(floating_ip)
             return floating_ip
@@ -490,16 +521,29 @@ class NovaNetworkScenarioTest(OfficialClientTest):
 def get_image_from_name():
     cfg = config.FuelConfig()
     image_name = cfg.compute.image_name
-    image_client = OfficialClientManager()._get_compute_client()
-    images = image_client.images.list()
-    LOG.debug(images)
-    if images:
-        for im in images:
-            LOG.debug(im.name)
-            if im.name.strip().lower() == image_name.strip().lower():
-                return im.id
-    else:
-        raise exceptions.ImageFault
+
+    def find():
+        image_client = OfficialClientManager().compute_client
+        images = image_client.images.list()
+        LOG.debug(images)
+        if images:
+            for im in images:
+                LOG.debug(im.name)
+                if im.name.strip().lower() == image_name.strip().lower():
+                    return im.id
+        else:
+            raise exceptions.ImageFault
+
+    return resource_cache.get('image', find)
+
+
+def check_nova_networks(client):
+    """Raises EndpointNotFound if nova networks are not available"""
+    def probe():
+        client.networks.list()
+        return True
+
+    resource_cache.get('nova networks', probe)
 
 
 class SanityChecksTest(OfficialClientTest):
@@ -518,7 +562,7 @@ class SanityChecksTest(OfficialClientTest):
             cls._enabled = True
             # ensure the config says true
             try:
-                cls.compute_client.networks.list()
+                check_nova_networks(cls.compute_client)
             except exceptions.EndpointNotFound:
                 cls._enabled = False
 
@@ -612,6 +656,7 @@ class SmokeChecksTest(OfficialClientTest):
         name = rand_name('ost1_test-flavor-')
         flavorid = rand_int_id()
         flavor = client.flavors.create(name, ram, disk, vcpus, flavorid)
+        ledger.record(flavor)
         self.flavors.append(flavor)
         return flavor
 
@@ -629,6 +674,7 @@ class SmokeChecksTest(OfficialClientTest):
     def _create_tenant(self, client):
         name = rand_name('ost1_test-tenant-')
         tenant = client.tenants.create(name)
+        ledger.record(tenant)
         self.tenants.append(tenant)
         return tenant
 
@@ -648,6 +694,7 @@ class SmokeChecksTest(OfficialClientTest):
         email = "test@test.com"
         name = rand_name('ost1_test-user-')
         user = client.users.create(name, password, email, tenant_id)
+        ledger.record(user)
         self.users.append(user)
         return user
 
@@ -665,6 +712,7 @@ class SmokeChecksTest(OfficialClientTest):
     def _create_role(self, client):
         name = rand_name('ost1_test-role-')
         role = client.roles.create(name)
+        ledger.record(role)
         self.roles.append(role)
         return role
 
@@ -704,7 +752,12 @@ class SmokeChecksTest(OfficialClientTest):
         name = rand_name('ost1_test-volume-instance')
         base_image_id = get_image_from_name()
         flavor_id = self._create_nano_flavor().id
-        server = client.servers.create(name, base_image_id, flavor_id)
+        try:
+            server = client.servers.create(name, base_image_id, flavor_id)
+        except Exception as exc:
+            if resource_cache.is_not_found(exc):
+                resource_cache.invalidate('image', 'nano flavor')
+            raise
         self.set_resource(name, server)
         self.verify_response_body_content(server.name,
                                           name,
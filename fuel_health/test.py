@@ -22,6 +22,7 @@ import testresources
 import unittest2
 
 from fuel_health import config
+from fuel_health.common import ledger
 from fuel_health.common import log as logging
 from fuel_health.common.test_mixins import FuelTestAssertMixin
 
@@ -66,6 +67,18 @@ def call_until_true(func, duration, sleep_for):
     return False
 
 
+class ManagerClient(object):
+    """Client of the manager of test class, which is created
+    by the manager on first access.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, test, cls):
+        return getattr(cls.manager, self.name)
+
+
 class TestCase(BaseTestCase):
     """Base test case class for all tests
 
@@ -81,9 +94,11 @@ class TestCase(BaseTestCase):
         for attr_name in cls.manager.client_attr_names:
             # Ensure that pre-existing class attributes won't be
             # accidentally overriden.
-            assert not hasattr(cls, attr_name)
-            client = getattr(cls.manager, attr_name)
-            setattr(cls, attr_name, client)
+            existing = next((klass.__dict__[attr_name]
+                             for klass in cls.__mro__
+                             if attr_name in klass.__dict__), None)
+            assert existing is None or isinstance(existing, ManagerClient)
+            setattr(cls, attr_name, ManagerClient(attr_name))
         cls.resource_keys = {}
         cls.os_resources = []
 
@@ -92,6 +107,7 @@ class TestCase(BaseTestCase):
                   (thing, self.__class__.__name__))
         self.resource_keys[key] = thing
         self.os_resources.append(thing)
+        ledger.record(thing)
 
     def get_resource(self, key):
         return self.resource_keys[key]
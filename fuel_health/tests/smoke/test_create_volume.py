@@ -25,6 +25,10 @@ LOG = logging.getLogger(__name__)
 
 class VolumesTest(nmanager.SmokeChecksTest):
 
+    # servers are booted with nano flavor, which is deleted
+    # by tear down of other classes
+    _parallel_ = False
+
     @classmethod
     def setUpClass(cls):
         super(VolumesTest, cls).setUpClass()
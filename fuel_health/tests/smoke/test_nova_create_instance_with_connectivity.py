@@ -36,6 +36,9 @@ class TestNovaNetwork(nmanager.NovaNetworkScenarioTest):
      - Instance connectivity by floating IP
     """
 
+    # floating ips and networks are shared by the cluster
+    _parallel_ = False
+
     @classmethod
     def check_preconditions(cls):
         super(TestNovaNetwork, cls).check_preconditions()
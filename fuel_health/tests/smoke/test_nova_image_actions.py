@@ -18,6 +18,7 @@ import logging
 from nose.plugins.attrib import attr
 
 
+from fuel_health.common import ledger
 from fuel_health.common.utils.data_utils import rand_name
 from fuel_health import nmanager
 from fuel_health import test
@@ -35,6 +36,10 @@ class TestImageAction(nmanager.SmokeChecksTest):
       - verify that instance can be booted from a snapshot.
     """
 
+    # servers are booted with nano flavor, which is deleted
+    # by tear down of other classes
+    _parallel_ = False
+
     def setUp(self):
         super(TestImageAction, self).setUp()
         if not self.config.compute.compute_nodes:
@@ -90,7 +95,8 @@ class TestImageAction(nmanager.SmokeChecksTest):
         snapshot_name = rand_name('ost1_test-snapshot-')
         create_image_client = self.compute_client.servers.create_image
         image_id = create_image_client(server, snapshot_name)
-        self.addCleanup(self.compute_client.images.delete, image_id)
+        ledger.record(image_id, kind='image')
+        self.addCleanup(self._delete_image, image_id)
         self._wait_for_server_status(server, 'ACTIVE')
         self._wait_for_image_status(image_id, 'ACTIVE')
         snapshot_image = self.compute_client.images.get(image_id)
@@ -99,6 +105,14 @@ class TestImageAction(nmanager.SmokeChecksTest):
             msg="Please refer to OpenStack logs for more details.")
         return image_id
 
+    def _delete_image(self, image_id):
+        try:
+            self.compute_client.images.delete(image_id)
+        except Exception as exc:
+            if exc.__class__.__name__ != 'NotFound':
+                raise
+        ledger.forget('image', image_id)
+
     @attr(type=['sanity', 'fuel'])
     def test_snapshot(self):
         """Launch instance, create snapshot, launch instance from snapshot
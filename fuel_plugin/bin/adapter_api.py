@@ -17,11 +17,17 @@
 import os
 import logging
 import signal
+import tempfile
 
 from fuel_plugin.ostf_adapter import cli_config
 from fuel_plugin.ostf_adapter import nailgun_hooks
 from fuel_plugin.ostf_adapter import logger
+from fuel_plugin.ostf_adapter import prefork
+from fuel_plugin.ostf_adapter import sweeper
 from fuel_plugin.ostf_adapter.nose_plugin import nose_discovery
+from fuel_plugin.ostf_adapter.nose_plugin import nose_utils
+from fuel_plugin.ostf_adapter.nose_plugin import nose_zygote
+from fuel_plugin.ostf_adapter.storage import engine, storage_utils
 from gevent import pywsgi
 from fuel_plugin.ostf_adapter.wsgi import app
 import pecan
@@ -36,6 +42,14 @@ def main():
             'host': cli_args.host,
             'port': cli_args.port
         },
+        'runner': {
+            'timeout_multiplier': cli_args.timeout_multiplier,
+            'timeout_ceiling': cli_args.timeout_ceiling,
+            'pool_size': cli_args.runner_pool_size,
+            'zygote_socket': os.path.join(
+                tempfile.gettempdir(),
+                'ostf_runner_zygote_{0}.sock'.format(cli_args.port))
+        },
         'dbpath': cli_args.dbpath,
         'debug': cli_args.debug,
         'debug_tests': cli_args.debug_tests
@@ -49,15 +63,54 @@ def main():
 
     if getattr(cli_args, 'after_init_hook'):
         return nailgun_hooks.after_initialization_environment_hook()
-    nose_discovery.discovery(cli_args.debug_tests)
+
+    # runners survive server restart, only orphaned runs are interrupted
+    session = engine.get_session()
+    with session.begin(subtransactions=True):
+        interrupted = storage_utils.reap_orphaned_test_runs(session)
+
+    if cli_args.runner_pool_size:
+        nose_zygote.start(
+            pecan.conf.runner.zygote_socket, cli_args.runner_pool_size,
+            {'dbpath': pecan.conf.dbpath,
+             'nailgun': pecan.conf.nailgun.to_dict(),
+             'runner': pecan.conf.runner.to_dict()},
+            log_file=cli_args.log_file)
+
+    if interrupted and cli_args.auto_resume:
+        with session.begin(subtransactions=True):
+            storage_utils.resume_test_runs(session, interrupted)
+
     host, port = pecan.conf.server.host, pecan.conf.server.port
-    srv = pywsgi.WSGIServer((host, int(port)), root)
 
     log.info('Starting server in PID %s', os.getpid())
+
+    # discovery imports all test modules, so it is done in background
+    # when server already accepts requests
+    start_discovery = lambda: nose_utils.run_proc(
+        nose_discovery.discovery, cli_args.debug_tests, False,
+        cli_args.static_discovery)
+
+    if cli_args.sweeper_interval:
+        nose_utils.run_proc(sweeper.Sweeper(
+            cli_args.sweeper_interval, cli_args.sweeper_idle,
+            cli_args.sweeper_budget, cli_args.sweeper_rate,
+            prefix=cli_args.sweeper_prefix).run)
+
+    if cli_args.workers > 1:
+        master = prefork.Master(root, host, port, cli_args.workers,
+                                max_requests=cli_args.max_requests,
+                                max_memory=cli_args.max_memory,
+                                on_start=start_discovery)
+        return master.run()
+
+    srv = pywsgi.WSGIServer((host, int(port)), root)
     log.info("serving on http://%s:%s", host, port)
 
     try:
         signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        srv.start()
+        start_discovery()
         srv.serve_forever()
     except KeyboardInterrupt:
         pass
@@ -31,4 +31,49 @@ def parse_cli():
     parser.add_argument('--nailgun-host', default='127.0.0.1')
     parser.add_argument('--nailgun-port', default='3232')
     parser.add_argument('--debug_tests', default=None)
+    parser.add_argument('--static-discovery', action='store_true',
+                        dest='static_discovery',
+                        help='Discover tests by analyzing their sources '
+                             'instead of importing them')
+    parser.add_argument('--test-timeout-multiplier', type=float, default=3,
+                        metavar='N', dest='timeout_multiplier',
+                        help='Interrupt tests running N times longer '
+                             'than their declared duration')
+    parser.add_argument('--test-timeout-ceiling', type=int, default=1800,
+                        metavar='SECONDS', dest='timeout_ceiling',
+                        help='Maximal time any test is allowed to run')
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help='Number of pre-forked worker processes')
+    parser.add_argument('--max-requests', type=int, default=0,
+                        metavar='N', dest='max_requests',
+                        help='Recycle worker after N requests, 0 - never')
+    parser.add_argument('--max-memory', type=int, default=0,
+                        metavar='MB', dest='max_memory',
+                        help='Recycle worker when its RSS exceeds MB')
+    parser.add_argument('--runner-pool-size', type=int, default=0,
+                        metavar='N', dest='runner_pool_size',
+                        help='Keep N pre-forked test runners in a zygote '
+                             'process, 0 - fork runners from server')
+    parser.add_argument('--sweeper-interval', type=int, default=0,
+                        metavar='SECONDS', dest='sweeper_interval',
+                        help='Look for idle clusters to delete resources '
+                             'left by tests every SECONDS, 0 - never')
+    parser.add_argument('--sweeper-idle', type=int, default=600,
+                        metavar='SECONDS', dest='sweeper_idle',
+                        help='Cluster is swept once it is not tested '
+                             'for SECONDS')
+    parser.add_argument('--sweeper-budget', type=int, default=120,
+                        metavar='SECONDS', dest='sweeper_budget',
+                        help='Time to spend on sweep of one cluster')
+    parser.add_argument('--sweeper-rate', type=float, default=2,
+                        metavar='N', dest='sweeper_rate',
+                        help='Delete at most N resources per second')
+    parser.add_argument('--sweeper-prefix', action='store_true',
+                        dest='sweeper_prefix',
+                        help='Also delete resources that are not in the '
+                             'ledger, found by prefix of their names')
+    parser.add_argument('--auto-resume', action='store_true',
+                        dest='auto_resume',
+                        help='Resume test runs interrupted by server '
+                             'restart instead of waiting for request')
     return parser.parse_args(sys.argv[1:])
@@ -12,91 +12,311 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from datetime import datetime, timedelta
+import errno
+import multiprocessing
 import os
 import logging
+import signal
+import time
 
 from pecan import conf
+from sqlalchemy.orm import object_session
+
+from fuel_plugin.ostf_adapter.nose_plugin import nose_heartbeat
+from fuel_plugin.ostf_adapter.nose_plugin import nose_loader
+from fuel_plugin.ostf_adapter.nose_plugin import nose_registry
+from fuel_plugin.ostf_adapter.nose_plugin import nose_scheduler
 from fuel_plugin.ostf_adapter.nose_plugin import nose_storage_plugin
 from fuel_plugin.ostf_adapter.nose_plugin import nose_test_runner
 from fuel_plugin.ostf_adapter.nose_plugin import nose_utils
-from fuel_plugin.ostf_adapter.storage import storage_utils, engine, models
+from fuel_plugin.ostf_adapter.nose_plugin import nose_zygote
+from fuel_plugin.ostf_adapter.storage import engine, models
 
 
 LOG = logging.getLogger(__name__)
 
 
 class NoseDriver(object):
+    # seconds before the first retry of failed tests, doubled afterwards
+    RETRY_BACKOFF = 2
+    # time cleanup waits for runner of stopped test run to exit
+    STOP_TIMEOUT = nose_heartbeat.CANCEL_GRACE_PERIOD + 10
+
     def __init__(self):
         LOG.warning('Initializing Nose Driver')
-        self._named_threads = {}
-        session = engine.get_session()
-        with session.begin(subtransactions=True):
-            storage_utils.update_all_running_test_runs(session)
 
     def check_current_running(self, unique_id):
-        return unique_id in self._named_threads
+        session = engine.get_session()
+        return bool(models.RunnerProcess.get_runner(session, unique_id))
 
     def run(self, test_run, test_set, tests=None):
         tests = tests or test_run.enabled_tests
-        if tests:
-            argv_add = [nose_utils.modify_test_name_for_nose(test) for test in
-                        tests]
-        else:
-            argv_add = [test_set.test_path] + test_set.additional_arguments
+        argv_add = [test_set.test_path] + test_set.additional_arguments
 
-        self._named_threads[test_run.id] = nose_utils.run_proc(
-            self._run_tests, test_run.id, test_run.cluster_id, argv_add)
+        args = (test_run.id, test_run.cluster_id, test_set.id,
+                argv_add, tests)
+        pid = None
+        if conf.runner.pool_size:
+            try:
+                pid = nose_zygote.spawn(conf.runner.zygote_socket, *args)
+            except Exception:
+                LOG.exception('Runner zygote is not available, '
+                              'test run %s is forked from server',
+                              test_run.id)
+        if not pid:
+            pid = nose_utils.run_proc(self._run_tests, *args).pid
+        # runner is registered in the same transaction as test run,
+        # so stop request will find it regardless of process that serves it
+        models.RunnerProcess.register(
+            object_session(test_run), test_run.id, pid)
 
-    def _run_tests(self, test_run_id, cluster_id, argv_add):
+    def _run_tests(self, test_run_id, cluster_id, test_set_id, argv_add,
+                   tests=None):
         session = engine.get_session()
+        with session.begin(subtransactions=True):
+            registry = nose_registry.Registry.load(session, test_set_id)
+            parallel, retries = session.query(
+                models.TestSet.parallel, models.TestSet.retries).\
+                filter_by(id=test_set_id).one()
+            history = models.Test.get_history(session, test_set_id)
+        heartbeat = nose_heartbeat.Heartbeat(test_run_id)
+        heartbeat.start()
+        # tests are not started once test run is cancelled,
+        # running ones are stopped by plugin of their runner
+        signal.signal(signal.SIGTERM,
+                      lambda signum, frame: nose_heartbeat.cancel(
+                          test_run_id))
         try:
-            nose_test_runner.SilentTestProgram(
-                addplugins=[nose_storage_plugin.StoragePlugin(
-                    test_run_id, str(cluster_id))],
-                exit=False,
-                argv=['ostf_tests'] + argv_add)
-            self._named_threads.pop(int(test_run_id), None)
+            if tests and parallel > 1:
+                units, serial = nose_loader.split_units(tests)
+                costs = nose_scheduler.estimate(tests, history, registry)
+                units, duration = nose_scheduler.schedule(
+                    units, costs, parallel)
+                self._report_plan(
+                    session, test_run_id,
+                    duration + nose_scheduler.unit_cost(serial, costs))
+                self._run_parallel(test_run_id, cluster_id, registry,
+                                   units, serial, parallel)
+            elif tests:
+                costs = nose_scheduler.estimate(tests, history, registry)
+                self._report_plan(session, test_run_id,
+                                  nose_scheduler.unit_cost(tests, costs))
+                # selected tests are loaded directly, without collection
+                nose_loader.run(tests, self._get_plugins(
+                    test_run_id, cluster_id, registry))
+            if tests:
+                if not nose_heartbeat.cancelled():
+                    self._retry_failed(session, test_run_id, cluster_id,
+                                       registry, tests, retries or 0)
+            else:
+                nose_test_runner.SilentTestProgram(
+                    addplugins=self._get_plugins(
+                        test_run_id, cluster_id, registry),
+                    exit=False,
+                    argv=['ostf_tests'] + argv_add)
         except Exception, e:
             LOG.exception('Test run ID: %s', test_run_id)
         finally:
+            if nose_heartbeat.cancelled():
+                models.Test.update_running_tests(
+                    session, test_run_id, status='stopped')
             models.TestRun.update_test_run(
                 session, test_run_id, status='finished')
+            # runner is unregistered once its test run is finished
+            heartbeat.stop()
 
-    def kill(self, test_run_id, cluster_id, cleanup=None):
+    def _get_plugins(self, test_run_id, cluster_id, registry,
+                     abort_run=True):
+        return [
+            nose_storage_plugin.StoragePlugin(
+                test_run_id, str(cluster_id)),
+            nose_heartbeat.CancelPlugin(test_run_id),
+            nose_heartbeat.WatchdogPlugin(
+                test_run_id, registry,
+                conf.runner.timeout_multiplier,
+                conf.runner.timeout_ceiling,
+                abort_run=abort_run)]
+
+    def _retry_failed(self, session, test_run_id, cluster_id, registry,
+                      tests, retries):
+        """Failed tests are run again in the runner with exponential
+        backoff, up to retries times or as many times as test declares
+        with retries attribute. Tests are put into new suites of their
+        classes, so class fixtures are set up again. Results of failed
+        attempts are kept in meta of tests.
+        """
+        limits = dict(
+            (test, registry.get_attributes(test).get('retries', retries))
+            for test in tests)
+        nose_conf = None
+        attempt = 0
+        while True:
+            with session.begin(subtransactions=True):
+                failed = models.Test.get_failed(
+                    session, test_run_id,
+                    [test for test in tests if limits[test] > attempt])
+                for test in failed:
+                    models.Test.add_attempt(session, test_run_id, test)
+            if not failed:
+                return
+            attempt += 1
+            time.sleep(self.RETRY_BACKOFF * 2 ** (attempt - 1))
+            if nose_heartbeat.cancelled():
+                return
+            LOG.info('Test run %s: retrying %s failed tests, attempt %s',
+                     test_run_id, len(failed), attempt)
+            if nose_conf is None:
+                nose_conf = nose_loader.make_config(self._get_plugins(
+                    test_run_id, cluster_id, registry))
+            nose_loader.run_tests(nose_conf, failed)
+
+    def _report_plan(self, session, test_run_id, duration):
+        """Predicted end of test run is reported in its meta"""
+        predicted_end = datetime.utcnow() + timedelta(seconds=duration)
+        with session.begin(subtransactions=True):
+            models.TestRun.update_meta(
+                session, test_run_id,
+                estimated_duration=int(duration),
+                predicted_end=str(predicted_end))
+
+    def _run_parallel(self, test_run_id, cluster_id, registry, units,
+                      serial, parallel):
+        """Runs test classes in worker processes, each class is run
+        by single worker, so its fixtures are set up once. Units are
+        taken by workers in given order. Classes that opted out are
+        run afterwards by the runner itself, as well as tests that were
+        not run by workers, e.g. rest of the unit of a worker that was
+        aborted by watchdog.
+
+        Cancellation is passed to workers, they finish their current
+        tests and runner waits for them.
+        """
+        queue = multiprocessing.Queue()
+        workers_count = min(parallel, len(units))
+        for unit in units + [None] * workers_count:
+            queue.put(unit)
+        LOG.info('Test run %s: %s classes are run by %s workers',
+                 test_run_id, len(units), workers_count)
+
+        # runner may be daemonic multiprocessing process, which is
+        # not allowed to have children, so workers are forked directly
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        workers = []
+        for _ in range(workers_count):
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    self._run_units(test_run_id, cluster_id, registry, queue)
+                except Exception:
+                    LOG.exception('Worker of test run %s failed',
+                                  test_run_id)
+                    code = 1
+                os._exit(code)
+            workers.append(pid)
+
+        def cancel_workers(signum, frame):
+            nose_heartbeat.cancel(test_run_id, pids=workers)
+            for pid in workers:
+                self._kill(pid)
+
+        previous = signal.signal(signal.SIGTERM, cancel_workers)
+        try:
+            while workers:
+                try:
+                    os.waitpid(workers[0], 0)
+                except OSError as e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    if e.errno != errno.ECHILD:
+                        raise
+                workers.pop(0)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+
+        # units left in the queue are among waiting tests
+        queue.cancel_join_thread()
         session = engine.get_session()
-        if test_run_id in self._named_threads:
+        with session.begin(subtransactions=True):
+            serial = models.Test.get_waiting(
+                session, test_run_id,
+                [test for unit in units for test in unit]) + serial
+        if serial and not nose_heartbeat.cancelled():
+            nose_loader.run(serial, self._get_plugins(
+                test_run_id, cluster_id, registry))
 
-            self._named_threads[test_run_id].terminate()
-            self._named_threads.pop(test_run_id, None)
+    def _run_units(self, test_run_id, cluster_id, registry, queue):
+        nose_conf = nose_loader.make_config(self._get_plugins(
+            test_run_id, cluster_id, registry, abort_run=False))
+        for unit in iter(queue.get, None):
+            if nose_heartbeat.cancelled():
+                break
+            nose_loader.run_tests(nose_conf, unit)
 
+    def kill(self, test_run_id, cluster_id, cleanup=None):
+        session = engine.get_session()
+        if self._terminate(session, test_run_id):
+            # test run is finished by its runner once it stops
             if cleanup:
                 nose_utils.run_proc(
                     self._clean_up,
                     test_run_id,
                     cluster_id,
                     cleanup)
-            else:
-                models.TestRun.update_test_run(
-                    session, test_run_id, status='finished')
-
             return True
         return False
 
-    def _clean_up(self, test_run_id, cluster_id, cleanup):
+    def _terminate(self, session, test_run_id):
+        """Sends stop command to the runner through the registry,
+        runners of current host are signalled directly.
+        """
+        with session.begin(subtransactions=True):
+            runner = models.RunnerProcess.get_runner(session, test_run_id)
+            if not runner or not runner.is_alive:
+                return False
+            models.RunnerProcess.send_command(session, test_run_id, 'stop')
+
+        if runner.is_local:
+            self._kill(runner.pid)
+        return True
+
+    def _kill(self, pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
+    def _wait_for_runner(self, test_run_id, timeout):
+        """Waits until runner of test run exits, returns False
+        if it is still registered after timeout
+        """
         session = engine.get_session()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with session.begin(subtransactions=True):
+                if not models.RunnerProcess.get_runner(session, test_run_id):
+                    return True
+            time.sleep(1)
+        return False
+
+    def _clean_up(self, test_run_id, cluster_id, cleanup):
+        # tests of stopped test run may still create resources
+        if not self._wait_for_runner(test_run_id, self.STOP_TIMEOUT):
+            LOG.warning('Runner of test run %s did not stop, cleaning up '
+                        'anyway', test_run_id)
         try:
             module_obj = __import__(cleanup, -1)
 
             os.environ['NAILGUN_HOST'] = str(conf.nailgun.host)
             os.environ['NAILGUN_PORT'] = str(conf.nailgun.port)
             os.environ['CLUSTER_ID'] = str(cluster_id)
+            # only resources of stopped test run are deleted
+            os.environ['TEST_RUN_ID'] = str(test_run_id)
 
             module_obj.cleanup.cleanup()
 
         except Exception:
-            LOG.exception('Cleanup errer. Test Run ID %s. Cluster ID %s',
-                test_run_id, cluser_id)
-
-        finally:
-            models.TestRun.update_test_run(
-                session, test_run_id, status='finished')
+            LOG.exception('Cleanup error. Test Run ID %s. Cluster ID %s',
+                          test_run_id, cluster_id)
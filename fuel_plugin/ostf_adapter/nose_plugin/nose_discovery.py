@@ -12,22 +12,30 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
 import logging
 import os
+import re
 
 from nose import plugins
 
+from fuel_plugin.ostf_adapter.nose_plugin import nose_static_discovery
 from fuel_plugin.ostf_adapter.nose_plugin import nose_test_runner
 from fuel_plugin.ostf_adapter.nose_plugin import nose_utils
-from fuel_plugin.ostf_adapter.storage import engine, models
+from fuel_plugin.ostf_adapter.storage import engine, models, storage_utils
 
 
 CORE_PATH = 'fuel_health'
 
+PROFILE_RE = re.compile(r'^__profile__\s*=', re.MULTILINE)
+
 LOG = logging.getLogger(__name__)
 
 
 class DiscoveryPlugin(plugins.Plugin):
+    """Collects test sets and tests in memory,
+    catalog is updated with them after discovery is finished.
+    """
 
     enabled = True
     name = 'discovery'
@@ -35,6 +43,8 @@ class DiscoveryPlugin(plugins.Plugin):
 
     def __init__(self):
         self.test_sets = {}
+        self.tests = {}
+        self._profile_modules = {}
         super(DiscoveryPlugin, self).__init__()
 
     def options(self, parser, env=os.environ):
@@ -47,40 +57,161 @@ class DiscoveryPlugin(plugins.Plugin):
         module = __import__(module, fromlist=[module])
         LOG.info('Inspecting %s', filename)
         if hasattr(module, '__profile__'):
-            session = engine.get_session()
-            with session.begin(subtransactions=True):
-                LOG.info('%s discovered.', module.__name__)
-                test_set = models.TestSet(**module.__profile__)
-                test_set = session.merge(test_set)
-                session.add(test_set)
-                self.test_sets[test_set.id] = test_set
+            self.add_profile(module.__name__, module.__profile__)
+
+    def add_profile(self, module, profile):
+        LOG.info('%s discovered.', module)
+        profile = dict(profile)
+        self.test_sets[profile['id']] = profile
+        self._profile_modules[module] = profile['id']
+
+    def get_test_set_id(self, test_id):
+        """Test belongs to test set which profile is declared
+        in the closest module or package containing the test
+        """
+        modules = [module for module in self._profile_modules
+                   if test_id.startswith(module + '.')]
+        if modules:
+            return self._profile_modules[max(modules, key=len)]
 
     def addSuccess(self, test):
-        test_id = test.id()
-        for test_set_id in self.test_sets.keys():
-            if test_set_id in test_id:
-                session = engine.get_session()
-                with session.begin(subtransactions=True):
-                    LOG.info('%s added for %s', test_id, test_set_id)
-                    data = dict()
-                    data['title'], data['description'], data['duration'] = \
-                        nose_utils.get_description(test)
-                    old_test_obj = session.query(models.Test).filter_by(
-                        name=test_id, test_set_id=test_set_id,
-                        test_run_id=None).\
-                        update(data, synchronize_session=False)
-                    if not old_test_obj:
-                        data.update({'test_set_id': test_set_id,
-                                     'name': test_id})
-                        test_obj = models.Test(**data)
-                        session.add(test_obj)
-
-
-def discovery(path=CORE_PATH):
-    """Will discover all tests on provided path and save info in db
+        self.add_test(test.id(), nose_utils.get_description(test),
+                      nose_utils.get_attributes(test))
+
+    def add_test(self, test_id, description, attributes):
+        test_set_id = self.get_test_set_id(test_id)
+        if test_set_id:
+            LOG.info('%s added for %s', test_id, test_set_id)
+            data = {'name': test_id, 'test_set_id': test_set_id}
+            data['title'], data['description'], data['duration'] = \
+                description
+            data['meta'] = {
+                'timeout': nose_utils.parse_duration(data['duration'])}
+            if attributes:
+                data['meta']['attributes'] = attributes
+            self.tests[test_id] = data
+
+
+def find_packages(path):
+    """Splits tree into packages that declare test sets, rest
+    of the files belong to the package of the root path itself.
+
+    Package is either directory with __profile__ in its __init__.py
+    or single module with __profile__.
+
+    :returns: dict package path -> list of its python files
+    """
+    if os.path.isfile(path):
+        return {path: [path]}
+
+    files = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        files.extend(os.path.join(dirpath, filename)
+                     for filename in sorted(filenames)
+                     if filename.endswith('.py'))
+
+    packages = {path: []}
+    for filename in files:
+        with open(filename) as module:
+            if PROFILE_RE.search(module.read()):
+                if os.path.basename(filename) == '__init__.py':
+                    packages[os.path.dirname(filename)] = []
+                else:
+                    packages[filename] = []
+
+    for filename in files:
+        owners = [package for package in packages
+                  if filename == package or
+                  filename.startswith(package + os.sep)]
+        packages[max(owners, key=len)].append(filename)
+    return packages
+
+
+def fingerprint(files):
+    """Digest of paths and contents of files.
+
+    Modification times are left out deliberately, reinstalling
+    the same code should not cause rediscovery.
+    """
+    digest = hashlib.sha1()
+    for filename in files:
+        with open(filename, 'rb') as module:
+            content = module.read()
+        digest.update('{0}\0{1}\0{2}\0'.format(
+            filename, len(content), hashlib.sha1(content).hexdigest()))
+    return digest.hexdigest()
+
+
+def collect(paths, plugin=None):
+    """Imports tests from given paths and collects
+    their test sets and tests
     """
-    LOG.info('Starting discovery for %r.', path)
+    plugin = plugin or DiscoveryPlugin()
     nose_test_runner.SilentTestProgram(
-        addplugins=[DiscoveryPlugin()],
+        addplugins=[plugin],
         exit=False,
-        argv=['tests_discovery', '--collect-only', path] )
+        argv=['tests_discovery', '--collect-only'] + list(paths))
+    return plugin.test_sets, plugin.tests
+
+
+def collect_static(paths):
+    """Collects test sets and tests from sources of given paths,
+    only modules that can not be analyzed statically are imported
+    """
+    plugin = DiscoveryPlugin()
+    profiles, tests, fallback = nose_static_discovery.analyze(paths)
+    for module, profile in profiles:
+        plugin.add_profile(module, profile)
+    for test_id, docstring, attributes in tests:
+        plugin.add_test(test_id, nose_utils.parse_docstring(docstring),
+                        attributes)
+    if fallback:
+        LOG.info('Importing modules which can not be analyzed: %s',
+                 fallback)
+        collect(fallback, plugin)
+    return plugin.test_sets, plugin.tests
+
+
+def discovery(path=CORE_PATH, force=False, static=False):
+    """Will discover tests on provided path and save info in db.
+
+    Only packages which fingerprint changed since the last discovery
+    are imported. If files outside of test set packages changed,
+    whole path is rediscovered. Test sets of packages that are gone
+    are removed from the catalog. In static mode sources are analyzed
+    instead of being imported.
+    """
+    path = os.path.normpath(path or CORE_PATH)
+    digests = dict((package, fingerprint(files)) for package, files
+                   in find_packages(path).iteritems())
+
+    session = engine.get_session()
+    with session.begin(subtransactions=True):
+        stored = models.DiscoveryFingerprint.get_digests(session, path)
+
+    changed = [package for package, digest in digests.iteritems()
+               if stored.get(package) != digest]
+    gone = sorted(package for package in stored if package not in digests)
+    if force or path in changed:
+        changed = [path]
+    if not changed and not gone:
+        LOG.info('Tests in %r are not changed, discovery skipped.', path)
+        return
+
+    if changed:
+        LOG.info('Starting discovery for %r.', changed)
+        test_sets, tests = (collect_static if static else collect)(
+            sorted(changed))
+
+    with session.begin(subtransactions=True):
+        if gone:
+            LOG.info('Test packages %r are gone.', gone)
+            storage_utils.remove_test_sets(
+                session,
+                [nose_static_discovery.get_module_name(package)
+                 for package in gone],
+                gone)
+        if changed:
+            storage_utils.update_catalog(session, test_sets, tests)
+        models.DiscoveryFingerprint.update_digests(session, path, digests)
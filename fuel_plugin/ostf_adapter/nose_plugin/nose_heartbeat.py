@@ -0,0 +1,299 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import os
+import signal
+import threading
+import time
+
+from nose import plugins
+
+from fuel_plugin.ostf_adapter.storage import engine, models
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Heartbeat(threading.Thread):
+    """Keeps registry record of runner process alive and
+    executes commands sent to runner through the registry.
+    """
+
+    INTERVAL = 10
+
+    def __init__(self, test_run_id, interval=INTERVAL):
+        super(Heartbeat, self).__init__(name='heartbeat')
+        self.daemon = True
+        self.test_run_id = test_run_id
+        self.interval = interval
+        self._cancelled = False
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.beat()
+            except Exception:
+                LOG.exception('Heartbeat of test run %s failed',
+                              self.test_run_id)
+
+    def beat(self):
+        session = engine.get_session()
+        with session.begin(subtransactions=True):
+            command = models.RunnerProcess.heartbeat(
+                session, self.test_run_id)
+        if command:
+            self.execute(command)
+
+    def execute(self, command):
+        LOG.info('Test run %s received %r command',
+                 self.test_run_id, command)
+        # runner keeps beating while it stops, so the run
+        # is not taken for orphaned until it is finished
+        if command == 'stop' and not self._cancelled:
+            self._cancelled = True
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    def stop(self):
+        self._stopped.set()
+        session = engine.get_session()
+        with session.begin(subtransactions=True):
+            models.RunnerProcess.unregister(session, self.test_run_id)
+
+
+# set in environment of runner once test run is cancelled,
+# tests may check it to stop at their next step
+CANCEL_ENV = 'OSTF_CANCELLED'
+CANCEL_GRACE_PERIOD = 30
+
+
+def cancelled():
+    return bool(os.environ.get(CANCEL_ENV))
+
+
+def cancel(test_run_id, grace_period=CANCEL_GRACE_PERIOD, pids=()):
+    """Marks test run as cancelled and schedules hard stop of the
+    runner and its workers in case it is not done within grace period.
+    """
+    if cancelled():
+        return
+    LOG.info('Test run %s is cancelled', test_run_id)
+    os.environ[CANCEL_ENV] = '1'
+    timer = threading.Timer(grace_period, _hard_stop,
+                            (test_run_id, list(pids)))
+    timer.daemon = True
+    timer.start()
+
+
+def _hard_stop(test_run_id, pids):
+    LOG.error('Test run %s did not stop within grace period, '
+              'killing its runner', test_run_id)
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    session = engine.get_session()
+    with session.begin(subtransactions=True):
+        models.Test.update_running_tests(
+            session, test_run_id, status='stopped')
+        models.TestRun.update_test_run(
+            session, test_run_id, status='finished')
+        models.RunnerProcess.unregister(session, test_run_id)
+    os._exit(1)
+
+
+class CancelPlugin(plugins.Plugin):
+    """Stops test run cooperatively on SIGTERM.
+
+    Running test is not interrupted, tests that check cancellation
+    stop at their next step. Its result is recorded, fixtures of its
+    class are torn down and no more tests are started. Runner that is
+    not done within grace period is killed.
+    """
+
+    enabled = True
+    name = 'cancel'
+    score = 13000
+
+    def __init__(self, test_run_id, grace_period=CANCEL_GRACE_PERIOD):
+        super(CancelPlugin, self).__init__()
+        self.test_run_id = test_run_id
+        self.grace_period = grace_period
+        self.result = None
+
+    def options(self, parser, env=os.environ):
+        pass
+
+    def configure(self, options, conf):
+        self.conf = conf
+
+    def begin(self):
+        signal.signal(signal.SIGTERM, self._cancel)
+
+    def prepareTestResult(self, result):
+        self.result = result
+        if cancelled():
+            result.shouldStop = True
+
+    def _cancel(self, signum, frame):
+        cancel(self.test_run_id, self.grace_period)
+        if self.result is not None:
+            self.result.shouldStop = True
+
+
+class TestTimeout(BaseException):
+    """Raised in the test that exceeded its time limit.
+
+    It is not derived from Exception, so it passes through
+    broad exception handlers of the tests themselves.
+    """
+
+
+class Watchdog(threading.Thread):
+    """Interrupts the test that runs longer than its limit.
+
+    Test is interrupted with TestTimeout raised from SIGUSR1 handler
+    in the main thread. If test is stuck and does not react
+    during grace period, result is recorded and runner exits,
+    remaining tests of the run are stopped unless abort_run is off
+    (runner is a worker of parallel test run).
+    """
+
+    INTERVAL = 1
+    GRACE_PERIOD = 30
+
+    def __init__(self, test_run_id, grace_period=GRACE_PERIOD,
+                 abort_run=True):
+        super(Watchdog, self).__init__(name='watchdog')
+        self.daemon = True
+        self.test_run_id = test_run_id
+        self.abort_run = abort_run
+        self.grace_period = grace_period
+        self._current = None
+        self._interrupted_at = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def watch(self, test_id, limit):
+        with self._lock:
+            self._current = (test_id, time.time(), limit)
+            self._interrupted_at = None
+
+    def release(self):
+        with self._lock:
+            self._current = None
+            self._interrupted_at = None
+
+    @property
+    def interrupted(self):
+        return self._interrupted_at is not None
+
+    def run(self):
+        while not self._stopped.wait(self.INTERVAL):
+            with self._lock:
+                current, interrupted_at = \
+                    self._current, self._interrupted_at
+            if not current:
+                continue
+            test_id, started_at, limit = current
+            now = time.time()
+            if interrupted_at is None and now - started_at > limit:
+                LOG.warning('Test %s exceeded its time limit of %d s, '
+                            'interrupting', test_id, limit)
+                with self._lock:
+                    self._interrupted_at = now
+                os.kill(os.getpid(), signal.SIGUSR1)
+            elif interrupted_at and \
+                    now - interrupted_at > self.grace_period:
+                self.abort(test_id, started_at, limit)
+
+    def abort(self, test_id, started_at, limit):
+        LOG.error('Test %s does not react on interruption, '
+                  'aborting test run %s', test_id, self.test_run_id)
+        session = engine.get_session()
+        with session.begin(subtransactions=True):
+            models.Test.add_result(
+                session, self.test_run_id, test_id,
+                {'status': 'error',
+                 'message': timeout_message(limit),
+                 'time_taken': time.time() - started_at})
+            if self.abort_run:
+                models.Test.update_running_tests(
+                    session, self.test_run_id, status='stopped')
+                models.TestRun.update_test_run(
+                    session, self.test_run_id, status='finished')
+                models.RunnerProcess.unregister(session, self.test_run_id)
+        os._exit(1)
+
+    def stop(self):
+        self._stopped.set()
+
+
+def timeout_message(limit):
+    return u'Test was interrupted after exceeding its time limit ' \
+        u'of {0} s'.format(int(limit))
+
+
+class WatchdogPlugin(plugins.Plugin):
+    """Enforces per test time limits derived from declared Duration.
+
+    Limit of a test is its declared duration multiplied by
+    multiplier, but not greater than ceiling. Tests without
+    declared duration are limited by ceiling only.
+    """
+
+    enabled = True
+    name = 'watchdog'
+    score = 14000
+
+    def __init__(self, test_run_id, registry, multiplier, ceiling,
+                 abort_run=True):
+        super(WatchdogPlugin, self).__init__()
+        self.registry = registry
+        self.multiplier = multiplier
+        self.ceiling = ceiling
+        self.watchdog = Watchdog(test_run_id, abort_run=abort_run)
+
+    def options(self, parser, env=os.environ):
+        pass
+
+    def configure(self, options, conf):
+        self.conf = conf
+
+    def begin(self):
+        signal.signal(signal.SIGUSR1, self._interrupt)
+        self.watchdog.start()
+
+    def finalize(self, result):
+        self.watchdog.stop()
+
+    def _interrupt(self, signum, frame):
+        # test could finish right before the signal was delivered
+        if self.watchdog.interrupted:
+            raise TestTimeout(timeout_message(self._limit))
+
+    def get_limit(self, test):
+        duration = self.registry.get_timeout(test.id())
+        if duration:
+            return min(duration * self.multiplier, self.ceiling)
+        return self.ceiling
+
+    def beforeTest(self, test):
+        self._limit = self.get_limit(test)
+        self.watchdog.watch(test.id(), self._limit)
+
+    def afterTest(self, test):
+        self.watchdog.release()
@@ -0,0 +1,116 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import importlib
+import logging
+import os
+import sys
+
+from nose import config
+from nose import failure
+from nose import loader
+from nose.plugins import manager
+from nose.suite import ContextList
+
+from fuel_plugin.ostf_adapter.nose_plugin import nose_test_runner
+
+
+LOG = logging.getLogger(__name__)
+
+
+def make_config(plugins):
+    """nose config with given plugins and nose builtin ones,
+    no tests are collected from its arguments
+    """
+    conf = config.Config(
+        env=os.environ,
+        plugins=manager.DefaultPluginManager(plugins=plugins))
+    conf.configure(argv=['ostf_tests'])
+    return conf
+
+
+def load_tests(conf, test_ids):
+    """Builds suite of tests with given ids.
+
+    Only modules of given tests are imported, tests of the same
+    class are grouped into single suite, so class and module
+    fixtures are set up once.
+    """
+    test_loader = loader.TestLoader(config=conf)
+    classes = collections.OrderedDict()
+    modules = {}
+    failures = []
+    for test_id in test_ids:
+        module_name, class_name, method_name = test_id.rsplit('.', 2)
+        try:
+            if module_name not in modules:
+                modules[module_name] = importlib.import_module(module_name)
+            test_class = getattr(modules[module_name], class_name)
+        except Exception:
+            LOG.exception('Failed to load %s', test_id)
+            failures.append(failure.Failure(*sys.exc_info()))
+            continue
+        classes.setdefault(test_class, []).append(method_name)
+
+    # suites of classes are made explicitly, otherwise factory
+    # does not make suite for single test and its class fixtures
+    # are not run; suites of modules and packages are made by factory
+    suites = [test_loader.suiteClass(
+        ContextList([test_class(name) for name in names],
+                    context=test_class))
+        for test_class, names in classes.iteritems()]
+    return test_loader.suiteClass(suites + failures)
+
+
+def split_units(test_ids):
+    """Splits tests into units that may run in parallel,
+    one unit per class, and tests that must run serially.
+
+    Class opts out of parallel execution with _parallel_ = False.
+    """
+    units = collections.OrderedDict()
+    serial = []
+    parallel = {}
+    for test_id in test_ids:
+        class_id = test_id.rsplit('.', 1)[0]
+        if class_id not in parallel:
+            parallel[class_id] = _is_parallel(class_id)
+        if parallel[class_id]:
+            units.setdefault(class_id, []).append(test_id)
+        else:
+            serial.append(test_id)
+    return units.values(), serial
+
+
+def _is_parallel(class_id):
+    module_name, class_name = class_id.rsplit('.', 1)
+    try:
+        test_class = getattr(importlib.import_module(module_name),
+                             class_name)
+    except Exception:
+        # failure will be reported by the runner of unit
+        return True
+    return getattr(test_class, '_parallel_', True)
+
+
+def run(test_ids, plugins):
+    return run_tests(make_config(plugins), test_ids)
+
+
+def run_tests(conf, test_ids):
+    suite = load_tests(conf, test_ids)
+    runner = nose_test_runner.SilentTestRunner(
+        stream=conf.stream, verbosity=0, config=conf)
+    return runner.run(suite)
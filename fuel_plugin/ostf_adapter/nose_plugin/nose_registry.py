@@ -0,0 +1,62 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+
+from fuel_plugin.ostf_adapter.storage import models
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Registry(object):
+    """Metadata of discovered tests keyed by test id.
+
+    Docstrings are parsed once by discovery and stored in the
+    catalog, runner process loads them once instead of parsing
+    them for every test event.
+    """
+
+    def __init__(self, tests=None):
+        self.tests = tests or {}
+
+    @classmethod
+    def load(cls, session, test_set_id):
+        tests = {}
+        for test in session.query(models.Test).filter_by(
+                test_run_id=None, test_set_id=test_set_id):
+            meta = test.meta or {}
+            tests[test.name] = {
+                'title': test.title,
+                'description': test.description,
+                'duration': test.duration,
+                'timeout': meta.get('timeout'),
+                'attributes': meta.get('attributes', {})
+            }
+        LOG.info('Loaded metadata of %s tests of %s',
+                 len(tests), test_set_id)
+        return cls(tests)
+
+    def __contains__(self, test_id):
+        return test_id in self.tests
+
+    def get(self, test_id):
+        return self.tests.get(test_id, {})
+
+    def get_timeout(self, test_id):
+        """Declared duration of test in seconds"""
+        return self.get(test_id).get('timeout')
+
+    def get_attributes(self, test_id):
+        return self.get(test_id).get('attributes', {})
@@ -0,0 +1,68 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Planning of test runs based on durations of previous runs.
+
+Cost of test is the median of its durations in recent runs of the
+test set, declared Duration is used for tests without history.
+Parallel units are ordered longest first, so workers taking units
+from the queue build LPT schedule and long classes do not end up
+in the tail of test run.
+"""
+
+import heapq
+
+
+# cost of test that was never run and declares no duration
+DEFAULT_COST = 60
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def estimate(test_ids, history, registry):
+    """Returns dict of test id -> estimated duration in seconds
+
+    :param history: test id -> list of recent durations
+    """
+    costs = {}
+    for test_id in test_ids:
+        if history.get(test_id):
+            costs[test_id] = median(history[test_id])
+        else:
+            costs[test_id] = registry.get_timeout(test_id) or DEFAULT_COST
+    return costs
+
+
+def schedule(units, costs, workers):
+    """Orders units longest first.
+
+    :returns: ordered units and predicted time in which
+              given number of workers will run them
+    """
+    units = sorted(units, key=lambda unit: unit_cost(unit, costs),
+                   reverse=True)
+    loads = [0] * max(workers, 1)
+    for unit in units:
+        heapq.heapreplace(loads, loads[0] + unit_cost(unit, costs))
+    return units, max(loads)
+
+
+def unit_cost(unit, costs):
+    return sum(costs[test_id] for test_id in unit)
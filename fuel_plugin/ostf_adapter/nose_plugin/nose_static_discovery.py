@@ -0,0 +1,322 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Discovery of tests through analysis of their sources.
+
+Test modules are parsed with ast instead of being imported, so
+neither module level code nor client libraries used by tests
+are executed. Rules of nose selector are followed: packages and
+modules, classes and methods matching testMatch are collected.
+Test methods inherited from classes of other modules are not
+collected, modules with such classes are imported instead.
+"""
+
+import ast
+import logging
+import os
+import sys
+
+from nose import config
+
+
+LOG = logging.getLogger(__name__)
+
+TEST_MATCH = config.Config().testMatch
+
+# bases of test classes that are known to have no test methods,
+# other bases from outside of test module are analyzed
+NON_TEST_BASES = frozenset([
+    'object',
+    'unittest.TestCase',
+    'unittest2.TestCase',
+    'testresources.ResourcedTestCase',
+    'testtools.TestCase',
+])
+
+
+class CannotAnalyze(Exception):
+    pass
+
+
+def analyze(paths):
+    """Analyzes python files of given paths.
+
+    :returns: list of (module, profile), list of
+              (test id, docstring, attributes) and list of files
+              that could not be analyzed and have to be imported
+    """
+    profiles, tests, fallback = [], [], []
+    for filename in _find_modules(paths):
+        module = get_module_name(filename)
+        try:
+            profile, module_tests = analyze_module(filename, module)
+        except CannotAnalyze as e:
+            LOG.info('%s can not be analyzed: %s', filename, e)
+            fallback.append(filename)
+            continue
+        if profile is not None:
+            profiles.append((module, profile))
+        tests.extend(module_tests)
+    return profiles, tests, fallback
+
+
+def _find_modules(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            if not _is_package(dirpath) and dirpath != path and \
+                    not TEST_MATCH.search(os.path.basename(dirpath)):
+                dirnames[:] = []
+                continue
+            dirnames.sort()
+            for filename in sorted(filenames):
+                name, ext = os.path.splitext(filename)
+                if ext == '.py' and (name == '__init__' or
+                                     TEST_MATCH.search(name)):
+                    yield os.path.join(dirpath, filename)
+
+
+def _is_package(dirpath):
+    return os.path.isfile(os.path.join(dirpath, '__init__.py'))
+
+
+def _split_module_path(filename):
+    """First parent directory that is not a package and dotted
+    name of module, which is importable from it
+    """
+    dirpath, name = os.path.split(os.path.abspath(filename))
+    parts = [] if name == '__init__.py' else [os.path.splitext(name)[0]]
+    while _is_package(dirpath):
+        dirpath, package = os.path.split(dirpath)
+        parts.insert(0, package)
+    return dirpath, '.'.join(parts)
+
+
+def get_module_name(filename):
+    return _split_module_path(filename)[1]
+
+
+def _parse(filename):
+    try:
+        with open(filename) as source:
+            return ast.parse(source.read(), filename)
+    except (IOError, SyntaxError) as e:
+        raise CannotAnalyze(e)
+
+
+def analyze_module(filename, module):
+    tree = _parse(filename)
+
+    profile = None
+    classes = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and \
+                _assigns(node, '__profile__'):
+            profile = _literal(node.value)
+        elif isinstance(node, ast.ClassDef):
+            classes[node.name] = node
+        elif isinstance(node, ast.FunctionDef) and _is_test(node.name):
+            raise CannotAnalyze('test function {0}'.format(node.name))
+
+    if os.path.basename(filename) == '__init__.py':
+        return profile, []
+
+    imports = _get_imports(tree)
+    search_path = [_split_module_path(filename)[0]] + sys.path
+    tests = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and _is_test_class(node):
+            for base in _external_bases(node, classes, imports):
+                if _may_have_tests(base, search_path, set()):
+                    raise CannotAnalyze(
+                        '{0} inherits from {1} which may have tests'.format(
+                            node.name, base))
+            methods = sorted(_get_test_methods(node, classes),
+                             key=lambda method: method.name)
+            for method in methods:
+                tests.append((
+                    '{0}.{1}.{2}'.format(module, node.name, method.name),
+                    ast.get_docstring(method, clean=False),
+                    _get_attributes(method)))
+    return profile, tests
+
+
+def _assigns(node, name):
+    return any(isinstance(target, ast.Name) and target.id == name
+               for target in node.targets)
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        raise CannotAnalyze('{0} is not a literal'.format(
+            ast.dump(node)))
+
+
+def _is_test(name):
+    return not name.startswith('_') and TEST_MATCH.search(name)
+
+
+def _base_names(node):
+    for base in node.bases:
+        if isinstance(base, ast.Name):
+            yield base.id
+        elif isinstance(base, ast.Attribute):
+            yield base.attr
+
+
+def _is_test_class(node):
+    """Classes derived from anything but object are assumed to be
+    TestCases, their bases are defined in other modules
+    """
+    for statement in node.body:
+        if isinstance(statement, ast.Assign) and \
+                _assigns(statement, '__test__'):
+            return _literal(statement.value)
+    return _is_test(node.name) or \
+        any(base != 'object' for base in _base_names(node))
+
+
+def _get_test_methods(node, classes, seen=None):
+    """Test methods of class including ones inherited
+    from classes of the same module
+    """
+    seen = set() if seen is None else seen
+    methods = []
+    for statement in node.body:
+        if isinstance(statement, ast.FunctionDef):
+            if statement.name not in seen:
+                seen.add(statement.name)
+                if _is_test(statement.name):
+                    methods.append(statement)
+    for base in node.bases:
+        if isinstance(base, ast.Name) and base.id in classes:
+            methods.extend(
+                _get_test_methods(classes[base.id], classes, seen))
+    return methods
+
+
+def _get_imports(tree):
+    """Names bound by imports of module -> dotted names they refer to"""
+    imports = {}
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    imports[alias.asname] = alias.name
+                else:
+                    top = alias.name.split('.')[0]
+                    imports[top] = top
+        elif isinstance(node, ast.ImportFrom) and not node.level:
+            for alias in node.names:
+                imports[alias.asname or alias.name] = \
+                    '{0}.{1}'.format(node.module, alias.name)
+    return imports
+
+
+def _dotted_name(node, imports):
+    """Dotted name of class referred to by base of another class,
+    None if it is not a name
+    """
+    if isinstance(node, ast.Name):
+        return imports.get(node.id, node.id)
+    if isinstance(node, ast.Attribute):
+        owner = _dotted_name(node.value, imports)
+        return owner and '{0}.{1}'.format(owner, node.attr)
+
+
+def _external_bases(node, classes, imports, seen=None):
+    """Dotted names of bases of class including bases of its bases
+    from the same module, which are defined in other modules
+    """
+    seen = set() if seen is None else seen
+    for base in node.bases:
+        if isinstance(base, ast.Name) and base.id in classes:
+            if base.id not in seen:
+                seen.add(base.id)
+                for name in _external_bases(classes[base.id], classes,
+                                            imports, seen):
+                    yield name
+        else:
+            yield _dotted_name(base, imports)
+
+
+def _find_source(module, search_path):
+    """File of module found without importing it"""
+    parts = module.split('.')
+    for directory in search_path:
+        path = os.path.join(directory or os.curdir, *parts)
+        for filename in (path + '.py', os.path.join(path, '__init__.py')):
+            if os.path.isfile(filename):
+                return filename
+
+
+def _may_have_tests(name, search_path, seen):
+    """Tells if class of given dotted name could have test methods,
+    it is true for classes which sources could not be analyzed
+    """
+    if name in NON_TEST_BASES or name in seen:
+        return False
+    seen.add(name)
+    if not name or '.' not in name:
+        return True
+    module, class_name = name.rsplit('.', 1)
+    filename = _find_source(module, search_path)
+    if filename is None:
+        return True
+    try:
+        tree = _parse(filename)
+    except CannotAnalyze:
+        return True
+    imports = _get_imports(tree)
+    node = next((node for node in tree.body
+                 if isinstance(node, ast.ClassDef) and
+                 node.name == class_name), None)
+    if node is None:
+        # class could be imported into the module
+        return class_name not in imports or \
+            _may_have_tests(imports[class_name], search_path, seen)
+    if any(isinstance(statement, ast.FunctionDef) and
+           _is_test(statement.name) for statement in node.body):
+        return True
+    classes = set(node.name for node in tree.body
+                  if isinstance(node, ast.ClassDef))
+    for base in node.bases:
+        base_name = _dotted_name(base, imports)
+        if isinstance(base, ast.Name) and base.id in classes:
+            base_name = '{0}.{1}'.format(module, base.id)
+        if _may_have_tests(base_name, search_path, seen):
+            return True
+    return False
+
+
+def _get_attributes(method):
+    """Attributes assigned with nose.plugins.attrib.attr decorator"""
+    attributes = {}
+    for decorator in method.decorator_list:
+        if not isinstance(decorator, ast.Call):
+            continue
+        func = decorator.func
+        name = func.id if isinstance(func, ast.Name) else \
+            getattr(func, 'attr', None)
+        if name != 'attr':
+            continue
+        for arg in decorator.args:
+            attributes[_literal(arg)] = True
+        for keyword in decorator.keywords:
+            attributes[keyword.arg] = _literal(keyword.value)
+    return attributes
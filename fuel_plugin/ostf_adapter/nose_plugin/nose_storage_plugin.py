@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from datetime import datetime
 from time import time
 import logging
 import os
@@ -19,6 +20,7 @@ import os
 from nose import plugins
 from nose.suite import ContextSuite
 from pecan import conf
+from fuel_plugin.ostf_adapter.nose_plugin import nose_heartbeat
 from fuel_plugin.ostf_adapter.nose_plugin import nose_utils
 
 from fuel_plugin.ostf_adapter.storage import models, engine
@@ -44,24 +46,32 @@ class StoragePlugin(plugins.Plugin):
         env['NAILGUN_PORT'] = str(conf.nailgun.port)
         if self.cluster_id:
             env['CLUSTER_ID'] = str(self.cluster_id)
+        # resources created by tests are recorded with test run
+        env['TEST_RUN_ID'] = str(self.test_run_id)
 
     def configure(self, options, conf):
         self.conf = conf
 
     def _add_message(
             self, test, err=None, status=None):
+        """Only status and timing of test are written, its
+        title and description are already in the catalog
+        """
         data = {
             'status': status,
             'time_taken': self.taken
         }
-        data['title'], data['description'], data['duration'] = \
-            nose_utils.get_description(test)
+        if status == 'running':
+            # clients are told when test is expected to end
+            data['started_at'] = datetime.utcnow()
         if err:
             exc_type, exc_value, exc_traceback = err
             data['step'], data['message'] = None, u''
             if not status == 'error':
                 data['step'], data['message'] = \
                     nose_utils.format_failure_message(exc_value)
+            elif issubclass(exc_type, nose_heartbeat.TestTimeout):
+                data['message'] = unicode(exc_value)
             data['traceback'] = u''
         else:
             data['step'], data['message'] = None, u''
@@ -73,8 +83,6 @@ class StoragePlugin(plugins.Plugin):
 
             if isinstance(test, ContextSuite):
                 for sub_test in test._tests:
-                    data['title'], data['description'], data['duration'] = \
-                        nose_utils.get_description(test)
                     models.Test.add_result(
                         session, self.test_run_id, sub_test.id(), data)
             else:
@@ -85,11 +93,19 @@ class StoragePlugin(plugins.Plugin):
         self._add_message(test, status='success')
 
     def addFailure(self, test, err):
-        LOG.error('%s', test.id(), exc_info=err)
-        self._add_message(test, err=err, status='failure')
+        if nose_heartbeat.cancelled():
+            # test of cancelled run fails because it was stopped
+            LOG.info('%s stopped', test.id())
+            self._add_message(test, err=err, status='stopped')
+        else:
+            LOG.error('%s', test.id(), exc_info=err)
+            self._add_message(test, err=err, status='failure')
 
     def addError(self, test, err):
-        if err[0] == AssertionError:
+        if nose_heartbeat.cancelled():
+            LOG.info('%s stopped', test.id())
+            self._add_message(test, err=err, status='stopped')
+        elif err[0] == AssertionError:
             LOG.error('%s', test.id(), exc_info=err)
             self._add_message(
                 test, err=err, status='failure')
@@ -54,28 +54,66 @@ def get_description(test_obj):
     this method works pretty buggy.
     '''
     if isinstance(test_obj, case.Test):
-        docstring = test_obj.test._testMethodDoc
-
-        if docstring:
-            duration_pattern = r'Duration:.?(?P<duration>.+)'
-            duration_matcher = re.search(duration_pattern, docstring)
-
-            if duration_matcher:
-                duration = duration_matcher.group(1)
-                docstring = docstring[:duration_matcher.start()]
-            else:
-                duration = None
-            docstring = docstring.split('\n')
-            name = docstring.pop(0)
-            description = u'\n'.join(docstring) if docstring else u""
-
-            return name, description, duration
+        return parse_docstring(test_obj.test._testMethodDoc)
     return u"", u"", u""
 
 
-def modify_test_name_for_nose(test_path):
-    test_module, test_class, test_method = test_path.rsplit('.', 2)
-    return '{0}:{1}.{2}'.format(test_module, test_class, test_method)
+def parse_docstring(docstring):
+    '''
+    Splits docstring of test into title, description
+    and declared duration.
+    '''
+    if docstring:
+        duration_pattern = r'Duration:.?(?P<duration>.+)'
+        duration_matcher = re.search(duration_pattern, docstring)
+
+        if duration_matcher:
+            duration = duration_matcher.group(1)
+            docstring = docstring[:duration_matcher.start()]
+        else:
+            duration = None
+        docstring = docstring.split('\n')
+        name = docstring.pop(0)
+        description = u'\n'.join(docstring) if docstring else u""
+
+        return name, description, duration
+    return u"", u"", u""
+
+
+def get_attributes(test_obj):
+    '''
+    Returns attributes set on test method,
+    e.g. by nose.plugins.attrib.attr decorator.
+    '''
+    if isinstance(test_obj, case.Test):
+        method = getattr(test_obj.test, test_obj.test._testMethodName)
+        func = getattr(method, 'im_func', method)
+        return dict((key, value) for key, value
+                    in getattr(func, '__dict__', {}).iteritems()
+                    if not key.startswith('_'))
+    return {}
+
+
+def parse_duration(duration):
+    '''
+    Converts declared duration of test (like "20 s.", "1-40 s.",
+    "5sec" or "3 min") to seconds. Upper bound is taken for ranges.
+    Returns None if duration could not be recognized.
+    '''
+    if not duration:
+        return None
+    matcher = re.search(
+        r'(\d+(?:\.\d+)?)\s*(?:-\s*(\d+(?:\.\d+)?))?\s*([a-zA-Z]*)',
+        duration)
+    if not matcher:
+        return None
+    lower, upper, unit = matcher.groups()
+    seconds = float(upper or lower)
+    if unit.lower().startswith('m'):
+        seconds *= 60
+    elif unit.lower().startswith('h'):
+        seconds *= 3600
+    return seconds
 
 
 def format_exception(exc_info):
@@ -0,0 +1,224 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Runner zygote.
+
+Zygote is a separate clean process, which preloads test modules
+(and therefore client libraries they use) and keeps a pool of
+forked runners waiting for test runs. Server passes test runs to
+zygote through unix socket, every runner executes single test run
+and exits, its place in the pool is taken by freshly forked one.
+"""
+
+import errno
+import importlib
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+
+import pecan
+
+from fuel_plugin.ostf_adapter import logger
+from fuel_plugin.ostf_adapter.storage import engine, models
+
+
+LOG = logging.getLogger(__name__)
+
+ACCEPT_TIMEOUT = 1
+
+
+def start(socket_path, pool_size, config, log_file=None):
+    """Starts zygote process, returns its Popen object"""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    return subprocess.Popen(
+        [sys.executable, '-m', __name__, socket_path, str(pool_size),
+         json.dumps(config), log_file or ''])
+
+
+def spawn(socket_path, test_run_id, cluster_id, test_set_id, argv_add,
+          tests):
+    """Passes test run to zygote, returns pid of runner"""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall(json.dumps({
+            'test_run_id': test_run_id,
+            'cluster_id': cluster_id,
+            'test_set_id': test_set_id,
+            'argv_add': argv_add,
+            'tests': tests
+        }) + '\n')
+        return json.loads(_read_line(client.makefile('r')))['pid']
+    finally:
+        client.close()
+
+
+def _read_line(stream):
+    line = stream.readline()
+    if not line:
+        raise EOFError('Connection closed')
+    return line
+
+
+class Zygote(object):
+
+    def __init__(self, socket_path, pool_size):
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        # pid -> write end of pipe of runners waiting for test run
+        self.pool = {}
+        self.parent_pid = os.getppid()
+        self.listener = None
+        self._stopping = False
+        self._preloaded = set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.socket_path)
+        self.listener.listen(16)
+        self.listener.settimeout(ACCEPT_TIMEOUT)
+        LOG.info('Runner zygote %s listens on %s',
+                 os.getpid(), self.socket_path)
+
+        try:
+            while not self._stopping and \
+                    os.getppid() == self.parent_pid:
+                self.fill_pool()
+                self.reap()
+                try:
+                    conn, _ = self.listener.accept()
+                except socket.timeout:
+                    continue
+                except socket.error as e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    raise
+                try:
+                    self.handle(conn)
+                except Exception:
+                    LOG.exception('Failed to start test run')
+                finally:
+                    conn.close()
+        finally:
+            self.listener.close()
+            os.unlink(self.socket_path)
+            for fd in self.pool.values():
+                os.close(fd)
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def handle(self, conn):
+        conn.settimeout(None)
+        job = _read_line(conn.makefile('r'))
+        self.fill_pool()
+        pid, fd = self.pool.popitem()
+        os.write(fd, job)
+        os.close(fd)
+        LOG.info('Test run %s passed to runner %s',
+                 json.loads(job)['test_run_id'], pid)
+        conn.sendall(json.dumps({'pid': pid}) + '\n')
+
+    def preload(self):
+        """Imports test modules of catalog, modules discovered
+        after zygote start are imported before next fork
+        """
+        session = engine.get_session()
+        with session.begin(subtransactions=True):
+            modules = set(name.rsplit('.', 2)[0] for name, in
+                          session.query(models.Test.name).filter_by(
+                              test_run_id=None))
+        for module in sorted(modules - self._preloaded):
+            self._preloaded.add(module)
+            try:
+                importlib.import_module(module)
+            except Exception:
+                LOG.exception('Failed to preload %s', module)
+
+    def fill_pool(self):
+        if len(self.pool) >= self.pool_size:
+            return
+        try:
+            self.preload()
+        except Exception:
+            LOG.exception('Failed to preload test modules')
+        while len(self.pool) < self.pool_size:
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(write_fd)
+                self.listener.close()
+                for fd in self.pool.values():
+                    os.close(fd)
+                code = 0
+                try:
+                    run_job(read_fd)
+                except Exception:
+                    LOG.exception('Runner %s failed', os.getpid())
+                    code = 1
+                os._exit(code)
+            os.close(read_fd)
+            self.pool[pid] = write_fd
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.ECHILD:
+                    return
+                raise
+            if not pid:
+                return
+            fd = self.pool.pop(pid, None)
+            if fd is not None:
+                LOG.error('Idle runner %s died with status %s', pid, status)
+                os.close(fd)
+
+
+def run_job(read_fd):
+    """Waits for test run and executes it"""
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    with os.fdopen(read_fd) as stream:
+        line = stream.readline()
+    if not line:
+        # zygote exited, runner is not needed anymore
+        return
+    job = json.loads(line)
+
+    # nose_adapter uses this module to start runners
+    from fuel_plugin.ostf_adapter.nose_plugin import nose_adapter
+    nose_adapter.NoseDriver()._run_tests(
+        job['test_run_id'], job['cluster_id'], job['test_set_id'],
+        job['argv_add'], job['tests'])
+
+
+def main(argv):
+    socket_path, pool_size, config, log_file = argv
+    logger.setup(log_file=log_file or None)
+    pecan.conf.update(json.loads(config))
+    Zygote(socket_path, int(pool_size)).run()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
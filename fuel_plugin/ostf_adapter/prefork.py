@@ -0,0 +1,200 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import logging
+import os
+import resource
+import signal
+import time
+
+import gevent
+from gevent import pywsgi
+from gevent import socket
+
+
+LOG = logging.getLogger(__name__)
+
+
+class RecyclingMiddleware(object):
+    """Counts served requests and notifies the worker
+    when it has to be recycled.
+
+    :param max_requests: recycle after that many requests, 0 - never
+    :param max_memory: recycle when peak RSS exceeds that many MB, 0 - never
+    :param on_limit: callable that is invoked once a limit is reached
+    """
+
+    def __init__(self, app, max_requests=0, max_memory=0, on_limit=None):
+        self.app = app
+        self.max_requests = max_requests
+        self.max_memory = max_memory
+        self.on_limit = on_limit
+        self.requests = 0
+        self.retiring = False
+
+    def __call__(self, environ, start_response):
+        try:
+            return self.app(environ, start_response)
+        finally:
+            self.requests += 1
+            if not self.retiring and self.limit_reached():
+                self.retiring = True
+                if self.on_limit:
+                    self.on_limit()
+
+    def limit_reached(self):
+        if self.max_requests and self.requests >= self.max_requests:
+            LOG.info('Worker %s served %s requests',
+                     os.getpid(), self.requests)
+            return True
+        if self.max_memory and get_rss_mb() >= self.max_memory:
+            LOG.info('Worker %s exceeded memory limit of %s MB',
+                     os.getpid(), self.max_memory)
+            return True
+        return False
+
+
+def get_rss_mb():
+    """Peak resident set size of current process in megabytes"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Master(object):
+    """Binds listening socket and supervises forked workers
+    which share it.
+
+    Workers that die are restarted, workers that reached
+    request or memory limits exit gracefully and are replaced.
+    on_start callable is invoked once the first workers are started.
+    """
+
+    SUPERVISE_INTERVAL = 1
+    STOP_TIMEOUT = 10
+
+    def __init__(self, app, host, port, workers,
+                 max_requests=0, max_memory=0, backlog=128, on_start=None):
+        self.app = app
+        self.address = (host, int(port))
+        self.workers_count = workers
+        self.max_requests = max_requests
+        self.max_memory = max_memory
+        self.backlog = backlog
+        self.on_start = on_start
+        self.workers = {}
+        self.listener = None
+        self._stopping = False
+
+    def run(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(self.address)
+        self.listener.listen(self.backlog)
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+
+        LOG.info('Master %s starts %s workers',
+                 os.getpid(), self.workers_count)
+        self._spawn_workers()
+        if self.on_start:
+            self.on_start()
+        while not self._stopping:
+            self._spawn_workers()
+            self._reap_workers()
+            time.sleep(self.SUPERVISE_INTERVAL)
+        self._stop_workers()
+
+    def _handle_stop(self, signum, frame):
+        LOG.info('Master %s received signal %s, stopping',
+                 os.getpid(), signum)
+        self._stopping = True
+
+    def _handle_reload(self, signum, frame):
+        LOG.info('Recycling all workers')
+        for pid in self.workers.keys():
+            self._signal_worker(pid, signal.SIGTERM)
+
+    def _spawn_workers(self):
+        while len(self.workers) < self.workers_count:
+            pid = gevent.fork()
+            if pid == 0:
+                try:
+                    self._serve()
+                except Exception:
+                    LOG.exception('Worker %s failed', os.getpid())
+                    os._exit(1)
+                # os._exit skips atexit handlers, so multiprocessing
+                # won't terminate test runs started by this worker
+                os._exit(0)
+            self.workers[pid] = time.time()
+            LOG.info('Worker %s started', pid)
+
+    def _reap_workers(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.ECHILD:
+                    break
+                raise
+            if not pid:
+                break
+            if self.workers.pop(pid, None) is None:
+                continue
+            if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+                LOG.info('Worker %s recycled', pid)
+            else:
+                LOG.error('Worker %s died with status %s, restarting',
+                          pid, status)
+
+    def _stop_workers(self):
+        for pid in self.workers.keys():
+            self._signal_worker(pid, signal.SIGTERM)
+        deadline = time.time() + self.STOP_TIMEOUT
+        while self.workers and time.time() < deadline:
+            self._reap_workers()
+            time.sleep(0.1)
+        for pid in self.workers.keys():
+            self._signal_worker(pid, signal.SIGKILL)
+        self.listener.close()
+
+    def _signal_worker(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                self.workers.pop(pid, None)
+            else:
+                raise
+
+    def _serve(self):
+        for signum in (signal.SIGTERM, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_DFL)
+        # ctrl-c is handled by master
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # test runs are forked from workers, they must not become zombies
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+        app = RecyclingMiddleware(self.app, self.max_requests,
+                                  self.max_memory)
+        server = pywsgi.WSGIServer(self.listener, app)
+        retire = lambda: gevent.spawn(server.stop, self.STOP_TIMEOUT)
+        app.on_limit = retire
+        gevent.signal(signal.SIGTERM, retire)
+
+        LOG.info('Worker %s serving on http://%s:%s',
+                 os.getpid(), *self.address)
+        server.serve_forever()
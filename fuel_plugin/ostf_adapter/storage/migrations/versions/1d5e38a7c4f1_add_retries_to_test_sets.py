@@ -0,0 +1,37 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Add retries to test sets
+
+Revision ID: 1d5e38a7c4f1
+Revises: 4b5ac4a7f2d8
+Create Date: 2013-09-09 12:15:37.220481
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1d5e38a7c4f1'
+down_revision = '4b5ac4a7f2d8'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('test_sets', sa.Column('retries', sa.Integer(),
+                                         nullable=True))
+
+
+def downgrade():
+    op.drop_column('test_sets', 'retries')
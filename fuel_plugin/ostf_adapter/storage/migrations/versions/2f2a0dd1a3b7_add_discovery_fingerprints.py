@@ -0,0 +1,42 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Add discovery fingerprints
+
+Revision ID: 2f2a0dd1a3b7
+Revises: 53af7c2d3e44
+Create Date: 2013-09-04 11:02:45.183726
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2f2a0dd1a3b7'
+down_revision = '53af7c2d3e44'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'discovery_fingerprints',
+        sa.Column('path', sa.String(length=512), nullable=False),
+        sa.Column('digest', sa.String(length=40), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('path')
+    )
+
+
+def downgrade():
+    op.drop_table('discovery_fingerprints')
@@ -0,0 +1,48 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Add runner processes registry
+
+Revision ID: 53af7c2d3e44
+Revises: 3e45add6471
+Create Date: 2013-09-02 14:21:07.519842
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '53af7c2d3e44'
+down_revision = '3e45add6471'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'runner_processes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('test_run_id', sa.Integer(), nullable=True),
+        sa.Column('host', sa.String(length=256), nullable=False),
+        sa.Column('pid', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('command', sa.String(length=128), nullable=True),
+        sa.ForeignKeyConstraint(['test_run_id'], ['test_runs.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('test_run_id')
+    )
+
+
+def downgrade():
+    op.drop_table('runner_processes')
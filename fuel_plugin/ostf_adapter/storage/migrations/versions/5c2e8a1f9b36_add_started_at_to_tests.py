@@ -0,0 +1,37 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Add start time to tests
+
+Revision ID: 5c2e8a1f9b36
+Revises: 1d5e38a7c4f1
+Create Date: 2013-09-11 10:42:18.503127
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5c2e8a1f9b36'
+down_revision = '1d5e38a7c4f1'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('tests', sa.Column('started_at', sa.DateTime(),
+                                     nullable=True))
+
+
+def downgrade():
+    op.drop_column('tests', 'started_at')
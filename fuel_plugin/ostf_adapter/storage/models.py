@@ -12,13 +12,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from datetime import datetime
+from datetime import datetime, timedelta
+import errno
+import os
+import socket
 
 import sqlalchemy as sa
 from sqlalchemy import desc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import joinedload, relationship, object_mapper
+from sqlalchemy.orm import object_session
 from fuel_plugin.ostf_adapter import nose_plugin
+from fuel_plugin.ostf_adapter.nose_plugin import nose_scheduler
 from fuel_plugin.ostf_adapter.storage import fields, engine
 
 
@@ -31,9 +36,14 @@ class TestRun(BASE):
 
     STATES = (
         'running',
-        'finished'
+        'finished',
+        'interrupted'
     )
 
+    # bounds of polling interval suggested to clients
+    MIN_POLL_AFTER = 1
+    MAX_POLL_AFTER = 30
+
     id = sa.Column(sa.Integer(), primary_key=True)
     cluster_id = sa.Column(sa.Integer(), nullable=False)
     status = sa.Column(sa.Enum(*STATES, name='test_run_states'),
@@ -59,6 +69,9 @@ class TestRun(BASE):
     def is_finished(self):
         return self.status == 'finished'
 
+    def is_running(self):
+        return self.status == 'running'
+
     @property
     def frontend(self):
         test_run_data = {
@@ -73,8 +86,44 @@ class TestRun(BASE):
         }
         if self.tests:
             test_run_data['tests'] = [test.frontend for test in self.tests]
+        if self.status == 'running':
+            poll_after = self.poll_after
+            if poll_after is not None:
+                test_run_data['poll_after'] = poll_after
         return test_run_data
 
+    @property
+    def poll_after(self):
+        """Seconds until state of test run is expected to change.
+
+        Running tests are expected to take median of their durations
+        in recent runs, or their declared duration if they have no
+        history. None is returned if there is no estimate, while no
+        test is running or tests run longer than expected.
+        """
+        running = [test for test in self.tests
+                   if test.status == 'running' and test.started_at]
+        if not running:
+            return None
+        session = object_session(self)
+        history = {}
+        if session is not None:
+            history = Test.get_history(session, self.test_set_id)
+        now = datetime.utcnow()
+        remaining = []
+        for test in running:
+            if history.get(test.name):
+                expected = nose_scheduler.median(history[test.name])
+            else:
+                expected = test.expected_duration
+            left = expected - (now - test.started_at).total_seconds()
+            if left > 0:
+                remaining.append(left)
+        if not remaining:
+            return None
+        return min(max(min(remaining), self.MIN_POLL_AFTER),
+                   self.MAX_POLL_AFTER)
+
     @classmethod
     def add_test_run(cls, session, test_set, cluster_id, status='running',
                      tests=None):
@@ -95,6 +144,42 @@ class TestRun(BASE):
             order_by(desc(cls.id)).first()
         return test_run
 
+    @classmethod
+    def has_active_test_runs(cls, session, cluster_id):
+        return bool(session.query(cls.id).filter(
+            cls.cluster_id == cluster_id,
+            cls.status == 'running').first())
+
+    @classmethod
+    def get_idle_clusters(cls, session, idle_since):
+        """Clusters without running test runs, which last test run
+        ended before idle_since. Interrupted test runs are idle, they
+        are taken as ended when they started.
+
+        :returns: dict cluster id -> (end of last test run,
+                  cleanup paths of test sets run on cluster)
+        """
+        busy = session.query(cls.cluster_id).filter(cls.status == 'running')
+        ended_at = sa.func.max(
+            sa.func.coalesce(cls.ended_at, cls.started_at,
+                             type_=sa.DateTime),
+            type_=sa.DateTime)
+        idle = session.query(cls.cluster_id, ended_at).\
+            filter(~cls.cluster_id.in_(busy)).\
+            group_by(cls.cluster_id).\
+            having(ended_at < idle_since)
+        clusters = dict((cluster_id, (ended_at, []))
+                        for cluster_id, ended_at in idle)
+        if clusters:
+            paths = session.query(cls.cluster_id, TestSet.cleanup_path).\
+                join(TestSet).\
+                filter(cls.cluster_id.in_(clusters.keys()),
+                       TestSet.cleanup_path != None).\
+                distinct()
+            for cluster_id, cleanup_path in paths:
+                clusters[cluster_id][1].append(cleanup_path)
+        return clusters
+
     @classmethod
     def get_test_results(cls):
         session = engine.get_session()
@@ -127,16 +212,45 @@ class TestRun(BASE):
             filter(cls.id == test_run_id). \
             update(updated_data, synchronize_session=False)
 
+    @classmethod
+    def update_meta(cls, session, test_run_id, **values):
+        test_run = cls.get_test_run(session, test_run_id)
+        meta = dict(test_run.meta or {})
+        meta.update(values)
+        session.query(cls).filter_by(id=test_run_id).\
+            update({'meta': meta}, synchronize_session=False)
+
     @classmethod
     def is_last_running(cls, session, test_set, cluster_id):
         test_run = cls.get_last_test_run(session, test_set, cluster_id)
-        return not bool(test_run) or test_run.is_finished()
+        return not bool(test_run) or not test_run.is_running()
+
+    @classmethod
+    def finish_interrupted(cls, session, test_set, cluster_id):
+        """Interrupted test runs that are not going to be resumed
+        are finished, their remaining tests are stopped
+        """
+        test_runs = [test_run.id for test_run in session.query(cls).
+                     filter_by(test_set_id=test_set, cluster_id=cluster_id,
+                               status='interrupted')]
+        if test_runs:
+            session.query(cls).filter(cls.id.in_(test_runs)).\
+                update({'status': 'finished',
+                        'ended_at': datetime.utcnow()},
+                       synchronize_session=False)
+            session.query(Test).filter(
+                Test.test_run_id.in_(test_runs),
+                Test.status == 'wait_running').\
+                update({'status': 'stopped'}, synchronize_session=False)
 
     @classmethod
     def start(cls, session, test_set, metadata, tests):
         plugin = nose_plugin.get_plugin(test_set.driver)
+        RunnerProcess.reap_orphans(session)
         if cls.is_last_running(session, test_set.id,
                                metadata['cluster_id']):
+            cls.finish_interrupted(session, test_set.id,
+                                   metadata['cluster_id'])
             test_run = cls.add_test_run(
                 session, test_set.id,
                 metadata['cluster_id'], tests=tests)
@@ -148,6 +262,7 @@ class TestRun(BASE):
         """Restart test run with
             if tests given they will be enabled
         """
+        RunnerProcess.reap_orphans(session)
         if TestRun.is_last_running(session,
                                    self.test_set_id,
                                    self.cluster_id):
@@ -160,9 +275,39 @@ class TestRun(BASE):
             return self.frontend
         return {}
 
+    def resume(self, session):
+        """Resume interrupted test run,
+            only tests not finished before interruption are run
+        """
+        if RunnerProcess.reap_orphans(session):
+            # statuses were changed by bulk update
+            session.expire_all()
+        last_test_run = TestRun.get_last_test_run(
+            session, self.test_set_id, self.cluster_id)
+        if self.status != 'interrupted' or last_test_run.id != self.id:
+            return {}
+        tests = [test.name for test in self.tests
+                 if test.status == 'wait_running']
+        if self.test_set is None:
+            # test set was removed from catalog with its package
+            Test.update_running_tests(session, self.id, status='stopped')
+            tests = []
+        if not tests:
+            self.update(session, 'finished')
+            return self.frontend
+        plugin = nose_plugin.get_plugin(self.test_set.driver)
+        self.update(session, 'running')
+        plugin.run(self, self.test_set, tests)
+        return self.frontend
+
     def stop(self, session):
         """Stop test run if running
         """
+        if self.status == 'interrupted':
+            TestRun.finish_interrupted(
+                session, self.test_set_id, self.cluster_id)
+            session.refresh(self)
+            return self.frontend
         plugin = nose_plugin.get_plugin(self.test_set.driver)
         killed = plugin.kill(
             self.id, self.cluster_id,
@@ -184,6 +329,10 @@ class TestSet(BASE):
     additional_arguments = sa.Column(fields.ListField())
     cleanup_path = sa.Column(sa.String(128))
     meta = sa.Column(fields.JsonField())
+    # number of processes test classes are run in, serially if not set
+    parallel = sa.Column(sa.Integer())
+    # how many times failed tests are retried within test run
+    retries = sa.Column(sa.Integer())
 
     tests = relationship('Test',
                          backref='test_set', order_by='Test.name')
@@ -210,6 +359,9 @@ class Test(BASE):
         'stopped'
     )
 
+    # seconds a test without declared duration is expected to take
+    DEFAULT_DURATION = 60
+
     id = sa.Column(sa.Integer(), primary_key=True)
     name = sa.Column(sa.String(512))
     title = sa.Column(sa.String(512))
@@ -220,6 +372,7 @@ class Test(BASE):
     status = sa.Column(sa.Enum(*STATES, name='test_states'))
     step = sa.Column(sa.Integer())
     time_taken = sa.Column(sa.Float())
+    started_at = sa.Column(sa.DateTime)
     meta = sa.Column(fields.JsonField())
 
     test_set_id = sa.Column(sa.String(128), sa.ForeignKey('test_sets.id'))
@@ -239,12 +392,63 @@ class Test(BASE):
             'taken': self.time_taken
         }
 
+    @property
+    def expected_duration(self):
+        return (self.meta or {}).get('timeout') or self.DEFAULT_DURATION
+
     @classmethod
     def add_result(cls, session, test_run_id, test_name, data):
         session.query(cls).\
             filter_by(name=test_name, test_run_id=test_run_id).\
             update(data, synchronize_session=False)
 
+    @classmethod
+    def get_history(cls, session, test_set_id, runs=10):
+        """Durations of finished tests in recent runs of test set
+
+        :returns: dict of test name -> list of durations
+        """
+        test_runs = session.query(TestRun.id).\
+            filter_by(test_set_id=test_set_id).\
+            order_by(desc(TestRun.id)).limit(runs).subquery()
+        history = {}
+        for name, time_taken in session.query(cls.name, cls.time_taken).\
+                filter(cls.test_run_id.in_(test_runs),
+                       cls.status.in_(('success', 'failure', 'error')),
+                       cls.time_taken > 0):
+            history.setdefault(name, []).append(time_taken)
+        return history
+
+    @classmethod
+    def get_failed(cls, session, test_run_id, tests_names):
+        failed = set(name for name, in session.query(cls.name).filter(
+            cls.test_run_id == test_run_id,
+            cls.name.in_(tests_names),
+            cls.status.in_(('failure', 'error'))))
+        return [name for name in tests_names if name in failed]
+
+    @classmethod
+    def get_waiting(cls, session, test_run_id, tests_names):
+        waiting = set(name for name, in session.query(cls.name).filter(
+            cls.test_run_id == test_run_id,
+            cls.name.in_(tests_names),
+            cls.status == 'wait_running'))
+        return [name for name in tests_names if name in waiting]
+
+    @classmethod
+    def add_attempt(cls, session, test_run_id, test_name):
+        """Saves current result of test into list of its attempts"""
+        test = session.query(cls).filter_by(
+            test_run_id=test_run_id, name=test_name).first()
+        meta = dict(test.meta or {})
+        meta['attempts'] = meta.get('attempts', []) + [{
+            'status': test.status,
+            'step': test.step,
+            'message': test.message,
+            'taken': test.time_taken
+        }]
+        cls.add_result(session, test_run_id, test_name, {'meta': meta})
+
     @classmethod
     def update_running_tests(cls, session, test_run_id, status='stopped'):
         session.query(cls). \
@@ -273,3 +477,151 @@ class Test(BASE):
         else:
             new_test.status = 'wait_running'
         return new_test
+
+
+class RunnerProcess(BASE):
+    """Registry of processes that execute test runs.
+
+    Registry is shared between all ostf-server processes and hosts,
+    so any of them is able to find the runner of particular test run.
+    Runners update heartbeat_at periodically and read command
+    field, which is used as a control channel.
+    """
+
+    __tablename__ = 'runner_processes'
+
+    HEARTBEAT_TIMEOUT = 60
+
+    COMMANDS = (
+        'stop',
+    )
+
+    id = sa.Column(sa.Integer(), primary_key=True)
+    test_run_id = sa.Column(sa.Integer(), sa.ForeignKey('test_runs.id'),
+                            unique=True)
+    host = sa.Column(sa.String(256), nullable=False)
+    pid = sa.Column(sa.Integer(), nullable=False)
+    started_at = sa.Column(sa.DateTime, default=datetime.utcnow)
+    heartbeat_at = sa.Column(sa.DateTime, default=datetime.utcnow)
+    command = sa.Column(sa.String(128))
+
+    test_run = relationship('TestRun', backref='runner')
+
+    @property
+    def is_local(self):
+        return self.host == socket.gethostname()
+
+    @property
+    def is_alive(self):
+        """Runner is alive while it beats. Only processes of current
+        host can be checked directly, their pid could be reused
+        by another process after runner died.
+        """
+        if self.is_stale():
+            return False
+        if not self.is_local:
+            return True
+        try:
+            os.kill(self.pid, 0)
+        except OSError as e:
+            return e.errno != errno.ESRCH
+        return True
+
+    def is_stale(self, timeout=HEARTBEAT_TIMEOUT):
+        last_seen = self.heartbeat_at or self.started_at
+        return last_seen < datetime.utcnow() - timedelta(seconds=timeout)
+
+    @classmethod
+    def register(cls, session, test_run_id, pid, host=None):
+        session.query(cls).filter_by(test_run_id=test_run_id).\
+            delete(synchronize_session=False)
+        runner = cls(test_run_id=test_run_id, pid=pid,
+                     host=host or socket.gethostname())
+        session.add(runner)
+        return runner
+
+    @classmethod
+    def unregister(cls, session, test_run_id):
+        session.query(cls).filter_by(test_run_id=test_run_id).\
+            delete(synchronize_session=False)
+
+    @classmethod
+    def get_runner(cls, session, test_run_id):
+        return session.query(cls).filter_by(test_run_id=test_run_id).first()
+
+    @classmethod
+    def heartbeat(cls, session, test_run_id):
+        """Updates heartbeat of runner and returns pending command"""
+        session.query(cls).filter_by(test_run_id=test_run_id).\
+            update({'heartbeat_at': datetime.utcnow()},
+                   synchronize_session=False)
+        runner = cls.get_runner(session, test_run_id)
+        return runner.command if runner else None
+
+    @classmethod
+    def send_command(cls, session, test_run_id, command):
+        return session.query(cls).filter_by(test_run_id=test_run_id).\
+            update({'command': command}, synchronize_session=False)
+
+    @classmethod
+    def reap_orphans(cls, session, timeout=HEARTBEAT_TIMEOUT):
+        """Interrupts test runs which runners are gone.
+
+        Runner is considered gone if its heartbeat is stale or
+        if it is registered on current host and its process is dead.
+        Running test runs without runner are interrupted, results of
+        their finished tests are kept and tests that were running are
+        scheduled again, so test run can be resumed.
+        """
+        orphans = [runner.test_run_id for runner in session.query(cls)
+                   if runner.is_stale(timeout) or not runner.is_alive]
+        if orphans:
+            session.query(cls).filter(cls.test_run_id.in_(orphans)).\
+                delete(synchronize_session=False)
+
+        registered = session.query(cls.test_run_id)
+        test_runs = [test_run.id for test_run
+                     in session.query(TestRun).filter(
+                         TestRun.status == 'running',
+                         ~TestRun.id.in_(registered))]
+        if test_runs:
+            session.query(TestRun).filter(TestRun.id.in_(test_runs)).\
+                update({'status': 'interrupted'},
+                       synchronize_session=False)
+            session.query(Test).filter(
+                Test.test_run_id.in_(test_runs),
+                Test.status == 'running').\
+                update({'status': 'wait_running'},
+                       synchronize_session=False)
+        return test_runs
+
+
+class DiscoveryFingerprint(BASE):
+    """Content fingerprints of discovered test packages.
+
+    Package is rediscovered only when its current fingerprint
+    differs from the stored one.
+    """
+
+    __tablename__ = 'discovery_fingerprints'
+
+    path = sa.Column(sa.String(512), primary_key=True)
+    digest = sa.Column(sa.String(40), nullable=False)
+    updated_at = sa.Column(sa.DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def _under(cls, session, root):
+        return session.query(cls).filter(
+            sa.or_(cls.path == root, cls.path.like(root + '/%')))
+
+    @classmethod
+    def get_digests(cls, session, root):
+        return dict((fingerprint.path, fingerprint.digest)
+                    for fingerprint in cls._under(session, root))
+
+    @classmethod
+    def update_digests(cls, session, root, digests):
+        """Replaces all fingerprints stored for root with given ones"""
+        cls._under(session, root).delete(synchronize_session=False)
+        session.add_all(cls(path=path, digest=digest)
+                        for path, digest in digests.iteritems())
@@ -13,13 +13,133 @@
 #    under the License.
 
 
+import logging
+
+import sqlalchemy as sa
+
 from fuel_plugin.ostf_adapter.storage import models
 
 
-def update_all_running_test_runs(session):
-    session.query(models.TestRun). \
-        filter_by(status='running'). \
-        update({'status': 'finished'}, synchronize_session=False)
-    session.query(models.Test). \
-        filter(models.Test.status.in_(('running', 'wait_running'))). \
-        update({'status': 'stopped'}, synchronize_session=False)
+LOG = logging.getLogger(__name__)
+
+
+def reap_orphaned_test_runs(session):
+    """Interrupts test runs left without alive runner process,
+    runners which are still alive keep their test runs.
+    """
+    return models.RunnerProcess.reap_orphans(session)
+
+
+def resume_test_runs(session, test_run_ids):
+    """Resumes interrupted test runs from their checkpoints,
+    tests that have results already are not run again.
+    """
+    resumed = []
+    for test_run_id in test_run_ids:
+        test_run = models.TestRun.get_test_run(session, test_run_id)
+        if test_run and test_run.resume(session):
+            resumed.append(test_run_id)
+    LOG.info('Resumed interrupted test runs: %s', resumed)
+    return resumed
+
+
+def update_catalog(session, test_sets, tests):
+    """Brings catalog in line with discovered test sets and tests.
+
+    Catalog is read once, then only difference is written:
+    new entries are inserted, changed ones are updated and
+    catalog tests of discovered test sets that no longer exist
+    are removed. Test runs history is not affected.
+
+    :param test_sets: test set id -> __profile__ dict
+    :param tests: test name -> dict of Test attributes
+    """
+    existing_sets = dict(
+        (test_set.id, test_set) for test_set in
+        session.query(models.TestSet).filter(
+            models.TestSet.id.in_(test_sets.keys())))
+    for test_set_id, profile in test_sets.iteritems():
+        test_set = existing_sets.get(test_set_id)
+        if test_set is None:
+            session.add(models.TestSet(**profile))
+        else:
+            _update_changed(test_set, profile)
+
+    added, updated, removed = 0, 0, []
+    catalog = {}
+    for test in session.query(models.Test).filter(
+            models.Test.test_run_id == None,
+            models.Test.test_set_id.in_(test_sets.keys())):
+        data = tests.get(test.name)
+        if data is None or test.name in catalog or \
+                data['test_set_id'] != test.test_set_id:
+            removed.append(test.id)
+        else:
+            catalog[test.name] = test
+
+    for name, data in tests.iteritems():
+        test = catalog.get(name)
+        if test is None:
+            session.add(models.Test(**data))
+            added += 1
+        elif _update_changed(test, data):
+            updated += 1
+
+    if removed:
+        session.query(models.Test).\
+            filter(models.Test.id.in_(removed)).\
+            delete(synchronize_session=False)
+
+    LOG.info('Catalog updated: %s tests added, %s updated, %s removed',
+             added, updated, len(removed))
+    return added, updated, len(removed)
+
+
+def remove_test_sets(session, modules, test_paths):
+    """Removes test sets of test packages that no longer exist
+    together with their catalog tests. Test runs history is not
+    affected.
+
+    :param modules: dotted names of modules of the packages, test
+                    sets which tests are defined in them are removed
+    :param test_paths: paths of the packages, test sets with one of
+                       them as test path are removed
+    :returns: list of ids of removed test sets
+    """
+    catalog = session.query(models.Test.test_set_id).filter(
+        models.Test.test_run_id == None,
+        sa.or_(*[models.Test.name.like(_escape_like(module) + '.%',
+                                       escape='\\')
+                 for module in modules]))
+    removed = set(test_set_id for test_set_id, in catalog)
+    removed.update(
+        test_set_id for test_set_id, in
+        session.query(models.TestSet.id).filter(
+            models.TestSet.test_path.in_(test_paths)))
+    removed.discard(None)
+    if removed:
+        session.query(models.Test).filter(
+            models.Test.test_run_id == None,
+            models.Test.test_set_id.in_(removed)).\
+            delete(synchronize_session=False)
+        session.query(models.TestSet).filter(
+            models.TestSet.id.in_(removed)).\
+            delete(synchronize_session=False)
+    LOG.info('Test sets of removed packages are removed: %s',
+             sorted(removed))
+    return sorted(removed)
+
+
+def _escape_like(value):
+    for char in ('\\', '%', '_'):
+        value = value.replace(char, '\\' + char)
+    return value
+
+
+def _update_changed(obj, data):
+    changed = False
+    for key, value in data.iteritems():
+        if getattr(obj, key) != value:
+            setattr(obj, key, value)
+            changed = True
+    return changed
@@ -0,0 +1,125 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime, timedelta
+import errno
+import importlib
+import logging
+import os
+import signal
+import time
+
+from pecan import conf
+
+from fuel_plugin.ostf_adapter.storage import engine, models
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Sweeper(object):
+    """Reclaims resources left by tests on clusters that are idle.
+
+    Cluster is swept once no test run is active on it for idle
+    seconds, again only after it was tested. Sweep is done by cleanup
+    of test sets in a child process under rate limit and time budget,
+    cluster that was not swept completely is swept on next pass.
+    Sweep is aborted as soon as test run is started on the cluster.
+
+    Resources recorded in the ledger of the cluster are deleted,
+    with prefix resources are also found by names, which requires
+    listing all resources of the cloud.
+    """
+
+    POLL_INTERVAL = 1
+    # time allowed for listing resources on top of budget
+    LIST_TIMEOUT = 60
+
+    def __init__(self, interval, idle, budget, rate, prefix=False):
+        self.interval = interval
+        self.idle = idle
+        self.budget = budget
+        self.rate = rate
+        self.prefix = prefix
+        # cluster id -> end of last test run it was swept after
+        self.swept = {}
+
+    def run(self):
+        # server ignores SIGCHLD, sweeps have to be waited for
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception:
+                LOG.exception('Sweep of idle clusters failed')
+
+    def sweep(self):
+        session = engine.get_session()
+        with session.begin(subtransactions=True):
+            clusters = models.TestRun.get_idle_clusters(
+                session, datetime.utcnow() - timedelta(seconds=self.idle))
+        for cluster_id, (ended_at, cleanup_paths) in clusters.iteritems():
+            if not cleanup_paths or self.swept.get(cluster_id) == ended_at:
+                continue
+            if self.sweep_cluster(cluster_id, cleanup_paths):
+                self.swept[cluster_id] = ended_at
+
+    def sweep_cluster(self, cluster_id, cleanup_paths):
+        """Sweeps cluster in child process, returns True if
+        all resources left by tests were deleted
+        """
+        LOG.info('Sweeping idle cluster %s', cluster_id)
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = self._sweep(cluster_id, cleanup_paths)
+            except Exception:
+                LOG.exception('Sweep of cluster %s failed', cluster_id)
+            os._exit(code)
+
+        deadline = time.time() + self.budget + self.LIST_TIMEOUT
+        session = engine.get_session()
+        while True:
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if done:
+                return os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+            if time.time() > deadline or \
+                    models.TestRun.has_active_test_runs(session, cluster_id):
+                LOG.info('Sweep of cluster %s is aborted', cluster_id)
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                return False
+            time.sleep(self.POLL_INTERVAL)
+
+    def _sweep(self, cluster_id, cleanup_paths):
+        os.environ['NAILGUN_HOST'] = str(conf.nailgun.host)
+        os.environ['NAILGUN_PORT'] = str(conf.nailgun.port)
+        os.environ['CLUSTER_ID'] = str(cluster_id)
+        os.environ.pop('TEST_RUN_ID', None)
+
+        left = 0
+        for cleanup_path in cleanup_paths:
+            cleanup = importlib.import_module(cleanup_path)
+            left += cleanup.cleanup(sweep=self.prefix, budget=self.budget,
+                                    rate=self.rate) or 0
+        LOG.info('Cluster %s is swept, %s resources are left',
+                 cluster_id, left)
+        return 1 if left else 0
@@ -133,4 +133,6 @@ class TestrunsController(BaseRestController):
                     data.append(test_run.stop(request.session))
                 elif status == 'restarted':
                     data.append(test_run.restart(request.session, tests=tests))
+                elif status == 'resumed':
+                    data.append(test_run.resume(request.session))
         return data
@@ -12,19 +12,59 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from multiprocessing.pool import ThreadPool
+import random
 import requests
+from requests import adapters
 from json import dumps
 import time
 
 
+# bounds of polling interval when adapter gives no hint, seconds
+POLL_MIN = 1
+POLL_MAX = 30
+POLL_BACKOFF = 1.5
+POLL_JITTER = 0.2
+
+
+def next_poll(interval, hint=None, changed=False):
+    """Interval of polling after a poll and delay before next one.
+
+    Hint of adapter is used if it is given, otherwise interval grows
+    while nothing changes and drops once something does. Delay is
+    randomized, so many clients do not poll in lockstep.
+    """
+    if hint:
+        interval = hint
+    elif changed:
+        interval = POLL_MIN
+    else:
+        interval = min(interval * POLL_BACKOFF, POLL_MAX)
+    return interval, interval * random.uniform(1 - POLL_JITTER,
+                                               1 + POLL_JITTER)
+
+
 class TestingAdapterClient(object):
-    def __init__(self, url):
+    """Client of OSTF adapter API.
+
+    Connections are kept alive and reused, ids of test runs this
+    client started or polled are remembered, so actions on last
+    test run don't look it up while that run is not finished.
+    pool_size is number of connections kept, it should not be less
+    than number of threads that use the client.
+    """
+
+    def __init__(self, url, pool_size=10):
         self.url = url
+        self.session = requests.Session()
+        self.session.headers['content-type'] = 'application/json'
+        self.session.mount('http://', adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size))
+        # (cluster id, test set) -> (id, status) of last test run
+        self._testruns = {}
 
     def _request(self, method, url, data=None):
-        headers = {'content-type': 'application/json'}
-
-        r = requests.request(method, url, data=data, headers=headers, timeout=30.0)
+        r = self.session.request(method, url, data=data, timeout=30.0)
         if 2 != r.status_code/100:
             raise AssertionError('{method} "{url}" responded with '
                                  '"{code}" status code'.format(
@@ -38,10 +78,33 @@ class TestingAdapterClient(object):
             url = ''.join([self.url, '/', item])
             return lambda: self._request('GET', url)
 
+    def _remember(self, response, cluster_id):
+        try:
+            testruns = response.json()
+        except ValueError:
+            return
+        for item in testruns:
+            if item.get('id') and item.get('testset'):
+                self._testruns[(str(cluster_id), item['testset'])] = \
+                    (item['id'], item.get('status'))
+
+    def _last_testrun_id(self, testset, cluster_id):
+        """Id of last test run of test set. Remembered test run is
+        the last one until it is finished, then another client could
+        start newer one, so it is looked up again.
+        """
+        key = (str(cluster_id), testset)
+        testrun = self._testruns.get(key)
+        if testrun is None or testrun[1] == 'finished':
+            self.testruns_last(cluster_id)
+        return self._testruns[key][0]
+
     def testruns_last(self, cluster_id):
         url = ''.join([self.url, '/testruns/last/',
                        str(cluster_id)])
-        return self._request('GET', url)
+        response = self._request('GET', url)
+        self._remember(response, cluster_id)
+        return response
 
     def start_testrun(self, testset, cluster_id):
         return self.start_testrun_tests(testset, [], cluster_id)
@@ -51,7 +114,20 @@ class TestingAdapterClient(object):
         data = [{'testset': testset,
                  'tests': tests,
                  'metadata': {'cluster_id': str(cluster_id)}}]
-        return self._request('POST', url, data=dumps(data))
+        response = self._request('POST', url, data=dumps(data))
+        self._remember(response, cluster_id)
+        return response
+
+    def start_testrun_anew(self, testset, tests, cluster_id):
+        """Starts test run, test run that is already running
+        is stopped and started again
+        """
+        response = self.start_testrun_tests(testset, tests, cluster_id)
+        if response.json() == [{}]:
+            self.stop_testrun_last(testset, cluster_id)
+            time.sleep(1)
+            response = self.start_testrun_tests(testset, tests, cluster_id)
+        return response
 
     def stop_testrun(self, testrun_id):
         url = ''.join([self.url, '/testruns'])
@@ -60,10 +136,8 @@ class TestingAdapterClient(object):
         return self._request("PUT", url, data=dumps(data))
 
     def stop_testrun_last(self, testset, cluster_id):
-        latest = self.testruns_last(cluster_id).json()
-        testrun_id = [item['id'] for item in latest
-                      if item['testset'] == testset][0]
-        return self.stop_testrun(testrun_id)
+        return self.stop_testrun(
+            self._last_testrun_id(testset, cluster_id))
 
     def restart_tests(self, tests, testrun_id):
         url = ''.join([self.url, '/testruns'])
@@ -73,10 +147,8 @@ class TestingAdapterClient(object):
         return self._request('PUT', url, data=dumps(body))
 
     def restart_tests_last(self, testset, tests, cluster_id):
-        latest = self.testruns_last(cluster_id).json()
-        testrun_id = [item['id'] for item in latest
-                      if item['testset'] == testset][0]
-        return self.restart_tests(tests, testrun_id)
+        return self.restart_tests(
+            tests, self._last_testrun_id(testset, cluster_id))
 
     def _with_timeout(self, action, testset, cluster_id,
                       timeout, polling=5, polling_hook=None):
@@ -88,18 +160,27 @@ class TestingAdapterClient(object):
             time.sleep(1)
             action()
 
+        interval = delay = polling
+        state = None
         while time.time() - start_time <= timeout:
-            time.sleep(polling)
+            time.sleep(max(0, min(delay,
+                                  start_time + timeout - time.time())))
 
             current_response = self.testruns_last(cluster_id)
             if polling_hook:
                 polling_hook(current_response)
+            current = [item for item in current_response.json()
+                       if item['testset'] == testset][0]
             current_status, current_tests = \
-                [(item['status'], item['tests']) for item
-                 in current_response.json() if item['testset'] == testset][0]
+                current['status'], current['tests']
 
             if current_status == 'finished':
                 break
+
+            previous, state = state, [(test['id'], test['status'])
+                                      for test in current_tests]
+            interval, delay = next_poll(interval, current.get('poll_after'),
+                                        state != previous)
         else:
             stopped_response = self.stop_testrun_last(testset, cluster_id)
             if polling_hook:
@@ -130,3 +211,33 @@ class TestingAdapterClient(object):
     def restart_with_timeout(self, testset, tests, cluster_id, timeout):
         action = lambda: self.restart_tests_last(testset, tests, cluster_id)
         return self._with_timeout(action, testset, cluster_id, timeout)
+
+
+class ConcurrentTestingAdapterClient(object):
+    """Makes calls of TestingAdapterClient for many clusters at once.
+
+    At most concurrency calls are made at the same time, they share
+    single pool of connections to adapter.
+    """
+
+    def __init__(self, url, concurrency=10):
+        self.client = TestingAdapterClient(url, pool_size=concurrency)
+        self.pool = ThreadPool(concurrency)
+
+    def _call(self, method):
+        return lambda args: getattr(self.client, method)(*args)
+
+    def map(self, method, calls):
+        """Calls method with each of given tuples of arguments,
+        results are returned in order of calls.
+        """
+        return self.pool.map(self._call(method), calls)
+
+    def imap_unordered(self, method, calls):
+        """Same as map, results are yielded as soon as they are ready"""
+        return self.pool.imap_unordered(self._call(method), calls)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.client.session.close()
@@ -1,44 +1,239 @@
 #!/usr/bin/env python
 """Openstack testing framework client
 
-Usage: ostf.py run <test_set> [-q] [--id=<cluster_id>] [--tests=<tests>]  [--url=<url>]  [--timeout=<timeout>]
+Usage: ostf.py run <test_set>... [-q] [--id=<cluster_id>]... [--all-clusters] [--tests=<tests>]  [--url=<url>]  [--timeout=<timeout>] [--summary=<path>]
        ostf.py list [<test_set>]
 
     -q                          Show test run result only after finish
     -h --help                   Show this screen
-    --tests=<tests>             Tests to run
-    --id=<cluster_id>           Cluster id to use, default: OSTF_CLUSTER_ID or "1"
+    --tests=<tests>             Comma separated ids of tests to run
+    --id=<cluster_id>           Cluster id to use, may be repeated, default: OSTF_CLUSTER_ID or "1"
+    --all-clusters              Run on all clusters known to Nailgun
     --url=<url>                 Ostf url, default: OSTF_URL or http://0.0.0.0:8989/v1
     --timeout=<timeout>         Amount of time after which test_run will be stopped [default: 60]
+    --summary=<path>            Write json summary of test runs to file, "-" for stdout
+
+Several test sets or clusters are run at the same time, their
+progress is shown in one table.
 
 """
+import collections
+import json
 import os
 import sys
+import time
 
 from requests import get
 
 from docopt import docopt
 from clint.textui import puts, colored, columns, indent
 from blessings import Terminal
+from fuel_plugin.ostf_client import client as adapter_client
+from fuel_plugin.ostf_client.client import ConcurrentTestingAdapterClient
 from fuel_plugin.ostf_client.client import TestingAdapterClient
 
 
-def get_cluster_id():
+def get_cluster_ids():
     try:
         r = get('http://localhost:8000/api/clusters').json()
     except:
+        return []
+    return [item['id'] for item in r]
+
+
+def get_cluster_id():
+    return next(iter(get_cluster_ids()), 0)
+
+
+class Renderer(object):
+    """Shows lines keyed by id, writes only lines that changed.
+
+    On terminal changed lines are rewritten in place, cursor is
+    moved to them and back, so output does not depend on number of
+    lines. Otherwise, or if append_only is set, changed lines are
+    appended.
+    """
+
+    def __init__(self, terminal, append_only=False, out=None):
+        self.t = terminal
+        self.in_place = terminal.is_a_tty and not append_only
+        self.out = out or sys.stdout
+        # key -> line that is shown
+        self.shown = {}
+        # key -> number of line on screen
+        self.index = {}
+
+    def show(self, key, line):
+        """Shows line, returns True if it changed"""
+        if self.shown.get(key) == line:
+            return False
+        self.shown[key] = line
+        if self.in_place and key in self.index:
+            up = len(self.index) - self.index[key]
+            self.out.write(self.t.move_up * up + '\r' + self.t.clear_eol +
+                           line + '\n' * up)
+        else:
+            if self.in_place:
+                self.index[key] = len(self.index)
+            self.out.write(line + '\n')
+        return True
+
+    def flush(self):
+        self.out.flush()
+
+
+class FleetRun(object):
+    """Runs test sets on many clusters at the same time.
+
+    Test runs are started and polled concurrently, each cluster is
+    polled with single request for all its test sets, as soon as
+    any of them is expected to change. Progress
+    is shown as a table that is updated in place on terminal and
+    as a line per change otherwise.
+    """
+
+    POLLING = 2
+    CONCURRENCY = 20
+    HEADER = '{0:<10} {1:<30} {2:<12} {3:>9} {4:>4}'.format(
+        'CLUSTER', 'TEST SET', 'STATUS', 'DONE', 'FAILED')
+
+    def __init__(self, url, test_sets, cluster_ids, tests, timeout,
+                 terminal):
+        self.client = ConcurrentTestingAdapterClient(
+            url, min(len(cluster_ids), self.CONCURRENCY))
+        self.test_sets = test_sets
+        self.cluster_ids = cluster_ids
+        self.tests = tests
+        self.timeout = timeout
+        self.t = terminal
+        # (cluster id, test set) -> test run as returned by adapter
+        self.runs = collections.OrderedDict(
+            ((str(cluster_id), test_set), {'status': 'starting',
+                                           'tests': []})
+            for cluster_id in cluster_ids for test_set in test_sets)
+        self.renderer = Renderer(terminal)
+
+    def run(self):
+        try:
+            self.client.map('start_testrun_anew', [
+                (test_set, self.tests, cluster_id)
+                for cluster_id, test_set in self.runs])
+            deadline = time.time() + self.timeout
+            interval = delay = self.POLLING
+            while self.pending() and time.time() < deadline:
+                time.sleep(max(0, min(delay, deadline - time.time())))
+                changed = self.poll()
+                hints = [self.runs[key].get('poll_after')
+                         for key in self.pending()]
+                hint = min(hints) if hints and all(hints) else None
+                interval, delay = adapter_client.next_poll(
+                    interval, hint, changed)
+            self.stop('timeout')
+        except KeyboardInterrupt:
+            self.stop('stopped')
+            raise
+        finally:
+            self.client.close()
+        return self.exit_code()
+
+    def stop(self, status):
+        """Stops test runs that are not finished yet, they are shown
+        with given status
+        """
+        keys = self.pending()
+        if not keys:
+            return
+        self.client.map('stop_testrun_last', [
+            (test_set, cluster_id) for cluster_id, test_set in keys])
+        self.poll()
+        for key in keys:
+            self.runs[key]['status'] = status
+        self.draw()
+
+    def pending(self):
+        return [key for key, test_run in self.runs.iteritems()
+                if test_run['status'] not in ('finished', 'timeout',
+                                              'stopped')]
+
+    def poll(self):
+        clusters = sorted(set(cluster_id for cluster_id, _ in
+                              self.pending()))
+        responses = self.client.map('testruns_last',
+                                    [(cluster_id,) for cluster_id
+                                     in clusters])
+        for cluster_id, response in zip(clusters, responses):
+            for test_run in response.json():
+                key = (cluster_id, test_run.get('testset'))
+                if key in self.runs:
+                    self.runs[key] = test_run
+        return self.draw()
+
+    def row(self, key):
+        cluster_id, test_set = key
+        test_run = self.runs[key]
+        statuses = [test['status'] for test in test_run['tests']]
+        done = len([status for status in statuses
+                    if status not in ('wait_running', 'running')])
+        failed = len([status for status in statuses
+                      if status in ('failure', 'error', 'stopped')])
+        return '{0:<10} {1:<30} {2:<12} {3:>4}/{4:<4} {5:>4}'.format(
+            cluster_id, test_set, test_run['status'],
+            done, len(statuses), failed)
+
+    def draw(self):
+        """Shows rows that changed, returns True if there were any"""
+        self.renderer.show(None, self.HEADER)
+        changed = [self.renderer.show(key, self.row(key))
+                   for key in self.runs]
+        self.renderer.flush()
+        return any(changed)
+
+    def exit_code(self):
+        # tests that were not selected to run are disabled
+        for test_run in self.runs.itervalues():
+            if test_run['status'] != 'finished' or any(
+                    test['status'] not in ('success', 'disabled')
+                    for test in test_run['tests']):
+                return 1
         return 0
-    return next(item['id'] for item in r)
+
+    def summary(self):
+        return {
+            'exit_code': self.exit_code(),
+            'runs': [{'cluster_id': cluster_id,
+                      'testset': test_set,
+                      'id': test_run.get('id'),
+                      'status': test_run['status'],
+                      'tests': dict((test['id'], test['status'])
+                                    for test in test_run['tests'])}
+                     for (cluster_id, test_set), test_run
+                     in self.runs.iteritems()]
+        }
+
+
+def write_summary(path, summary):
+    if path == '-':
+        json.dump(summary, sys.stdout, indent=2)
+        return
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=2)
 
 
 def main():
     t = Terminal()
     args = docopt(__doc__, version='0.1')
-    test_set = args['<test_set>']
-    cluster_id = args['--id'] or os.environ.get('OSTF_CLUSTER_ID') \
-                     or get_cluster_id() or '1'
-    tests = args['--tests'] or []
-    timeout = args['--timeout']
+    test_sets = args['<test_set>']
+    test_set = test_sets[0] if test_sets else None
+    cluster_ids = args['--id']
+    if args['--all-clusters']:
+        cluster_ids = get_cluster_ids()
+    cluster_ids = cluster_ids or [os.environ.get('OSTF_CLUSTER_ID')
+                                  or get_cluster_id() or '1']
+    cluster_id = cluster_ids[0]
+    # comma separated ids of tests
+    tests = [test.strip() for test in (args['--tests'] or '').split(',')
+             if test.strip()]
+    timeout = int(args['--timeout'])
     quite = args['-q']
     url = args['--url'] or os.environ.get('OSTF_URL') \
         or 'http://0.0.0.0:8989/v1'
@@ -58,61 +253,35 @@ def main():
             stopped=colored.red('stopped')
         )
 
-        tests = [test['id'].split('.')[-1]
-                 for test in client.tests().json()
-                 if test['testset'] == test_set]
+        finished_statuses = ('success', 'failure', 'stopped', 'error',
+                             'finished')
 
-        def print_results(item):
-            if isinstance(item, dict):
-                puts(columns([item['id'].split('.')[-1], col],
-                             [statused[item['status']], col]))
-            else:
-                puts(columns([item[0], col],
-                             [statused.get(item[1], item[1]), col]))
+        # quite run shows only finished tests, once
+        renderer = Renderer(t, append_only=quite)
 
-        def move_up(lines):
-            for _ in range(lines):
-                print t.move_up + t.move_left,
+        def show(key, status):
+            name = key.split('.')[-1] if key else 'General'
+            renderer.show(key, columns([name, col],
+                                       [statused.get(status, status), col]))
 
         def polling_hook(response):
             current_status, current_tests = next(
                 (item['status'], item['tests']) for item in response.json()
                 if item['testset'] == test_set)
 
-            move_up(len(current_tests) + 1)
-
             for test in current_tests:
-                print_results(test)
-            print_results(['General', current_status])
-
-        def quite_polling_hook(response):
-            if not quite_polling_hook.__dict__.get('published_tests'):
-                quite_polling_hook.__dict__['published_tests'] = []
-
-            current_status, current_tests = next(
-                (item['status'], item['tests']) for item in response.json()
-                if item['testset'] == test_set)
-
-            finished_statuses = ['success', 'failure', 'stopped', 'error']
-
-            finished_tests = [item for item in current_tests
-                if item['status'] in finished_statuses
-                and item
-                not in quite_polling_hook.__dict__['published_tests']]
-
-            for test in finished_tests:
-                print_results(test)
-                quite_polling_hook.__dict__['published_tests'].append(test)
-
-            if current_status == 'finished':
-                print_results(['General', current_status])
-
-        if quite:
-            polling_hook = quite_polling_hook
-        else:
-            for test in tests:
-                print_results([test, 'wait_running'])
-            print_results(['General', 'running'])
+                if not quite or test['status'] in finished_statuses:
+                    show(test['id'], test['status'])
+            if not quite or current_status in finished_statuses:
+                show(None, current_status)
+            renderer.flush()
+
+        if not quite:
+            for test in client.tests().json():
+                if test['testset'] == test_set:
+                    show(test['id'], 'wait_running')
+            show(None, 'running')
+            renderer.flush()
 
         try:
             r = client.run_testset_with_timeout(test_set, cluster_id,
@@ -152,6 +321,22 @@ def main():
             puts(columns([test_set['id'], col], [test_set['name'], None]))
         return 0
 
+    def run_fleet():
+        fleet = FleetRun(url, test_sets, cluster_ids, tests, timeout, t)
+        try:
+            code = fleet.run()
+        except AssertionError as e:
+            print e
+            code = 1
+        except KeyboardInterrupt:
+            code = 1
+        if args['--summary']:
+            write_summary(args['--summary'], fleet.summary())
+        return code
+
+    if args['run'] and (len(test_sets) > 1 or len(cluster_ids) > 1
+                        or args['--summary']):
+        return run_fleet()
     if args['run']:
         return run()
     if test_set:
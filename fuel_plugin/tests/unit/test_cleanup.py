@@ -0,0 +1,169 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+import unittest2
+from mock import patch, MagicMock
+
+from fuel_health import cleanup
+from fuel_health import exceptions
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestThrottle(unittest2.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.patcher = patch('fuel_health.cleanup.time', self.clock)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_rate_is_limited(self):
+        throttle = cleanup.Throttle(rate=2)
+        for _ in range(3):
+            self.assertTrue(throttle.acquire())
+        self.assertEqual(self.clock.sleeps, [0, 0.5, 0.5])
+
+    def test_deletions_stop_once_budget_is_spent(self):
+        throttle = cleanup.Throttle(rate=2, budget=1)
+        self.assertEqual([throttle.acquire() for _ in range(3)],
+                         [True, True, False])
+
+    def test_unlimited(self):
+        throttle = cleanup.Throttle()
+        self.assertTrue(all(throttle.acquire() for _ in range(10)))
+        self.assertEqual(self.clock.now, 0)
+
+
+class NotFound(Exception):
+    code = 404
+
+
+class TestCleanUpClientManager(unittest2.TestCase):
+
+    def setUp(self):
+        self.manager = cleanup.CleanUpClientManager()
+        self.patcher = patch.multiple(
+            self.manager,
+            _get_compute_client=MagicMock(side_effect=MagicMock),
+            _get_volume_client=MagicMock(side_effect=MagicMock),
+            _get_heat_client=MagicMock(side_effect=MagicMock),
+            _get_identity_client=MagicMock(return_value=MagicMock()))
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def in_thread(self, call):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(call()))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def test_clients_are_created_per_thread(self):
+        client = self.manager.compute_client
+        self.assertIs(self.manager.compute_client, client)
+
+        other = self.in_thread(lambda: self.manager.compute_client)
+
+        self.assertIsNot(other, client)
+        self.assertEqual(self.manager._get_compute_client.call_count, 2)
+
+    def test_kinds_use_clients_of_calling_thread(self):
+        kinds = cleanup.get_kinds(self.manager)
+
+        kinds['server'].delete('a')
+        self.in_thread(lambda: kinds['volume'].delete('b'))
+        self.in_thread(lambda: kinds['server'].delete('c'))
+
+        self.manager.compute_client.servers.delete.assert_called_once_with(
+            'a')
+        self.assertFalse(self.manager.volume_client.volumes.delete.called)
+
+    def test_identity_calls_are_serialized(self):
+        kinds = cleanup.get_kinds(self.manager)
+        lock = kinds['user'].delete.lock
+        self.assertIs(kinds['tenant'].list.lock, lock)
+        identity = self.manager.identity_client
+
+        identity.users.delete.side_effect = lambda user_id: self.assertFalse(
+            lock.acquire(False))
+        kinds['user'].delete('a')
+
+        identity.users.delete.assert_called_once_with('a')
+        self.assertIsNone(kinds['server'].delete.lock)
+
+    @patch('fuel_health.cleanup.time')
+    def test_deletion_error_of_volume(self, time):
+        time.time.return_value = 0
+        volumes = self.manager.volume_client.volumes
+        volumes.get.return_value = MagicMock(status='error_deleting')
+
+        with self.assertRaises(exceptions.DeletionErrorException) as cm:
+            self.manager.wait_for_volume_deletion('vol')
+        self.assertEqual(str(cm.exception), 'volume vol failed to be '
+                         'deleted and is in error_deleting status')
+
+    @patch('fuel_health.cleanup.time')
+    def test_deleted_server_is_not_found(self, time):
+        time.time.return_value = 0
+        servers = self.manager.compute_client.servers
+        servers.get.side_effect = [MagicMock(status='ACTIVE'),
+                                   NotFound()]
+
+        self.manager.wait_for_server_termination('srv')
+
+        self.assertEqual(servers.get.call_count, 2)
+        self.assertEqual(time.sleep.call_count, 1)
+
+@patch('fuel_health.cleanup.ledger')
+@patch('fuel_health.cleanup.CleanUpClientManager')
+class TestCleanup(unittest2.TestCase):
+
+    def test_ledger_compacted_if_nothing_is_left(self, manager, ledger):
+        ledger.pending.return_value = []
+
+        self.assertEqual(cleanup.cleanup(1), 0)
+
+        self.assertFalse(manager.called)
+        self.assertTrue(ledger.compact.called)
+
+    @patch('fuel_health.cleanup.get_kinds')
+    def test_ledger_kept_if_resources_are_left(self, get_kinds, manager,
+                                               ledger):
+        ledger.pending.return_value = [('volume', 'vol')]
+        delete = MagicMock(side_effect=Exception)
+        get_kinds.return_value = {
+            'volume': cleanup.Kind(None, delete, None, None)}
+
+        self.assertEqual(cleanup.cleanup(1), 1)
+
+        self.assertFalse(ledger.compact.called)
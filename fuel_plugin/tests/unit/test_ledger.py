@@ -0,0 +1,119 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+
+import unittest2
+from mock import patch, MagicMock
+
+from fuel_health.common import ledger
+
+
+class SecurityGroup(object):
+
+    def __init__(self, id):
+        self.id = id
+
+
+class TestLedger(unittest2.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'ledger.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, thing, test_run_id, kind=None):
+        with patch.dict(os.environ, {'TEST_RUN_ID': str(test_run_id)}):
+            ledger.record(thing, kind=kind, path=self.path)
+
+    def test_recorded_resources_pending(self):
+        self.record(SecurityGroup('sg'), 1)
+        self.record('img', 1, kind='image')
+        self.record(MagicMock(id='srv'), 1, kind='server')
+
+        self.assertEqual(ledger.pending(path=self.path),
+                         [('security_group', 'sg'), ('image', 'img'),
+                          ('server', 'srv')])
+
+    def test_forgotten_resources_not_pending(self):
+        self.record('img', 1, kind='image')
+        self.record('vol', 1, kind='volume')
+        ledger.forget('image', 'img', path=self.path)
+
+        self.assertEqual(ledger.pending(path=self.path), [('volume', 'vol')])
+
+        # resource could be recorded again after it was forgotten
+        self.record('img', 1, kind='image')
+        self.assertEqual(ledger.pending(path=self.path),
+                         [('volume', 'vol'), ('image', 'img')])
+
+    def test_resources_filtered_by_test_run(self):
+        self.record('img', 1, kind='image')
+        self.record('vol', 2, kind='volume')
+
+        self.assertEqual(ledger.pending(1, path=self.path),
+                         [('image', 'img')])
+        self.assertEqual(ledger.pending('2', path=self.path),
+                         [('volume', 'vol')])
+        self.assertEqual(ledger.pending(3, path=self.path), [])
+
+    def test_broken_lines_skipped(self):
+        self.record('img', 1, kind='image')
+        with open(self.path, 'a') as f:
+            f.write('{"kind": "vol')
+
+        self.assertEqual(ledger.pending(path=self.path), [('image', 'img')])
+
+    def test_missing_ledger_has_nothing_pending(self):
+        self.assertEqual(ledger.pending(path=self.path), [])
+
+    def lines(self):
+        with open(self.path) as f:
+            return f.readlines()
+
+    def test_compacted_ledger_keeps_pending_resources(self):
+        self.record('img', 1, kind='image')
+        self.record('vol', 2, kind='volume')
+        self.record('srv', 1, kind='server')
+        ledger.forget('image', 'img', path=self.path)
+
+        ledger.compact(self.path)
+
+        self.assertEqual(len(self.lines()), 2)
+        self.assertEqual(ledger.pending(path=self.path),
+                         [('volume', 'vol'), ('server', 'srv')])
+        self.assertEqual(ledger.pending(1, path=self.path),
+                         [('server', 'srv')])
+
+        self.record('img', 1, kind='image')
+        self.assertEqual(ledger.pending(1, path=self.path),
+                         [('server', 'srv'), ('image', 'img')])
+
+    def test_ledger_compacted_once_it_grows(self):
+        with patch.object(ledger, 'COMPACT_SIZE', 300):
+            for i in range(3):
+                self.record(i, 1, kind='volume')
+                ledger.forget('volume', i, path=self.path)
+                self.assertLess(len(self.lines()), 5)
+        self.record('vol', 1, kind='volume')
+
+        self.assertEqual(ledger.pending(path=self.path), [('volume', 'vol')])
+
+    def test_missing_ledger_not_compacted(self):
+        ledger.compact(self.path)
+        self.assertFalse(os.path.exists(self.path))
@@ -0,0 +1,130 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import stat
+import tempfile
+
+import unittest2
+from mock import patch, MagicMock
+
+from fuel_health import config
+
+
+class TestNailgunSnapshot(unittest2.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.env = patch.dict(os.environ, {
+            config.SNAPSHOT_DIR_ENV: self.directory,
+            'TEST_RUN_ID': '1'})
+        self.env.start()
+
+        self.responses = {
+            '/api/clusters/7': {'mode': 'multinode', 'status': 'new'},
+            '/api/clusters/7/attributes': {'password': 'admin'},
+            '/api/nodes?cluster_id=7': [],
+            '/api/clusters/7/network_configuration/': {},
+            '/api/ostf/7': {},
+        }
+        self.requests = []
+
+        def get(url):
+            api_url = url[len('http://nailgun'):]
+            self.requests.append(api_url)
+            return MagicMock(status_code=200,
+                             json=lambda: self.responses[api_url])
+
+        # config is a singleton of the process
+        self.config = config.NailgunConfig(parse=False)
+        self.config.cluster_id = '7'
+        self.config.nailgun_url = 'http://nailgun'
+        self.config.req_session = MagicMock()
+        self.config.req_session.get.side_effect = get
+
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.directory)
+
+    def expire(self):
+        path = config.get_snapshot_path('7')
+        snapshot = self.config._load_snapshot(path)
+        snapshot['time'] -= self.config.SNAPSHOT_TTL
+        self.config._save_snapshot(path, snapshot)
+
+    def test_fetched_once_per_test_run(self):
+        data = self.config.get_snapshot()
+        self.assertEqual(sorted(self.requests), sorted(self.responses))
+        self.assertEqual(data['attributes'], {'password': 'admin'})
+
+        del self.requests[:]
+        self.assertEqual(self.config.get_snapshot(), data)
+        self.assertEqual(self.requests, [])
+
+        mode = os.stat(config.get_snapshot_path('7')).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0600)
+
+    def test_fetched_completely_for_new_test_run(self):
+        self.config.get_snapshot()
+        self.responses['/api/clusters/7/attributes'] = {'password': 'new'}
+        os.environ['TEST_RUN_ID'] = '2'
+        del self.requests[:]
+
+        data = self.config.get_snapshot()
+
+        self.assertEqual(len(self.requests), len(self.responses))
+        self.assertEqual(data['attributes'], {'password': 'new'})
+
+    def test_expired_snapshot_of_same_cluster_is_kept(self):
+        self.config.get_snapshot()
+        self.expire()
+        del self.requests[:]
+
+        self.config.get_snapshot()
+        self.assertEqual(self.requests, ['/api/clusters/7'])
+
+        # snapshot is fresh again
+        del self.requests[:]
+        self.config.get_snapshot()
+        self.assertEqual(self.requests, [])
+
+    def test_expired_snapshot_of_changed_cluster_is_refetched(self):
+        self.config.get_snapshot()
+        self.expire()
+        self.responses['/api/clusters/7']['status'] = 'deployment'
+        del self.requests[:]
+
+        data = self.config.get_snapshot()
+
+        self.assertEqual(len(self.requests), len(self.responses) + 1)
+        self.assertEqual(data['cluster']['status'], 'deployment')
+
+    def test_snapshot_is_used_if_nailgun_is_not_available(self):
+        data = self.config.get_snapshot()
+        os.environ['TEST_RUN_ID'] = '2'
+        self.config.req_session.get.side_effect = IOError
+
+        self.assertEqual(self.config.get_snapshot(), data)
+
+    def test_nailgun_errors_without_snapshot_are_raised(self):
+        self.config.req_session.get.side_effect = IOError
+        self.assertRaises(IOError, self.config.get_snapshot)
+
+    def test_ostf_api_is_optional(self):
+        del self.responses['/api/ostf/7']
+
+        data = self.config.get_snapshot()
+
+        self.assertIsNone(data['ostf'])
@@ -0,0 +1,135 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import signal
+
+import unittest2
+from mock import patch, DEFAULT
+
+from fuel_plugin.ostf_adapter.nose_plugin import nose_adapter
+from fuel_plugin.ostf_adapter.nose_plugin import nose_heartbeat
+
+
+ADAPTER = 'fuel_plugin.ostf_adapter.nose_plugin.nose_adapter.'
+
+
+@patch(ADAPTER + 'nose_test_runner')
+@patch(ADAPTER + 'nose_loader')
+@patch(ADAPTER + 'nose_scheduler')
+@patch(ADAPTER + 'nose_heartbeat.Heartbeat')
+@patch(ADAPTER + 'nose_registry')
+@patch(ADAPTER + 'models')
+@patch(ADAPTER + 'engine')
+class TestRunTests(unittest2.TestCase):
+
+    def setUp(self):
+        self.handler = signal.getsignal(signal.SIGTERM)
+        self.driver = nose_adapter.NoseDriver()
+
+    def tearDown(self):
+        signal.signal(signal.SIGTERM, self.handler)
+        os.environ.pop(nose_heartbeat.CANCEL_ENV, None)
+
+    def _run_tests(self, engine, tests):
+        session = engine.get_session.return_value
+        session.query.return_value.filter_by.return_value.one.\
+            return_value = (1, 3)
+        with patch.multiple(self.driver, _report_plan=DEFAULT,
+                            _get_plugins=DEFAULT, _retry_failed=DEFAULT):
+            self.driver._run_tests(1, 1, 'general_test', [], tests)
+            return self.driver._retry_failed
+
+    def test_cancelled_selected_tests_are_not_collected(
+            self, engine, models, registry, heartbeat, scheduler, loader,
+            runner):
+        loader.run.side_effect = lambda *args: os.environ.update(
+            {nose_heartbeat.CANCEL_ENV: '1'})
+
+        retry = self._run_tests(engine, ['fake.test_one'])
+
+        self.assertTrue(loader.run.called)
+        self.assertFalse(retry.called)
+        self.assertFalse(runner.SilentTestProgram.called)
+        models.Test.update_running_tests.assert_called_once_with(
+            engine.get_session.return_value, 1, status='stopped')
+
+    def test_selected_tests_are_retried(
+            self, engine, models, registry, heartbeat, scheduler, loader,
+            runner):
+        retry = self._run_tests(engine, ['fake.test_one'])
+
+        self.assertTrue(retry.called)
+        self.assertFalse(runner.SilentTestProgram.called)
+
+    def test_whole_test_set_is_collected(
+            self, engine, models, registry, heartbeat, scheduler, loader,
+            runner):
+        retry = self._run_tests(engine, None)
+
+        self.assertFalse(retry.called)
+        self.assertTrue(runner.SilentTestProgram.called)
+
+
+@patch(ADAPTER + 'nose_loader')
+@patch(ADAPTER + 'models')
+@patch(ADAPTER + 'engine')
+@patch(ADAPTER + 'signal.signal')
+@patch(ADAPTER + 'os.waitpid')
+@patch(ADAPTER + 'os.fork', return_value=100)
+class TestRunParallel(unittest2.TestCase):
+
+    def test_tests_left_by_workers_are_run_by_runner(
+            self, fork, waitpid, signal, engine, models, loader):
+        driver = nose_adapter.NoseDriver()
+        units = [['a.A.test_one', 'a.A.test_two'], ['b.B.test_one']]
+        # worker was aborted after the first test of its unit
+        models.Test.get_waiting.return_value = ['a.A.test_two']
+
+        with patch.object(driver, '_get_plugins') as plugins:
+            driver._run_parallel(1, 1, None, units, ['c.C.test_one'], 2)
+
+        self.assertEqual(fork.call_count, 2)
+        models.Test.get_waiting.assert_called_once_with(
+            engine.get_session.return_value, 1,
+            ['a.A.test_one', 'a.A.test_two', 'b.B.test_one'])
+        loader.run.assert_called_once_with(
+            ['a.A.test_two', 'c.C.test_one'], plugins.return_value)
+
+
+@patch(ADAPTER + 'nose_utils')
+@patch(ADAPTER + 'models')
+@patch(ADAPTER + 'engine')
+class TestKill(unittest2.TestCase):
+
+    def setUp(self):
+        self.driver = nose_adapter.NoseDriver()
+
+    def test_test_run_is_finished_by_runner(self, engine, models, utils):
+        with patch.object(self.driver, '_terminate', return_value=True):
+            self.assertTrue(self.driver.kill(1, 1, 'cleanup'))
+
+        self.assertFalse(models.TestRun.update_test_run.called)
+        utils.run_proc.assert_called_once_with(
+            self.driver._clean_up, 1, 1, 'cleanup')
+
+    @patch(ADAPTER + 'time.sleep')
+    def test_cleanup_waits_for_runner(self, sleep, engine, models, utils):
+        models.RunnerProcess.get_runner.side_effect = ['runner', None]
+        self.assertTrue(self.driver._wait_for_runner(1, 10))
+        self.assertEqual(sleep.call_count, 1)
+
+        models.RunnerProcess.get_runner.side_effect = None
+        models.RunnerProcess.get_runner.return_value = 'runner'
+        self.assertFalse(self.driver._wait_for_runner(1, 0))
@@ -12,9 +12,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+import shutil
+import sys
+import tempfile
+import textwrap
+
 import unittest2
 from mock import patch
 from fuel_plugin.ostf_adapter.nose_plugin import nose_discovery
+from fuel_plugin.ostf_adapter.nose_plugin import nose_static_discovery
 
 
 from fuel_plugin.ostf_adapter.storage import models
@@ -37,21 +44,35 @@ general__profile__ = {
 @patch('fuel_plugin.ostf_adapter.nose_plugin.nose_discovery.engine')
 class TestNoseDiscovery(unittest2.TestCase):
 
-    def setUp(self):
-        self.fixtures = [models.TestSet(**general__profile__),
-                         models.TestSet(**stopped__profile__)]
-
-        self.fixtures_iter = iter(self.fixtures)
-
     def test_discovery(self, engine):
-        engine.get_session().merge.side_effect = \
-            lambda *args, **kwargs: self.fixtures_iter.next()
-
         nose_discovery.discovery(
             path='fuel_plugin/tests/functional/dummy_tests'
         )
 
-        self.assertEqual(engine.get_session().merge.call_count, 2)
+        test_sets = [
+            call[0][0] for call in engine.get_session().add.call_args_list
+            if isinstance(call[0][0], models.TestSet)
+        ]
+        self.assertEqual(
+            sorted(test_set.id for test_set in test_sets),
+            ['general_test', 'stopped_test'])
+
+    def test_tests_assigned_by_module(self, engine):
+        plugin = nose_discovery.DiscoveryPlugin()
+        plugin.afterImport(
+            None, 'fuel_plugin.tests.functional.dummy_tests.general_test')
+        plugin.afterImport(
+            None, 'fuel_plugin.tests.functional.dummy_tests.stopped_test')
+
+        self.assertEqual(
+            plugin.get_test_set_id(
+                'fuel_plugin.tests.functional.dummy_tests.'
+                'stopped_test.dummy_tests_stopped.test_really_long'),
+            'stopped_test')
+        self.assertIsNone(
+            plugin.get_test_set_id(
+                'fuel_plugin.tests.functional.dummy_tests.'
+                'general_test_extra.Dummy_test.test_fast_pass'))
 
     def test_get_proper_description(self, engine):
         '''
@@ -73,20 +94,6 @@ class TestNoseDiscovery(unittest2.TestCase):
                 '        This is a simple always pass test\n        '
         }
 
-        #mocking behaviour of afterImport hook from DiscoveryPlugin
-        #so that another hook -- addSuccess could process data properly
-        engine.get_session().merge = lambda arg: arg
-
-        #following code provide mocking logic for
-        #addSuccess hook from DiscoveryPlugin that
-        #(mentioned logic) in turn allows us to
-        #capture data about test object that are processed
-        engine.get_session()\
-              .query()\
-              .filter_by()\
-              .update\
-              .return_value = None
-
         nose_discovery.discovery(
             path='fuel_plugin/tests/functional/dummy_tests'
         )
@@ -110,3 +117,149 @@ class TestNoseDiscovery(unittest2.TestCase):
                 ]
             )
         )
+
+
+@patch('fuel_plugin.ostf_adapter.nose_plugin.nose_discovery.engine')
+@patch('fuel_plugin.ostf_adapter.nose_plugin.nose_discovery.collect')
+class TestFingerprintDiscovery(unittest2.TestCase):
+
+    path = 'fuel_plugin/tests/functional/dummy_tests'
+
+    def setUp(self):
+        self.digests = dict(
+            (package, nose_discovery.fingerprint(files)) for package, files
+            in nose_discovery.find_packages(self.path).iteritems())
+
+    def test_find_packages(self, collect, engine):
+        packages = nose_discovery.find_packages(self.path)
+
+        general = self.path + '/general_test.py'
+        self.assertEqual(packages[general], [general])
+        self.assertIn(self.path + '/__init__.py', packages[self.path])
+        self.assertNotIn(general, packages[self.path])
+
+    @patch('fuel_plugin.ostf_adapter.nose_plugin.nose_discovery.models')
+    def test_unchanged_tests_skipped(self, models, collect, engine):
+        models.DiscoveryFingerprint.get_digests.return_value = self.digests
+
+        nose_discovery.discovery(path=self.path)
+
+        self.assertFalse(collect.called)
+
+    @patch('fuel_plugin.ostf_adapter.nose_plugin.nose_discovery.models')
+    def test_only_changed_package_rediscovered(self, models, collect,
+                                               engine):
+        general = self.path + '/general_test.py'
+        self.digests[general] = 'outdated'
+        models.DiscoveryFingerprint.get_digests.return_value = self.digests
+        collect.return_value = ({}, {})
+
+        nose_discovery.discovery(path=self.path)
+
+        collect.assert_called_once_with([general])
+
+    @patch('fuel_plugin.ostf_adapter.nose_plugin.nose_discovery.'
+           'storage_utils')
+    @patch('fuel_plugin.ostf_adapter.nose_plugin.nose_discovery.models')
+    def test_gone_package_removed(self, models, storage_utils, collect,
+                                  engine):
+        gone = self.path + '/gone_test.py'
+        self.digests[gone] = 'digest'
+        models.DiscoveryFingerprint.get_digests.return_value = self.digests
+
+        nose_discovery.discovery(path=self.path)
+
+        self.assertFalse(collect.called)
+        self.assertFalse(storage_utils.update_catalog.called)
+        storage_utils.remove_test_sets.assert_called_once_with(
+            engine.get_session.return_value,
+            ['fuel_plugin.tests.functional.dummy_tests.gone_test'], [gone])
+        del self.digests[gone]
+        models.DiscoveryFingerprint.update_digests.assert_called_once_with(
+            engine.get_session.return_value, self.path, self.digests)
+
+
+class TestStaticDiscovery(unittest2.TestCase):
+
+    path = 'fuel_plugin/tests/functional/dummy_tests'
+
+    def test_same_as_import_discovery(self):
+        self.assertEqual(nose_discovery.collect_static([self.path]),
+                         nose_discovery.collect([self.path]))
+
+    def test_attributes(self):
+        test_sets, tests = nose_discovery.collect_static(
+            ['fuel_health/tests/sanity'])
+
+        test = tests['fuel_health.tests.sanity.test_sanity_compute.'
+                     'SanityComputeTest.test_list_instances']
+        self.assertEqual(test['test_set_id'], 'sanity')
+        self.assertEqual(test['meta'],
+                         {'timeout': 20,
+                          'attributes': {'type': ['sanity', 'fuel']}})
+
+
+class TestStaticDiscoveryOfInheritedTests(unittest2.TestCase):
+
+    modules = {
+        '__init__.py': """
+            __profile__ = {'id': 'inherited_test', 'driver': 'nose',
+                           'test_path': '', 'description': 'Inherited'}
+            """,
+        'base.py': """
+            import unittest
+
+            class Base(unittest.TestCase):
+                def test_inherited(self):
+                    pass
+
+            class Helper(unittest.TestCase):
+                def check(self):
+                    pass
+            """,
+        'test_derived.py': """
+            from inherited_pkg import base
+
+            class DerivedTest(base.Base):
+                def test_own(self):
+                    pass
+            """,
+        'test_helped.py': """
+            from inherited_pkg.base import Helper
+
+            class HelpedTest(Helper):
+                def test_own(self):
+                    pass
+            """,
+    }
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'inherited_pkg')
+        os.mkdir(self.path)
+        for name, source in self.modules.iteritems():
+            with open(os.path.join(self.path, name), 'w') as module:
+                module.write(textwrap.dedent(source))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        for module in list(sys.modules):
+            if module.startswith('inherited_pkg'):
+                del sys.modules[module]
+
+    def test_module_with_inherited_tests_imported(self):
+        profiles, tests, fallback = nose_static_discovery.analyze(
+            [self.path])
+
+        self.assertEqual(fallback,
+                         [os.path.join(self.path, 'test_derived.py')])
+        self.assertEqual([test[0] for test in tests],
+                         ['inherited_pkg.test_helped.HelpedTest.test_own'])
+
+    def test_same_as_import_discovery(self):
+        test_sets, tests = nose_discovery.collect_static([self.path])
+
+        self.assertEqual((test_sets, tests),
+                         nose_discovery.collect([self.path]))
+        self.assertIn(
+            'inherited_pkg.test_derived.DerivedTest.test_inherited', tests)
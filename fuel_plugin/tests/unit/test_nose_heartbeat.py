@@ -0,0 +1,161 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import signal
+
+import unittest2
+from mock import patch, MagicMock
+
+from fuel_plugin.ostf_adapter.nose_plugin import nose_heartbeat
+
+
+@patch('fuel_plugin.ostf_adapter.nose_plugin.nose_heartbeat.threading.Timer')
+class TestCancelPlugin(unittest2.TestCase):
+
+    def setUp(self):
+        self.handler = signal.getsignal(signal.SIGTERM)
+        self.plugin = nose_heartbeat.CancelPlugin(1, grace_period=5)
+        self.plugin.begin()
+
+    def tearDown(self):
+        signal.signal(signal.SIGTERM, self.handler)
+        os.environ.pop(nose_heartbeat.CANCEL_ENV, None)
+
+    def test_sigterm_stops_run(self, timer):
+        result = MagicMock(shouldStop=False)
+        self.plugin.prepareTestResult(result)
+        self.assertFalse(nose_heartbeat.cancelled())
+
+        os.kill(os.getpid(), signal.SIGTERM)
+
+        self.assertTrue(nose_heartbeat.cancelled())
+        self.assertTrue(result.shouldStop)
+        timer.assert_called_once_with(
+            5, nose_heartbeat._hard_stop, (1, []))
+        self.assertTrue(timer.return_value.start.called)
+
+    def test_no_tests_started_after_cancel(self, timer):
+        nose_heartbeat.cancel(1)
+        nose_heartbeat.cancel(1)
+        self.assertEqual(timer.call_count, 1)
+
+        result = MagicMock(shouldStop=False)
+        self.plugin.prepareTestResult(result)
+        self.assertTrue(result.shouldStop)
+
+
+class TestWatchdogPlugin(unittest2.TestCase):
+
+    def setUp(self):
+        self.registry = MagicMock()
+        self.plugin = nose_heartbeat.WatchdogPlugin(
+            1, self.registry, multiplier=3, ceiling=600)
+        self.test = MagicMock()
+        self.test.id.return_value = 'fake.Test.test_one'
+
+    def test_limit_is_multiplied_duration(self):
+        self.registry.get_timeout.return_value = 20.0
+        self.assertEqual(self.plugin.get_limit(self.test), 60)
+        self.registry.get_timeout.assert_called_once_with(
+            'fake.Test.test_one')
+
+    def test_limit_is_not_greater_than_ceiling(self):
+        self.registry.get_timeout.return_value = 300.0
+        self.assertEqual(self.plugin.get_limit(self.test), 600)
+
+    def test_ceiling_limits_tests_without_duration(self):
+        self.registry.get_timeout.return_value = None
+        self.assertEqual(self.plugin.get_limit(self.test), 600)
+
+    def test_test_is_watched_within_its_limit(self):
+        self.registry.get_timeout.return_value = 20.0
+        with patch.object(self.plugin, 'watchdog') as watchdog:
+            self.plugin.beforeTest(self.test)
+            watchdog.watch.assert_called_once_with('fake.Test.test_one', 60)
+            self.plugin.afterTest(self.test)
+            self.assertTrue(watchdog.release.called)
+
+    def test_interrupted_test_times_out(self):
+        self.registry.get_timeout.return_value = 20.0
+        self.plugin.beforeTest(self.test)
+        self.plugin.watchdog._interrupted_at = 1
+
+        with self.assertRaises(nose_heartbeat.TestTimeout) as cm:
+            self.plugin._interrupt(signal.SIGUSR1, None)
+        self.assertEqual(cm.exception.args[0],
+                         nose_heartbeat.timeout_message(60))
+        self.assertNotIsInstance(cm.exception, Exception)
+
+    def test_finished_test_is_not_interrupted(self):
+        self.plugin.beforeTest(self.test)
+        self.plugin.afterTest(self.test)
+        self.plugin._interrupt(signal.SIGUSR1, None)
+
+
+@patch('fuel_plugin.ostf_adapter.nose_plugin.nose_heartbeat.os.kill')
+@patch('fuel_plugin.ostf_adapter.nose_plugin.nose_heartbeat.time')
+class TestWatchdog(unittest2.TestCase):
+
+    def setUp(self):
+        self.watchdog = nose_heartbeat.Watchdog(1, grace_period=30)
+        self.watchdog._stopped = MagicMock()
+
+    def run_watchdog(self, time, *times):
+        """Runs watchdog for one check at each of times"""
+        time.time.side_effect = times
+        self.watchdog._stopped.wait.side_effect = \
+            [False] * len(times) + [True]
+        with patch.object(self.watchdog, 'abort') as abort:
+            self.watchdog.run()
+        return abort
+
+    def watch(self, time):
+        time.time.return_value = 100
+        self.watchdog.watch('fake.Test.test_one', 60)
+
+    def test_test_within_limit_is_not_interrupted(self, time, kill):
+        self.watch(time)
+
+        abort = self.run_watchdog(time, 130, 160)
+
+        self.assertFalse(kill.called)
+        self.assertFalse(abort.called)
+        self.assertFalse(self.watchdog.interrupted)
+
+    def test_test_over_limit_is_interrupted(self, time, kill):
+        self.watch(time)
+
+        abort = self.run_watchdog(time, 161, 170)
+
+        kill.assert_called_once_with(os.getpid(), signal.SIGUSR1)
+        self.assertTrue(self.watchdog.interrupted)
+        self.assertFalse(abort.called)
+
+    def test_stuck_test_is_aborted_after_grace_period(self, time, kill):
+        self.watch(time)
+
+        abort = self.run_watchdog(time, 161, 180, 192)
+
+        self.assertEqual(kill.call_count, 1)
+        abort.assert_called_once_with('fake.Test.test_one', 100, 60)
+
+    def test_released_test_is_not_interrupted(self, time, kill):
+        self.watch(time)
+        self.watchdog.release()
+
+        abort = self.run_watchdog(time, 1000)
+
+        self.assertFalse(kill.called)
+        self.assertFalse(abort.called)
@@ -0,0 +1,84 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest2
+from mock import patch
+from nose import failure
+from nose.suite import ContextSuite
+
+from fuel_plugin.ostf_adapter.nose_plugin import nose_loader
+
+
+DUMMY = 'fuel_plugin.tests.functional.dummy_tests.'
+
+
+class TestNoseLoader(unittest2.TestCase):
+
+    def setUp(self):
+        self.conf = nose_loader.make_config([])
+
+    def _class_suites(self, suite):
+        for test in suite:
+            if not isinstance(test, ContextSuite):
+                continue
+            if isinstance(test.context, type):
+                yield test.context, list(self._flatten(test))
+            else:
+                for class_suite in self._class_suites(test):
+                    yield class_suite
+
+    def _flatten(self, suite):
+        for test in suite:
+            if isinstance(test, ContextSuite):
+                for sub_test in self._flatten(test):
+                    yield sub_test
+            else:
+                yield test
+
+    def test_tests_grouped_by_class(self):
+        suite = nose_loader.load_tests(self.conf, [
+            DUMMY + 'general_test.Dummy_test.test_fast_pass',
+            DUMMY + 'stopped_test.dummy_tests_stopped.test_not_long_at_all',
+            DUMMY + 'general_test.Dummy_test.test_fast_fail'])
+
+        classes = dict((cls.__name__, [test.id() for test in tests])
+                       for cls, tests in self._class_suites(suite))
+        self.assertEqual(classes, {
+            'Dummy_test': [
+                DUMMY + 'general_test.Dummy_test.test_fast_pass',
+                DUMMY + 'general_test.Dummy_test.test_fast_fail'],
+            'dummy_tests_stopped': [
+                DUMMY + 'stopped_test.dummy_tests_stopped.'
+                'test_not_long_at_all']})
+
+    def test_unknown_test(self):
+        suite = nose_loader.load_tests(
+            self.conf, [DUMMY + 'missing_test.Test.test_missing'])
+
+        tests = list(suite)
+        self.assertEqual(len(tests), 1)
+        self.assertIsInstance(tests[0].test, failure.Failure)
+
+    @patch('fuel_plugin.ostf_adapter.nose_plugin.nose_loader._is_parallel')
+    def test_split_units(self, is_parallel):
+        is_parallel.side_effect = lambda class_id: class_id != 'm.Serial'
+
+        units, serial = nose_loader.split_units(
+            ['m.One.test_a', 'm.Serial.test_a', 'm.Two.test_a',
+             'm.One.test_b', 'm.Serial.test_b'])
+
+        self.assertEqual(units, [['m.One.test_a', 'm.One.test_b'],
+                                 ['m.Two.test_a']])
+        self.assertEqual(serial, ['m.Serial.test_a', 'm.Serial.test_b'])
+        self.assertEqual(is_parallel.call_count, 3)
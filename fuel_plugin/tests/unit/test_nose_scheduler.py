@@ -0,0 +1,53 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest2
+
+from fuel_plugin.ostf_adapter.nose_plugin import nose_registry
+from fuel_plugin.ostf_adapter.nose_plugin import nose_scheduler
+
+
+class TestScheduler(unittest2.TestCase):
+
+    def setUp(self):
+        self.registry = nose_registry.Registry({
+            'A.test_declared': {'timeout': 20},
+            'A.test_history': {'timeout': 20}
+        })
+
+    def test_estimate(self):
+        costs = nose_scheduler.estimate(
+            ['A.test_declared', 'A.test_history', 'A.test_unknown'],
+            {'A.test_history': [10, 30, 12]},
+            self.registry)
+
+        self.assertEqual(costs, {
+            'A.test_declared': 20,
+            'A.test_history': 12,
+            'A.test_unknown': nose_scheduler.DEFAULT_COST})
+
+    def test_longest_first(self):
+        costs = {'a': 3, 'b': 3, 'c': 2, 'd': 2, 'e': 2}
+        units = [['c'], ['a'], ['d'], ['b'], ['e']]
+
+        ordered, makespan = nose_scheduler.schedule(units, costs, 2)
+
+        self.assertEqual([unit[0] for unit in ordered[:2]], ['a', 'b'])
+        self.assertEqual(makespan, 7)
+
+    def test_more_workers_than_units(self):
+        ordered, makespan = nose_scheduler.schedule(
+            [['a'], ['b']], {'a': 5, 'b': 1}, 4)
+
+        self.assertEqual(makespan, 5)
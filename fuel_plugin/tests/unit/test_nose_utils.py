@@ -0,0 +1,40 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest2
+
+from fuel_plugin.ostf_adapter.nose_plugin import nose_utils
+
+
+class TestParseDuration(unittest2.TestCase):
+
+    def test_seconds(self):
+        for duration in ('20 s.', '20s', '20 sec', '20 seconds', '20'):
+            self.assertEqual(nose_utils.parse_duration(duration), 20)
+
+    def test_upper_bound_of_range(self):
+        self.assertEqual(nose_utils.parse_duration('1-40 s.'), 40)
+        self.assertEqual(nose_utils.parse_duration('10 - 15 sec'), 15)
+
+    def test_minutes_and_hours(self):
+        self.assertEqual(nose_utils.parse_duration('3 min'), 180)
+        self.assertEqual(nose_utils.parse_duration('2-5 Min.'), 300)
+        self.assertEqual(nose_utils.parse_duration('1 hour'), 3600)
+
+    def test_fractions(self):
+        self.assertEqual(nose_utils.parse_duration('1.5 min'), 90)
+
+    def test_unrecognized(self):
+        for duration in (None, '', 'a while', 'sec'):
+            self.assertIsNone(nose_utils.parse_duration(duration))
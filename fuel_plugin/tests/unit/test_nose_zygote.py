@@ -0,0 +1,41 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import socket
+
+import unittest2
+
+from fuel_plugin.ostf_adapter.nose_plugin import nose_zygote
+
+
+class TestZygote(unittest2.TestCase):
+
+    def test_test_run_passed_to_idle_runner(self):
+        zygote = nose_zygote.Zygote('/nonexistent', pool_size=1)
+        read_fd, write_fd = os.pipe()
+        zygote.pool[12345] = write_fd
+        server, client = socket.socketpair()
+
+        job = {'test_run_id': 1, 'tests': ['test']}
+        client.sendall(json.dumps(job) + '\n')
+        zygote.handle(server)
+
+        self.assertEqual(json.loads(client.recv(1024)), {'pid': 12345})
+        self.assertEqual(zygote.pool, {})
+        with os.fdopen(read_fd) as stream:
+            self.assertEqual(json.loads(stream.readline()), job)
+        server.close()
+        client.close()
@@ -0,0 +1,194 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import threading
+import time
+
+import unittest2
+from mock import patch, MagicMock
+
+from fuel_plugin.ostf_client import client
+from fuel_plugin.ostf_client import ostf
+
+
+def response(body, status_code=200):
+    return MagicMock(status_code=status_code, json=lambda: body)
+
+
+class TestTestingAdapterClient(unittest2.TestCase):
+
+    def setUp(self):
+        self.client = client.TestingAdapterClient('http://ostf/v1')
+        self.client.session = MagicMock()
+        self.last = []
+        self.started = []
+
+        def request(method, url, data=None, timeout=None):
+            if url.startswith('http://ostf/v1/testruns/last/'):
+                return response(self.last)
+            if method == 'POST':
+                return response(self.started)
+            return response([json.loads(data)[0]])
+
+        self.client.session.request.side_effect = request
+
+    def requests(self):
+        return [(args[0], args[1]) for args, _ in
+                self.client.session.request.call_args_list]
+
+    def stopped_id(self):
+        args, kwargs = self.client.session.request.call_args
+        return json.loads(kwargs['data'])[0]['id']
+
+    def test_started_test_run_remembered(self):
+        self.started = [{'id': 5, 'testset': 'smoke', 'status': 'running'}]
+        self.client.start_testrun('smoke', 1)
+
+        self.client.stop_testrun_last('smoke', 1)
+
+        self.assertEqual(self.stopped_id(), 5)
+        self.assertNotIn(('GET', 'http://ostf/v1/testruns/last/1'),
+                         self.requests())
+
+    def test_refused_start_not_remembered(self):
+        self.started = [{}]
+        self.last = [{'id': 3, 'testset': 'smoke', 'status': 'running'}]
+        self.client.start_testrun('smoke', 1)
+
+        self.client.stop_testrun_last('smoke', 1)
+
+        self.assertEqual(self.stopped_id(), 3)
+
+    def test_finished_test_run_looked_up_again(self):
+        self.last = [{'id': 5, 'testset': 'smoke', 'status': 'finished'},
+                     {'id': 6, 'testset': 'sanity', 'status': 'running'}]
+        self.client.testruns_last(1)
+        self.assertEqual(self.client._testruns,
+                         {('1', 'smoke'): (5, 'finished'),
+                          ('1', 'sanity'): (6, 'running')})
+        # another client started newer test run
+        self.last = [{'id': 7, 'testset': 'smoke', 'status': 'running'}]
+
+        self.client.restart_tests_last('smoke', ['a.A.test_one'], 1)
+
+        args, kwargs = self.client.session.request.call_args
+        self.assertEqual(json.loads(kwargs['data'])[0]['id'], '7')
+        self.assertEqual(self.client._testruns[('1', 'smoke')],
+                         (7, 'running'))
+
+    def test_test_runs_of_clusters_kept_apart(self):
+        self.last = [{'id': 5, 'testset': 'smoke', 'status': 'running'}]
+        self.client.testruns_last(1)
+        self.last = [{'id': 8, 'testset': 'smoke', 'status': 'running'}]
+        self.client.testruns_last('2')
+
+        self.client.stop_testrun_last('smoke', '1')
+        self.assertEqual(self.stopped_id(), 5)
+        self.client.stop_testrun_last('smoke', 2)
+        self.assertEqual(self.stopped_id(), 8)
+
+    def test_response_without_json_not_remembered(self):
+        broken = MagicMock()
+        broken.json.side_effect = ValueError
+        self.client._remember(broken, 1)
+        self.assertEqual(self.client._testruns, {})
+
+    def test_error_status_raises(self):
+        self.client.session.request.side_effect = None
+        self.client.session.request.return_value = response([], 500)
+        self.assertRaises(AssertionError, self.client.testruns_last, 1)
+
+
+class TestConcurrentTestingAdapterClient(unittest2.TestCase):
+
+    def setUp(self):
+        self.client = client.ConcurrentTestingAdapterClient(
+            'http://ostf/v1', concurrency=3)
+        self.client.client = MagicMock()
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_results_in_order_of_calls(self):
+        self.client.client.testruns_last.side_effect = lambda id: id * 2
+
+        results = self.client.map('testruns_last', [(i,) for i in range(9)])
+
+        self.assertEqual(results, [i * 2 for i in range(9)])
+
+    def test_calls_are_concurrent(self):
+        condition = threading.Condition()
+        started = []
+
+        def start(testset, cluster_id):
+            # every call waits till all of them were made
+            with condition:
+                started.append(cluster_id)
+                condition.notify_all()
+                deadline = time.time() + 5
+                while len(started) < 3 and time.time() < deadline:
+                    condition.wait(1)
+            return len(started)
+
+        self.client.client.start_testrun.side_effect = start
+
+        results = self.client.imap_unordered(
+            'start_testrun', [('smoke', i) for i in range(3)])
+
+        self.assertEqual(list(results), [3, 3, 3])
+
+
+class TestFleetRun(unittest2.TestCase):
+
+    def setUp(self):
+        terminal = MagicMock(is_a_tty=False)
+        self.fleet = ostf.FleetRun('http://ostf/v1', ['smoke'], ['1', '2'],
+                                   ['a.A.test_one'], 60, terminal)
+        self.fleet.client = MagicMock()
+        self.fleet.renderer.out = MagicMock()
+
+    def finish(self, cluster_id, *statuses):
+        self.fleet.runs[(cluster_id, 'smoke')] = {
+            'status': 'finished',
+            'tests': [{'id': 'a.A.test_{0}'.format(i), 'status': status}
+                      for i, status in enumerate(statuses)]}
+
+    def test_disabled_tests_do_not_fail_run(self):
+        self.finish('1', 'success', 'disabled')
+        self.finish('2', 'disabled', 'success')
+
+        self.assertEqual(self.fleet.exit_code(), 0)
+        self.assertEqual(self.fleet.summary()['exit_code'], 0)
+
+    def test_failed_tests_fail_run(self):
+        self.finish('1', 'success', 'disabled')
+        self.finish('2', 'failure', 'disabled')
+
+        self.assertEqual(self.fleet.exit_code(), 1)
+
+    @patch('fuel_plugin.ostf_client.ostf.time.sleep',
+           side_effect=KeyboardInterrupt)
+    def test_interrupted_runs_are_stopped(self, sleep):
+        self.fleet.client.map.return_value = []
+
+        self.assertRaises(KeyboardInterrupt, self.fleet.run)
+
+        self.fleet.client.map.assert_any_call(
+            'stop_testrun_last', [('smoke', '1'), ('smoke', '2')])
+        self.assertEqual([run['status'] for run
+                          in self.fleet.runs.itervalues()],
+                         ['stopped', 'stopped'])
+        self.assertTrue(self.fleet.client.close.called)
+        self.assertEqual(self.fleet.exit_code(), 1)
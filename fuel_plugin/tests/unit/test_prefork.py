@@ -0,0 +1,58 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest2
+from mock import patch, MagicMock
+
+from fuel_plugin.ostf_adapter import prefork
+
+
+class TestRecyclingMiddleware(unittest2.TestCase):
+
+    def setUp(self):
+        self.app = MagicMock(return_value=['{}'])
+        self.on_limit = MagicMock()
+
+    def test_recycle_after_max_requests(self):
+        middleware = prefork.RecyclingMiddleware(
+            self.app, max_requests=2, on_limit=self.on_limit)
+
+        middleware({}, None)
+        self.assertFalse(self.on_limit.called)
+
+        middleware({}, None)
+        middleware({}, None)
+        self.assertEqual(self.on_limit.call_count, 1)
+        self.assertEqual(self.app.call_count, 3)
+
+    @patch('fuel_plugin.ostf_adapter.prefork.get_rss_mb')
+    def test_recycle_on_memory_limit(self, get_rss_mb):
+        middleware = prefork.RecyclingMiddleware(
+            self.app, max_memory=100, on_limit=self.on_limit)
+
+        get_rss_mb.return_value = 50
+        middleware({}, None)
+        self.assertFalse(self.on_limit.called)
+
+        get_rss_mb.return_value = 150
+        middleware({}, None)
+        self.assertTrue(self.on_limit.called)
+
+    def test_no_limits(self):
+        middleware = prefork.RecyclingMiddleware(
+            self.app, on_limit=self.on_limit)
+
+        for _ in range(10):
+            middleware({}, None)
+        self.assertFalse(self.on_limit.called)
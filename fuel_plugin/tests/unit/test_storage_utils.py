@@ -0,0 +1,402 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime, timedelta
+import os
+import socket
+
+import unittest2
+from mock import patch
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from fuel_plugin.ostf_adapter.nose_plugin import nose_registry
+from fuel_plugin.ostf_adapter.storage import models, storage_utils
+
+
+class CatalogTestCase(unittest2.TestCase):
+    """Catalog of general_test test set in sqlite database"""
+
+    def setUp(self):
+        engine = sa.create_engine('sqlite://')
+        models.BASE.metadata.create_all(engine)
+        self.session = orm.sessionmaker(bind=engine, autocommit=True)()
+
+        self.test_sets = {
+            'general_test': {'id': 'general_test', 'driver': 'nose',
+                             'description': 'General fake tests'}
+        }
+        self.tests = {}
+        for name in ('test_one', 'test_two'):
+            self._add_test(name, name.replace('_', ' '))
+
+        self.update()
+
+    def _add_test(self, name, title):
+        test_id = 'general_test.Test.' + name
+        self.tests[test_id] = {'name': test_id, 'title': title,
+                               'test_set_id': 'general_test',
+                               'description': '', 'duration': '1sec',
+                               'meta': {'timeout': 1}}
+
+    def update(self):
+        with self.session.begin():
+            return storage_utils.update_catalog(
+                self.session, self.test_sets, self.tests)
+
+    def catalog(self):
+        return dict(
+            (test.name, test.title) for test in
+            self.session.query(models.Test).filter_by(test_run_id=None))
+
+    def new_run(self, status='running'):
+        """Test run of general_test with copies of tests of catalog"""
+        with self.session.begin(subtransactions=True):
+            test_run = models.TestRun(cluster_id=1, status=status,
+                                      test_set_id='general_test')
+            self.session.add(test_run)
+            self.session.flush()
+            for test in self.session.query(models.Test).filter_by(
+                    test_run_id=None):
+                self.session.add(test.copy_test(test_run, None))
+            self.session.flush()
+        return test_run
+
+
+class TestUpdateCatalog(CatalogTestCase):
+
+    def test_catalog_created(self):
+        self.assertEqual(self.session.query(models.TestSet).count(), 1)
+        self.assertEqual(self.catalog(), {
+            'general_test.Test.test_one': 'test one',
+            'general_test.Test.test_two': 'test two'})
+
+    def test_unchanged_catalog_not_written(self):
+        self.assertEqual(self.update(), (0, 0, 0))
+
+    def test_only_difference_written(self):
+        self.tests['general_test.Test.test_one']['title'] = 'renamed'
+        del self.tests['general_test.Test.test_two']
+        self._add_test('test_three', 'test three')
+
+        self.assertEqual(self.update(), (1, 1, 1))
+        self.assertEqual(self.catalog(), {
+            'general_test.Test.test_one': 'renamed',
+            'general_test.Test.test_three': 'test three'})
+
+    def test_history_is_kept(self):
+        with self.session.begin():
+            test_run = models.TestRun(cluster_id=1, status='finished',
+                                      test_set_id='general_test')
+            self.session.add(test_run)
+            self.session.flush()
+            self.session.add(models.Test(name='general_test.Test.test_two',
+                                         test_set_id='general_test',
+                                         test_run_id=test_run.id))
+        del self.tests['general_test.Test.test_two']
+
+        self.update()
+        self.assertEqual(
+            self.session.query(models.Test).filter(
+                models.Test.test_run_id != None).count(), 1)
+
+    def test_test_sets_of_removed_packages_removed(self):
+        self.test_sets['other_test'] = {
+            'id': 'other_test', 'driver': 'nose',
+            'test_path': 'tests/other_pkg', 'description': 'Other tests'}
+        self.test_sets['empty_test'] = {
+            'id': 'empty_test', 'driver': 'nose',
+            'test_path': 'tests/empty_pkg', 'description': 'No tests'}
+        self.tests['other_pkg.test_other.Test.test_one'] = {
+            'name': 'other_pkg.test_other.Test.test_one',
+            'title': 'other test', 'test_set_id': 'other_test'}
+        self.update()
+        test_run = self.new_run()
+
+        with self.session.begin():
+            removed = storage_utils.remove_test_sets(
+                self.session, ['other_pkg', 'general_tes_'],
+                ['tests/empty_pkg'])
+
+        self.assertEqual(removed, ['empty_test', 'other_test'])
+        self.assertEqual(
+            [test_set.id for test_set in
+             self.session.query(models.TestSet)], ['general_test'])
+        self.assertEqual(self.catalog(), {
+            'general_test.Test.test_one': 'test one',
+            'general_test.Test.test_two': 'test two'})
+        # history is kept
+        self.assertEqual(
+            self.session.query(models.Test).filter_by(
+                test_run_id=test_run.id, test_set_id='other_test').count(),
+            1)
+
+    def test_registry_loaded_from_catalog(self):
+        with self.session.begin():
+            registry = nose_registry.Registry.load(
+                self.session, 'general_test')
+
+        self.assertIn('general_test.Test.test_one', registry)
+        self.assertEqual(registry.get('general_test.Test.test_two')['title'],
+                         'test two')
+        self.assertEqual(registry.get_timeout('general_test.Test.test_one'),
+                         1)
+        self.assertIsNone(registry.get_timeout('unknown'))
+
+
+class TestTestRun(CatalogTestCase):
+
+    def test_failed_attempts_recorded(self):
+        with self.session.begin():
+            test_run = self.new_run()
+            models.Test.add_result(
+                self.session, test_run.id, 'general_test.Test.test_two',
+                {'status': 'failure', 'message': 'flake', 'step': 1})
+
+            failed = models.Test.get_failed(
+                self.session, test_run.id, sorted(self.tests))
+            models.Test.add_attempt(self.session, test_run.id, failed[0])
+
+        self.assertEqual(failed, ['general_test.Test.test_two'])
+        test = self.session.query(models.Test).filter_by(
+            test_run_id=test_run.id, name=failed[0]).one()
+        self.assertEqual(test.meta['attempts'], [
+            {'status': 'failure', 'step': 1, 'message': 'flake',
+             'taken': None}])
+
+    @patch('fuel_plugin.ostf_adapter.storage.models.nose_plugin')
+    def test_interrupted_run_resumed(self, nose_plugin):
+        with self.session.begin():
+            test_run = self.new_run()
+            models.Test.add_result(
+                self.session, test_run.id, 'general_test.Test.test_one',
+                {'status': 'success'})
+            models.Test.add_result(
+                self.session, test_run.id, 'general_test.Test.test_two',
+                {'status': 'running'})
+            # runner of current host with pid that does not exist
+            models.RunnerProcess.register(self.session, test_run.id, 2 ** 22)
+
+        with self.session.begin():
+            interrupted = storage_utils.reap_orphaned_test_runs(self.session)
+        self.session.expire_all()
+        self.assertEqual(interrupted, [test_run.id])
+        self.assertEqual(test_run.status, 'interrupted')
+        self.assertEqual([test.status for test in test_run.tests],
+                         ['success', 'wait_running'])
+
+        with self.session.begin():
+            resumed = storage_utils.resume_test_runs(
+                self.session, interrupted)
+        self.assertEqual(resumed, [test_run.id])
+        self.assertEqual(test_run.status, 'running')
+        nose_plugin.get_plugin.return_value.run.assert_called_once_with(
+            test_run, test_run.test_set, ['general_test.Test.test_two'])
+
+    @patch('fuel_plugin.ostf_adapter.storage.models.nose_plugin')
+    def test_run_of_removed_test_set_not_resumed(self, nose_plugin):
+        with self.session.begin():
+            test_run = self.new_run('interrupted')
+        with self.session.begin():
+            storage_utils.remove_test_sets(self.session, ['general_test'], [])
+        self.session.expire_all()
+
+        with self.session.begin():
+            resumed = storage_utils.resume_test_runs(
+                self.session, [test_run.id])
+
+        self.assertEqual(resumed, [test_run.id])
+        self.assertEqual(test_run.status, 'finished')
+        self.assertEqual([test.status for test in test_run.tests],
+                         ['stopped', 'stopped'])
+        self.assertFalse(nose_plugin.get_plugin.called)
+
+    def test_idle_clusters(self):
+        now = datetime.utcnow()
+        with self.session.begin():
+            self.session.query(models.TestSet).update(
+                {'cleanup_path': 'fuel_health.cleanup'})
+            for cluster_id, status, ended in ((1, 'finished', 60),
+                                              (1, 'finished', 30),
+                                              (2, 'finished', 5),
+                                              (3, 'finished', 60),
+                                              (3, 'running', None)):
+                self.session.add(models.TestRun(
+                    cluster_id=cluster_id, status=status,
+                    test_set_id='general_test',
+                    ended_at=ended and now - timedelta(minutes=ended)))
+
+        with self.session.begin():
+            clusters = models.TestRun.get_idle_clusters(
+                self.session, now - timedelta(minutes=10))
+
+        self.assertEqual(clusters, {
+            1: (now - timedelta(minutes=30), ['fuel_health.cleanup'])})
+        self.assertTrue(
+            models.TestRun.has_active_test_runs(self.session, 3))
+        self.assertFalse(
+            models.TestRun.has_active_test_runs(self.session, 1))
+
+    def test_poll_after(self):
+        now = datetime.utcnow()
+        test_run = models.TestRun(status='running', tests=[
+            models.Test(status='running', meta={'timeout': 20},
+                        started_at=now - timedelta(seconds=15)),
+            models.Test(status='running',
+                        started_at=now - timedelta(seconds=5)),
+            models.Test(status='wait_running', meta={'timeout': 1})])
+        self.assertAlmostEqual(test_run.poll_after, 5, delta=1)
+
+        test_run.tests[0].status = 'success'
+        self.assertEqual(test_run.poll_after, models.TestRun.MAX_POLL_AFTER)
+
+        # no estimate for tests running longer than expected
+        test_run.tests[1].started_at = now - timedelta(minutes=5)
+        self.assertIsNone(test_run.poll_after)
+        self.assertNotIn('poll_after', test_run.frontend)
+
+        test_run.tests[1].status = 'success'
+        self.assertIsNone(test_run.poll_after)
+
+    def test_poll_after_by_history(self):
+        now = datetime.utcnow()
+        with self.session.begin():
+            for status, time_taken in (('finished', 10), ('finished', 30),
+                                       ('running', None)):
+                test_run = self.new_run(status)
+                models.Test.add_result(
+                    self.session, test_run.id, 'general_test.Test.test_one',
+                    {'status': 'success', 'time_taken': time_taken})
+            models.Test.add_result(
+                self.session, test_run.id, 'general_test.Test.test_one',
+                {'status': 'running',
+                 'started_at': now - timedelta(seconds=5)})
+        self.session.expire_all()
+
+        # median of 10 and 30 seconds, declared duration is 1 second
+        self.assertAlmostEqual(test_run.poll_after, 15, delta=1)
+        self.assertAlmostEqual(test_run.frontend['poll_after'], 15, delta=1)
+
+    def test_interrupted_clusters_are_idle(self):
+        now = datetime.utcnow()
+        with self.session.begin():
+            self.session.query(models.TestSet).update(
+                {'cleanup_path': 'fuel_health.cleanup'})
+            self.session.add(models.TestRun(
+                cluster_id=1, status='interrupted',
+                test_set_id='general_test',
+                started_at=now - timedelta(minutes=30)))
+
+        with self.session.begin():
+            clusters = models.TestRun.get_idle_clusters(
+                self.session, now - timedelta(minutes=10))
+
+        self.assertEqual(clusters, {
+            1: (now - timedelta(minutes=30), ['fuel_health.cleanup'])})
+        self.assertFalse(
+            models.TestRun.has_active_test_runs(self.session, 1))
+
+    def test_waiting_tests(self):
+        with self.session.begin():
+            test_run = self.new_run()
+            for name, status in (('test_one', 'error'),
+                                 ('test_two', 'wait_running')):
+                models.Test.add_result(
+                    self.session, test_run.id, 'general_test.Test.' + name,
+                    {'status': status})
+
+        names = ['general_test.Test.test_two', 'general_test.Test.test_one',
+                 'general_test.Test.test_three']
+        self.assertEqual(
+            models.Test.get_waiting(self.session, test_run.id, names),
+            ['general_test.Test.test_two'])
+
+
+class TestRunnerRegistry(unittest2.TestCase):
+
+    def setUp(self):
+        engine = sa.create_engine('sqlite://')
+        models.BASE.metadata.create_all(engine)
+        self.session = orm.sessionmaker(bind=engine, autocommit=True)()
+
+    def start(self, pid, host=None, beat_ago=0):
+        with self.session.begin():
+            test_run = models.TestRun(cluster_id=1, status='running',
+                                      test_set_id='general_test')
+            self.session.add(test_run)
+            self.session.flush()
+            runner = models.RunnerProcess.register(
+                self.session, test_run.id, pid, host=host)
+            runner.heartbeat_at = \
+                datetime.utcnow() - timedelta(seconds=beat_ago)
+        return test_run
+
+    def test_runner_registered_once(self):
+        test_run = self.start(1)
+        with self.session.begin():
+            models.RunnerProcess.register(self.session, test_run.id, 2)
+
+        runners = self.session.query(models.RunnerProcess).all()
+        self.assertEqual([runner.pid for runner in runners], [2])
+        self.assertEqual(models.RunnerProcess.get_runner(
+            self.session, test_run.id).pid, 2)
+
+        with self.session.begin():
+            models.RunnerProcess.unregister(self.session, test_run.id)
+        self.assertIsNone(
+            models.RunnerProcess.get_runner(self.session, test_run.id))
+
+    def test_command_delivered_with_heartbeat(self):
+        test_run = self.start(1, host='other', beat_ago=30)
+        with self.session.begin():
+            self.assertIsNone(models.RunnerProcess.heartbeat(
+                self.session, test_run.id))
+            models.RunnerProcess.send_command(
+                self.session, test_run.id, 'stop')
+        self.session.expire_all()
+
+        with self.session.begin():
+            self.assertEqual(models.RunnerProcess.heartbeat(
+                self.session, test_run.id), 'stop')
+        runner = models.RunnerProcess.get_runner(self.session, test_run.id)
+        self.assertFalse(runner.is_stale(timeout=10))
+
+    def test_runner_with_stale_heartbeat_is_dead(self):
+        # pid of current process stands for reused pid of dead runner
+        runner = models.RunnerProcess(pid=os.getpid(),
+                                      host=socket.gethostname(),
+                                      heartbeat_at=datetime.utcnow())
+        self.assertTrue(runner.is_alive)
+        runner.heartbeat_at -= timedelta(
+            seconds=models.RunnerProcess.HEARTBEAT_TIMEOUT + 1)
+        self.assertFalse(runner.is_alive)
+
+    def test_orphaned_test_runs_reaped(self):
+        alive = self.start(os.getpid())
+        remote = self.start(1, host='other', beat_ago=30)
+        stale = self.start(1, host='other', beat_ago=600)
+        dead = self.start(2 ** 22)
+
+        with self.session.begin():
+            reaped = storage_utils.reap_orphaned_test_runs(self.session)
+        self.session.expire_all()
+
+        self.assertEqual(sorted(reaped), sorted([stale.id, dead.id]))
+        self.assertEqual(
+            [test_run.status for test_run in (alive, remote, stale, dead)],
+            ['running', 'running', 'interrupted', 'interrupted'])
+        self.assertEqual(
+            sorted(runner.test_run_id for runner
+                   in self.session.query(models.RunnerProcess)),
+            sorted([alive.id, remote.id]))
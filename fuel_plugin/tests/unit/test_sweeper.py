@@ -0,0 +1,97 @@
+#    Copyright 2013 Mirantis, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime
+import signal
+
+import unittest2
+from mock import patch
+
+from fuel_plugin.ostf_adapter import sweeper
+
+
+SWEEPER = 'fuel_plugin.ostf_adapter.sweeper.'
+
+
+@patch(SWEEPER + 'time.sleep')
+@patch(SWEEPER + 'models')
+@patch(SWEEPER + 'engine')
+class TestSweeper(unittest2.TestCase):
+
+    def setUp(self):
+        self.sweeper = sweeper.Sweeper(300, 600, 120, 2)
+
+    @patch(SWEEPER + 'os.waitpid', side_effect=[(0, 0), (100, 0)])
+    @patch(SWEEPER + 'os.fork', return_value=100)
+    def test_sweep_is_waited_for(self, fork, waitpid, engine, models,
+                                 sleep):
+        models.TestRun.has_active_test_runs.return_value = False
+
+        self.assertTrue(self.sweeper.sweep_cluster(1, ['cleanup']))
+        self.assertEqual(waitpid.call_count, 2)
+
+    @patch(SWEEPER + 'os.waitpid', side_effect=[(0, 0), (100, 256)])
+    @patch(SWEEPER + 'os.fork', return_value=100)
+    def test_incomplete_sweep(self, fork, waitpid, engine, models, sleep):
+        models.TestRun.has_active_test_runs.return_value = False
+
+        self.assertFalse(self.sweeper.sweep_cluster(1, ['cleanup']))
+
+    @patch(SWEEPER + 'os.kill')
+    @patch(SWEEPER + 'os.waitpid', return_value=(0, 0))
+    @patch(SWEEPER + 'os.fork', return_value=100)
+    def test_sweep_of_busy_cluster_is_aborted(self, fork, waitpid, kill,
+                                              engine, models, sleep):
+        models.TestRun.has_active_test_runs.return_value = True
+
+        self.assertFalse(self.sweeper.sweep_cluster(1, ['cleanup']))
+        kill.assert_called_once_with(100, signal.SIGKILL)
+
+    @patch(SWEEPER + 'os._exit', side_effect=SystemExit)
+    @patch(SWEEPER + 'os.fork', return_value=0)
+    def test_child_exits_with_result_of_sweep(self, fork, exit, engine,
+                                              models, sleep):
+        with patch.object(self.sweeper, '_sweep', return_value=1):
+            self.assertRaises(SystemExit, self.sweeper.sweep_cluster,
+                              1, ['cleanup'])
+        exit.assert_called_once_with(1)
+
+    def test_cluster_is_swept_once_per_idle_period(self, engine, models,
+                                                   sleep):
+        ended_at = datetime(2013, 10, 1)
+        models.TestRun.get_idle_clusters.return_value = {
+            1: (ended_at, ['cleanup']), 2: (ended_at, [])}
+
+        with patch.object(self.sweeper, 'sweep_cluster',
+                          return_value=True) as sweep_cluster:
+            self.sweeper.sweep()
+            self.sweeper.sweep()
+
+        sweep_cluster.assert_called_once_with(1, ['cleanup'])
+        self.assertEqual(self.sweeper.swept, {1: ended_at})
+
+    @patch(SWEEPER + 'conf')
+    @patch(SWEEPER + 'importlib')
+    def test_ledger_is_swept_by_default(self, importlib, conf, engine,
+                                        models, sleep):
+        cleanup = importlib.import_module.return_value.cleanup
+        cleanup.return_value = 0
+
+        self.assertEqual(self.sweeper._sweep(1, ['cleanup']), 0)
+        cleanup.assert_called_once_with(sweep=False, budget=120, rate=2)
+
+        self.sweeper.prefix = True
+        cleanup.return_value = 3
+        self.assertEqual(self.sweeper._sweep(1, ['cleanup']), 1)
+        cleanup.assert_called_with(sweep=True, budget=120, rate=2)